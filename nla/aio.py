@@ -0,0 +1,520 @@
+"""
+asyncio counterparts of the augmentations, for online augmentation inside
+async services.
+
+The augmentations are blocking, the async functions run them on a managed
+executor so that the event loop keeps serving other requests meanwhile. The
+inputs are split in batches of chunksize rows, every batch is one executor
+call, and at most `limit` calls run at once in the process, whatever the
+number of concurrent requests. Cancelling an awaiting coroutine, or closing an
+async generator, cancels its batches not started yet, a batch already running
+completes in the background and its outputs are dropped.
+
+usage:
+    from nla import aio
+
+    aio.configure(workers=4, limit=8)
+    rows = await aio.akeyboard_sent_aug(["DEEP NEURAL"], degree=1, count=3)
+    spellings = await aio.agenome("CARROM", beamwidth=20)
+
+    async for row in aio.aiter_fetch(words, degree=2, count=3):
+        ...
+
+The default executor is a pool of threads, the model calls of genome release
+the GIL while they run. process_executor() offloads the CPU bound keyboard
+augmentations to processes instead. Seeded runs aren't reproducible on
+threads, the threads share the random stream of the process.
+"""
+
+import asyncio
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+from nla.parallelize import *
+from nla.parallelize.parallel import _initialize
+from nla.keyboard.randaug import __fetch__
+from nla.keyboard.keyaug import __nn_fetch__
+from nla.keyboard.nlaug import __rand_sent_aug__, __keyboard_sent_aug__
+from nla.edge_n_gram import __edge_n_gram__
+from nla.word_boundary import __batch_word_boundary__
+from nla.homophones import genome, genome_many
+
+# threads of the default executor
+WORKERS = 4
+
+_executor = None
+# True if the executor was created here and is shut down on replacement
+_owned = False
+_workers = WORKERS
+# executor calls running at once, defaults to the number of workers
+_limit = None
+# a semaphore per event loop, a semaphore can't be shared across loops
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def configure(executor=None, workers=None, limit=None):
+    """
+    replace the managed executor and the concurrency limit, an executor
+    created by this module is shut down once its pending calls are done
+    :param executor: concurrent.futures executor to run the augmentations on,
+        a pool of workers threads is created on first use if None
+    :type executor: concurrent.futures.Executor
+    :param workers: number of threads of the created pool
+    :type workers: int
+    :param limit: maximum executor calls at once, defaults to workers
+    :type limit: int
+    """
+    global _executor, _owned, _workers, _limit
+
+    assert limit is None or limit > 0, "limit needs to be positive"
+
+    if _executor is not None and _owned:
+        _executor.shutdown(wait=False)
+
+    _executor = executor
+    _owned = False
+    _workers = workers or getattr(executor, "_max_workers", None) or WORKERS
+    _limit = limit
+    _semaphores.clear()
+
+
+def get_executor():
+    """
+    :return: the managed executor, created on first use
+    """
+    global _executor, _owned
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(_workers, thread_name_prefix="nla")
+        _owned = True
+
+    return _executor
+
+
+def process_executor(processes=None, preload=(), context=None):
+    """
+    pool of processes to pass to configure, its workers get their own random
+    stream and load the assets of the preloaded modules once
+    :param processes: number of processes, defaults to the cpu count
+    :type processes: int
+    :param preload: modules to load in every worker, e.g. 'nla.keyboard.keyaug'
+    :type preload: list
+    :param context: start method, 'fork', 'spawn' or 'forkserver'
+    :type context: str
+    :return: concurrent.futures.ProcessPoolExecutor
+    """
+    return ProcessPoolExecutor(
+        processes or multiprocessing.cpu_count(),
+        mp_context=multiprocessing.get_context(context),
+        initializer=_initialize,
+        initargs=(list(preload), None, ()),
+    )
+
+
+def shutdown(wait=True):
+    """
+    shut the managed executor down, a new one is created on the next call
+    :param wait: wait for the running calls
+    :type wait: bool
+    """
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(_limit or _workers)
+
+    return semaphore
+
+
+async def run(function, *args, **kwargs):
+    """
+    run a blocking call on the managed executor within the concurrency limit
+    :param function: function to call, picklable for a process executor
+    :return: result of the call
+    """
+    async with _semaphore():
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(), partial(function, *args, **kwargs)
+        )
+
+
+def _run_batch(function, batch):
+    return list(iter_serial(batch, function))
+
+
+async def _abatched(data, size):
+    if hasattr(data, "__aiter__"):
+        batch = []
+
+        async for row in data:
+            batch.append(row)
+            if len(batch) == size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+    else:
+        for batch in batched(data, size):
+            yield batch
+
+
+async def astream(data, function, chunksize=64, max_inflight=None, batch=False):
+    """
+    async counterpart of iter_parallel, yields the outputs in the input order
+    as the batches complete
+    :param data: iterable or async iterable
+    :param function: function returning a list of outputs for a single row,
+        e.g. a Pipeline
+    :param chunksize: number of rows in an executor call
+    :type chunksize: int
+    :param max_inflight: maximum rows submitted but not yet yielded, defaults
+        to two executor calls per allowed concurrent call
+    :type max_inflight: int
+    :param batch: the function takes a list of rows instead of a single one
+    :type batch: bool
+    :return: async generator over the outputs
+    """
+    if max_inflight is None:
+        calls = 2 * (_limit or _workers)
+    else:
+        calls = max(max_inflight // chunksize, 1)
+
+    call = function if batch else partial(_run_batch, function)
+    pending = deque()
+
+    try:
+        async for rows in _abatched(data, chunksize):
+            pending.append(asyncio.ensure_future(run(call, rows)))
+
+            if len(pending) >= calls:
+                for output in await pending.popleft():
+                    yield output
+
+        while pending:
+            for output in await pending.popleft():
+                yield output
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def afetch(
+    words, degree, count, method="random", position="random", chunksize=64, **kwargs
+):
+    """
+    async counterpart of fetch
+    :param words: list of words to augment
+    :type words: list
+    :param chunksize: number of words in an executor call
+    :type chunksize: int
+    :return: list of augmented tuples
+    """
+    return [
+        row
+        async for row in aiter_fetch(
+            words, degree, count, method, position, chunksize, **kwargs
+        )
+    ]
+
+
+def aiter_fetch(
+    words,
+    degree,
+    count,
+    method="random",
+    position="random",
+    chunksize=64,
+    max_inflight=None,
+    **kwargs
+):
+    """
+    streaming counterpart of afetch
+    :param words: iterable or async iterable of words to augment
+    :param max_inflight: maximum words being processed at once
+    :type max_inflight: int
+    :return: async generator over the augmented tuples
+    """
+    function = partial(
+        __fetch__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+    return astream(words, function, chunksize, max_inflight)
+
+
+async def ann_fetch(
+    words, degree, count, method="random", position="random", chunksize=64, **kwargs
+):
+    """
+    async counterpart of nn_fetch
+    :param words: list of words to augment
+    :type words: list
+    :param chunksize: number of words in an executor call
+    :type chunksize: int
+    :return: list of augmented tuples
+    """
+    return [
+        row
+        async for row in aiter_nn_fetch(
+            words, degree, count, method, position, chunksize, **kwargs
+        )
+    ]
+
+
+def aiter_nn_fetch(
+    words,
+    degree,
+    count,
+    method="random",
+    position="random",
+    chunksize=64,
+    max_inflight=None,
+    **kwargs
+):
+    """
+    streaming counterpart of ann_fetch
+    :param words: iterable or async iterable of words to augment
+    :param max_inflight: maximum words being processed at once
+    :type max_inflight: int
+    :return: async generator over the augmented tuples
+    """
+    function = partial(
+        __nn_fetch__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+    return astream(words, function, chunksize, max_inflight)
+
+
+async def arand_sent_aug(
+    sentences,
+    degree,
+    count,
+    method="random",
+    position="random",
+    chunksize=64,
+    **kwargs
+):
+    """
+    async counterpart of rand_sent_aug
+    :param sentences: list of sentences to augment
+    :type sentences: list
+    :param chunksize: number of sentences in an executor call
+    :type chunksize: int
+    :return: list of augmented rows
+    """
+    return [
+        row
+        async for row in aiter_rand_sent_aug(
+            sentences, degree, count, method, position, chunksize, **kwargs
+        )
+    ]
+
+
+def aiter_rand_sent_aug(
+    sentences,
+    degree,
+    count,
+    method="random",
+    position="random",
+    chunksize=64,
+    max_inflight=None,
+    **kwargs
+):
+    """
+    streaming counterpart of arand_sent_aug
+    :param sentences: iterable or async iterable of sentences to augment
+    :param max_inflight: maximum sentences being processed at once
+    :type max_inflight: int
+    :return: async generator over the augmented rows
+    """
+    function = partial(
+        __rand_sent_aug__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+    return astream(sentences, function, chunksize, max_inflight)
+
+
+async def akeyboard_sent_aug(
+    sentences,
+    degree,
+    count,
+    method="random",
+    position="random",
+    chunksize=64,
+    **kwargs
+):
+    """
+    async counterpart of keyboard_sent_aug
+    :param sentences: list of sentences to augment
+    :type sentences: list
+    :param chunksize: number of sentences in an executor call
+    :type chunksize: int
+    :return: list of augmented rows
+    """
+    return [
+        row
+        async for row in aiter_keyboard_sent_aug(
+            sentences, degree, count, method, position, chunksize, **kwargs
+        )
+    ]
+
+
+def aiter_keyboard_sent_aug(
+    sentences,
+    degree,
+    count,
+    method="random",
+    position="random",
+    chunksize=64,
+    max_inflight=None,
+    **kwargs
+):
+    """
+    streaming counterpart of akeyboard_sent_aug
+    :param sentences: iterable or async iterable of sentences to augment
+    :param max_inflight: maximum sentences being processed at once
+    :type max_inflight: int
+    :return: async generator over the augmented rows
+    """
+    function = partial(
+        __keyboard_sent_aug__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+    return astream(sentences, function, chunksize, max_inflight)
+
+
+async def aedge_n_gram(queries, count, degree, chunksize=64, **kwargs):
+    """
+    async counterpart of edge_n_gram
+    :param queries: sentences to augment
+    :type queries: list
+    :param chunksize: number of sentences in an executor call
+    :type chunksize: int
+    :return: list of augmented tuples
+    """
+    return [
+        row
+        async for row in aiter_edge_n_gram(queries, count, degree, chunksize, **kwargs)
+    ]
+
+
+def aiter_edge_n_gram(
+    queries, count, degree, chunksize=64, max_inflight=None, **kwargs
+):
+    """
+    streaming counterpart of aedge_n_gram
+    :param queries: iterable or async iterable of sentences to augment
+    :param max_inflight: maximum sentences being processed at once
+    :type max_inflight: int
+    :return: async generator over the augmented tuples
+    """
+    function = partial(__edge_n_gram__, **kwargs, degree=degree, count=count)
+    return astream(queries, function, chunksize, max_inflight)
+
+
+async def aword_boundary(queries, count, degree, chunksize=1024, **kwargs):
+    """
+    async counterpart of word_boundary
+    :param queries: sentences to augment
+    :type queries: list
+    :param chunksize: number of sentences augmented at once, as a batch
+    :type chunksize: int
+    :return: list of augmented tuples
+    """
+    return [
+        row
+        async for row in aiter_word_boundary(
+            queries, count, degree, chunksize, **kwargs
+        )
+    ]
+
+
+def aiter_word_boundary(
+    queries, count, degree, chunksize=1024, max_inflight=None, **kwargs
+):
+    """
+    streaming counterpart of aword_boundary
+    :param queries: iterable or async iterable of sentences to augment
+    :param max_inflight: maximum sentences being processed at once
+    :type max_inflight: int
+    :return: async generator over the augmented tuples
+    """
+    function = partial(__batch_word_boundary__, **kwargs, degree=degree, count=count)
+    return astream(queries, function, chunksize, max_inflight, batch=True)
+
+
+async def agenome(query, beamwidth=50):
+    """
+    async counterpart of genome, the models are loaded on the executor too
+    :param query: word to augment
+    :type query: str
+    :param beamwidth: number of outputs
+    :type beamwidth: int
+    :return: list of homophones
+    """
+    return await run(genome, query, beamwidth)
+
+
+async def agenome_many(queries, beamwidth=50, batch_size=256):
+    """
+    async counterpart of genome_many
+    :param queries: words to augment
+    :type queries: list
+    :param beamwidth: number of outputs
+    :type beamwidth: int
+    :param batch_size: number of words in an executor call, their chunks run
+        through the models in padded batches
+    :type batch_size: int
+    :return: list of homophones for every word
+    """
+    return [row async for row in aiter_genome(queries, beamwidth, batch_size)]
+
+
+def aiter_genome(queries, beamwidth=50, batch_size=256, max_inflight=None):
+    """
+    streaming counterpart of agenome_many
+    :param queries: iterable or async iterable of words to augment
+    :param max_inflight: maximum words being processed at once
+    :type max_inflight: int
+    :return: async generator over the homophones of every word
+    """
+    function = partial(genome_many, beamwidth=beamwidth, batch_size=batch_size)
+    return astream(queries, function, batch_size, max_inflight, batch=True)
+
+
+if __name__ == "__main__":
+
+    async def main():
+        print(await afetch(["PARACETAMOL", "DEEP"], degree=2, count=3))
+        print(await akeyboard_sent_aug(["DEEP NEURAL"], degree=1, count=3))
+
+        async for row in aiter_edge_n_gram(["DEEP NEURAL CRAVING"], 3, 2):
+            print(row)
+
+    asyncio.run(main())
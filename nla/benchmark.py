@@ -0,0 +1,503 @@
+"""
+Benchmark suite of the augmentations.
+
+Every case runs on synthetic corpora of several sizes and word length
+distributions, serially and in parallel, and records the throughput, the
+latency percentiles of a single item and the peak RSS. A case runs in a fresh
+process so that its peak RSS isn't hidden by the previous ones.
+
+The results are stored as JSON and can be compared to a saved baseline, a
+case whose throughput dropped by more than the threshold is flagged and the
+command exits with status 1.
+
+usage:
+    python -m nla.benchmark run --sizes 1000,10000 --output bench.json
+    python -m nla.benchmark run --cases fetch,word_boundary --baseline base.json
+    python -m nla.benchmark compare bench.json base.json --threshold 0.1
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import multiprocessing
+from functools import partial
+
+import numpy as np
+
+from nla import rng
+from nla.parallelize import WorkerPool, set_default_pool
+
+LETTERS = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+
+# word length samplers, from a numpy Generator and a number of words
+LENGTHS = {
+    "short": lambda g, n: g.integers(2, 6, n),
+    "normal": lambda g, n: np.clip(g.normal(7, 2.5, n).round(), 2, 20).astype(int),
+    "long": lambda g, n: g.integers(10, 25, n),
+    "uniform": lambda g, n: g.integers(2, 20, n),
+}
+
+# number of items timed one by one for the latency percentiles
+LATENCY_SAMPLE = 1000
+
+MODES = ["serial", "parallel", "pool"]
+
+# slowdown flagged when comparing to a baseline
+THRESHOLD = 0.10
+
+
+def words(size, lengths="normal", seed=0):
+    """
+    synthetic corpus of uppercase words
+    :param size: number of words
+    :type size: int
+    :param lengths: word length distribution, one of LENGTHS
+    :type lengths: str
+    :param seed: seed of the corpus
+    :type seed: int
+    :return: list of words
+    """
+    g = np.random.default_rng(seed)
+    sizes = LENGTHS[lengths](g, size)
+    chars = LETTERS[g.integers(0, 26, sizes.sum())]
+
+    ends = np.cumsum(sizes)
+    text = "".join(chars)
+    return [text[e - s : e] for s, e in zip(sizes.tolist(), ends.tolist())]
+
+
+def sentences(size, lengths="normal", seed=0, nwords=(1, 5)):
+    """
+    synthetic corpus of sentences of uppercase words
+    :param size: number of sentences
+    :type size: int
+    :param lengths: word length distribution, one of LENGTHS
+    :type lengths: str
+    :param seed: seed of the corpus
+    :type seed: int
+    :param nwords: minimum and maximum number of words of a sentence
+    :type nwords: tuple
+    :return: list of sentences
+    """
+    g = np.random.default_rng(seed + 1)
+    counts = g.integers(nwords[0], nwords[1] + 1, size)
+    vocabulary = words(int(counts.sum()), lengths, seed)
+
+    ends = np.cumsum(counts)
+    return [
+        " ".join(vocabulary[e - c : e]) for c, e in zip(counts.tolist(), ends.tolist())
+    ]
+
+
+def _identity(row):
+    return [row]
+
+
+def _cases():
+    """
+    :return: case name to (corpus function, function of the corpus and the
+        parallel flag, function of a single item)
+    """
+    from nla.keyboard import randaug, keyaug, nlaug, batch
+    from nla import edge_n_gram, word_boundary
+    from nla.parallelize import run_parallel
+
+    cases = {
+        "fetch": (
+            words,
+            lambda c, p: randaug.fetch(c, 2, 3, parallel=p),
+            partial(randaug.__fetch__, degree=2, count=3),
+        ),
+        "nn_fetch": (
+            words,
+            lambda c, p: keyaug.nn_fetch(c, 2, 3, parallel=p),
+            partial(keyaug.__nn_fetch__, degree=2, count=3),
+        ),
+        "batch_fetch": (
+            words,
+            lambda c, p: batch.batch_fetch(c, 2, 3, parallel=p),
+            None,
+        ),
+        "rand_sent_aug": (
+            sentences,
+            lambda c, p: nlaug.rand_sent_aug(c, 2, 3, parallel=p),
+            partial(nlaug.__rand_sent_aug__, degree=2, count=3),
+        ),
+        "keyboard_sent_aug": (
+            sentences,
+            lambda c, p: nlaug.keyboard_sent_aug(c, 2, 3, parallel=p),
+            partial(nlaug.__keyboard_sent_aug__, degree=2, count=3),
+        ),
+        "vocab_keyboard_sent_aug": (
+            sentences,
+            lambda c, p: nlaug.vocab_keyboard_sent_aug(c, 2, 3, parallel=p),
+            None,
+        ),
+        "edge_n_gram": (
+            sentences,
+            lambda c, p: edge_n_gram.edge_n_gram(c, 3, 2, parallel=p),
+            partial(edge_n_gram.__edge_n_gram__, count=3, degree=2),
+        ),
+        "word_boundary": (
+            sentences,
+            lambda c, p: word_boundary.word_boundary(c, 3, 0.5, parallel=p),
+            partial(word_boundary.__word_boundary__, count=3, degree=0.5),
+        ),
+        "run_parallel": (
+            words,
+            lambda c, p: run_parallel(c, _identity) if p else c[:],
+            _identity,
+        ),
+    }
+
+    try:
+        from nla import homophones
+        import transly  # noqa: F401
+    except ImportError:
+        # optional, needs transly and tensorflow
+        return cases
+
+    cases["genome"] = (
+        words,
+        lambda c, p: (
+            run_parallel(c, partial(homophones.genome, beamwidth=10))
+            if p
+            else [homophones.genome(w, beamwidth=10) for w in c]
+        ),
+        partial(homophones.genome, beamwidth=10),
+    )
+
+    return cases
+
+
+def available():
+    """
+    :return: names of the cases that can run in this environment
+    """
+    return list(_cases())
+
+
+def _peak_rss(who):
+    """
+    :return: peak resident set size in MB
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def measure(
+    case, size, lengths="normal", mode="serial", seed=0, repeat=3, seeded=False
+):
+    """
+    run a case in the current process
+    :param case: case name, see available
+    :type case: str
+    :param size: corpus size
+    :type size: int
+    :param lengths: word length distribution, one of LENGTHS
+    :type lengths: str
+    :param mode: one of MODES, 'serial', 'parallel' with a pool per call, or
+        'pool' with a persistent WorkerPool
+    :type mode: str
+    :param seed: seed of the corpus, and of the augmentations if seeded
+    :type seed: int
+    :param repeat: number of runs, the best one is kept
+    :type repeat: int
+    :param seeded: seed the augmentations before every run, which times the
+        reproducible path, see nla.rng.seed, else they draw from fresh entropy
+    :type seeded: bool
+    :return: dict of the measures
+    """
+    assert mode in MODES, "mode needs to be either {}".format(str(MODES)[1:-1])
+
+    corpus_function, function, single = _cases()[case]
+    corpus = corpus_function(size, lengths, seed)
+    parallel = mode != "serial"
+
+    # warm up, loads the keyboard map and the models
+    function(corpus[:10], False)
+
+    if mode == "pool":
+        pool = WorkerPool().start()
+        set_default_pool(pool)
+        function(corpus[:10], True)
+
+    seconds = []
+    outputs = 0
+
+    for _ in range(repeat):
+        if seeded:
+            rng.seed(seed)
+        start = time.perf_counter()
+        outputs = len(function(corpus, parallel))
+        seconds.append(time.perf_counter() - start)
+
+    if mode == "pool":
+        set_default_pool(None)
+        pool.close()
+
+    latencies = []
+    if single is not None:
+        if seeded:
+            rng.seed(seed)
+        for item in corpus[:LATENCY_SAMPLE]:
+            start = time.perf_counter()
+            single(item)
+            latencies.append(time.perf_counter() - start)
+
+    best = min(seconds)
+    percentiles = [None] * 3
+    if latencies:
+        percentiles = [float(p) * 1e6 for p in np.percentile(latencies, [50, 90, 99])]
+
+    return {
+        "case": case,
+        "size": size,
+        "lengths": lengths,
+        "mode": mode,
+        "seeded": seeded,
+        "outputs": outputs,
+        "seconds": best,
+        "throughput": size / best if best else None,
+        "p50_us": percentiles[0],
+        "p90_us": percentiles[1],
+        "p99_us": percentiles[2],
+        "peak_rss_mb": _peak_rss(resource.RUSAGE_SELF),
+        "workers_peak_rss_mb": _peak_rss(resource.RUSAGE_CHILDREN),
+    }
+
+
+def _child(connection, args, kwargs):
+    try:
+        connection.send(measure(*args, **kwargs))
+    except Exception as e:
+        connection.send(e)
+    finally:
+        connection.close()
+
+
+def isolated(*args, **kwargs):
+    """
+    measure in a fresh process, arguments of measure
+    :return: dict of the measures
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+
+    # not a pool worker, the parallel path needs to start its own workers
+    process = context.Process(target=_child, args=(sender, args, kwargs))
+    process.start()
+    sender.close()
+
+    result = receiver.recv()
+    process.join()
+
+    if isinstance(result, Exception):
+        raise result
+
+    return result
+
+
+def run(
+    cases=None,
+    sizes=(1000, 10000),
+    lengths=("normal",),
+    modes=("serial", "parallel"),
+    seed=0,
+    repeat=3,
+    seeded=(False,),
+    log=None,
+):
+    """
+    run the benchmark suite
+    :param cases: case names, defaults to all the available ones
+    :type cases: list
+    :param sizes: corpus sizes
+    :type sizes: list
+    :param lengths: word length distributions
+    :type lengths: list
+    :param modes: modes of measure
+    :type modes: list
+    :param seed: seed of the corpora and of the seeded augmentations
+    :type seed: int
+    :param repeat: number of runs of a case, the best one is kept
+    :type repeat: int
+    :param seeded: unseeded and/or seeded runs of every case, see measure
+    :type seeded: list
+    :param log: file to report the progress to
+    :return: dict with the environment and the results
+    """
+    cases = cases or available()
+    unknown = set(cases) - set(available())
+    assert not unknown, "unknown or unavailable cases {}".format(
+        str(sorted(unknown))[1:-1]
+    )
+
+    results = []
+
+    for case in cases:
+        for size in sizes:
+            for distribution in lengths:
+                for mode in modes:
+                    for reproducible in seeded:
+                        result = isolated(
+                            case,
+                            size,
+                            distribution,
+                            mode,
+                            seed=seed,
+                            repeat=repeat,
+                            seeded=reproducible,
+                        )
+                        results.append(result)
+
+                        if log is not None:
+                            print(_format(result), file=log, flush=True)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def _key(result):
+    # the results stored before the seeded runs were added are unseeded
+    mode = result["mode"] + ("+seeded" if result.get("seeded") else "")
+    return result["case"], result["size"], result["lengths"], mode
+
+
+def _format(result):
+    return "{:<18} {:>8} {:<8} {:<15} {:>10.0f}/s  p50 {}  p99 {}  rss {:.0f}MB".format(
+        *_key(result),
+        result["throughput"] or 0,
+        "-" if result["p50_us"] is None else "{:.0f}us".format(result["p50_us"]),
+        "-" if result["p99_us"] is None else "{:.0f}us".format(result["p99_us"]),
+        result["peak_rss_mb"],
+    )
+
+
+def compare(current, baseline, threshold=THRESHOLD):
+    """
+    compare the throughput of two runs
+    :param current: results of run
+    :type current: dict
+    :param baseline: results of a previous run
+    :type baseline: dict
+    :param threshold: relative throughput drop flagged as a slowdown
+    :type threshold: float
+    :return: list of (key, baseline throughput, current throughput, ratio,
+        slowdown flag) of the cases in both runs
+    """
+    previous = {_key(r): r for r in baseline["results"]}
+    rows = []
+
+    for result in current["results"]:
+        before = previous.get(_key(result))
+        if before is None or not before["throughput"]:
+            continue
+
+        ratio = result["throughput"] / before["throughput"]
+        rows.append(
+            (
+                _key(result),
+                before["throughput"],
+                result["throughput"],
+                ratio,
+                ratio < 1 - threshold,
+            )
+        )
+
+    return rows
+
+
+def report(rows, file=sys.stdout):
+    """
+    print a comparison
+    :return: True if no slowdown was flagged
+    """
+    for key, before, after, ratio, slowdown in rows:
+        print(
+            "{:<50} {:>12.0f}/s -> {:>12.0f}/s  {:+6.1%}{}".format(
+                " ".join(map(str, key)),
+                before,
+                after,
+                ratio - 1,
+                "  SLOWDOWN" if slowdown else "",
+            ),
+            file=file,
+        )
+
+    return not any(row[-1] for row in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m nla.benchmark", description="augmentation benchmarks"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("run", help="run the benchmarks")
+    command.add_argument("--cases", help="comma separated cases, default all")
+    command.add_argument("--sizes", default="1000,10000")
+    command.add_argument("--lengths", default="normal", help=", ".join(LENGTHS))
+    command.add_argument("--modes", default="serial,parallel", help=", ".join(MODES))
+    command.add_argument("--seed", type=int, default=0)
+    command.add_argument("--repeat", type=int, default=3)
+    command.add_argument(
+        "--seeded", action="store_true", help="also time the seeded runs"
+    )
+    command.add_argument("--output", help="JSON file to store the results")
+    command.add_argument("--baseline", help="JSON results to compare to")
+    command.add_argument("--threshold", type=float, default=THRESHOLD)
+
+    command = commands.add_parser("compare", help="compare two stored runs")
+    command.add_argument("current")
+    command.add_argument("baseline")
+    command.add_argument("--threshold", type=float, default=THRESHOLD)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        current = run(
+            cases=args.cases.split(",") if args.cases else None,
+            sizes=[int(s) for s in args.sizes.split(",")],
+            lengths=args.lengths.split(","),
+            modes=args.modes.split(","),
+            seed=args.seed,
+            repeat=args.repeat,
+            seeded=(False, True) if args.seeded else (False,),
+            log=sys.stderr,
+        )
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=2)
+
+        baseline = args.baseline
+    else:
+        with open(args.current) as f:
+            current = json.load(f)
+        baseline = args.baseline
+
+    if baseline:
+        with open(baseline) as f:
+            baseline = json.load(f)
+
+        if not report(compare(current, baseline, args.threshold)):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
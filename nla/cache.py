@@ -0,0 +1,143 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from nla import stats
+
+
+class LRUCache:
+    """
+    bounded, thread safe memo with hit/miss statistics and optional on-disk
+    persistence
+
+    usage:
+        cache = LRUCache(maxsize=100000, path="homophones.cache")
+        value = cache.get_or_compute(key, function, *args)
+        cache.save()
+    """
+
+    def __init__(self, maxsize=100000, eviction="lru", path=None):
+        """
+        :param maxsize: maximum number of entries, None for unbounded
+        :type maxsize: int
+        :param eviction: 'lru' evicts the least recently used entry, 'fifo' the
+            oldest inserted one
+        :type eviction: str
+        :param path: file the entries are loaded from and saved to
+        :type path: str
+        """
+        evictions = ["lru", "fifo"]
+        assert eviction in evictions, "eviction argument needs to be either {}".format(
+            str(evictions)[1:-1]
+        )
+
+        self.maxsize = maxsize
+        self.eviction = eviction
+        self.path = path
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = self.misses = self.evictions = 0
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.data:
+                self.hits += 1
+                if stats.enabled:
+                    stats.count("cache.hits")
+                if self.eviction == "lru":
+                    self.data.move_to_end(key)
+                return self.data[key]
+
+            self.misses += 1
+            if stats.enabled:
+                stats.count("cache.misses")
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            if self.eviction == "lru":
+                self.data.move_to_end(key)
+
+            while self.maxsize is not None and len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, function, *args):
+        """
+        return the cached value of the key, computing and caching it on a miss
+        :param key: hashable key
+        :param function: computes the value from args
+        :return: value
+        """
+        value = self.get(key, _missing)
+
+        if value is _missing:
+            value = function(*args)
+            self.put(key, value)
+
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        :return: hits, misses, evictions, hit rate and size of the cache
+        """
+        total = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+        }
+
+    def save(self, path=None):
+        """
+        write the entries to disk, atomically
+        :param path: defaults to the path the cache was created with
+        :type path: str
+        """
+        path = path or self.path
+        assert path is not None, "path argument is needed to save the cache"
+
+        with self.lock:
+            items = list(self.data.items())
+
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(items, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path=None):
+        """
+        add the entries saved on disk, the most recently used ones are kept if
+        they don't fit
+        :param path: defaults to the path the cache was created with
+        :type path: str
+        """
+        path = path or self.path
+
+        with open(path, "rb") as f:
+            items = pickle.load(f)
+
+        for key, value in items:
+            self.put(key, value)
+
+
+_missing = object()
@@ -0,0 +1,254 @@
+"""
+Streaming corpus command line.
+
+Reads TXT, TSV or JSONL, optionally gzipped, line by line, runs an
+augmentation in parallel and streams the outputs with buffered writes, so the
+memory stays flat whatever the size of the input.
+
+usage:
+    python -m nla keyboard_sent_aug queries.tsv.gz out.tsv.gz --column 1 \
+        --degree 2 --count 3
+    python -m nla word_boundary queries.jsonl - --field query --keep id
+    python -m nla nn_fetch words.txt out.tsv --seed 1 --backend thread
+"""
+
+import io
+import sys
+import gzip
+import json
+import time
+import argparse
+from contextlib import nullcontext
+from functools import partial
+
+from nla import rng
+from nla.parallelize import *
+
+# number of output rows written at once
+BUFFER_ROWS = 10000
+
+AUGMENTATIONS = {
+    "fetch": ("nla.keyboard.randaug", "__fetch__", True),
+    "nn_fetch": ("nla.keyboard.keyaug", "__nn_fetch__", True),
+    "rand_sent_aug": ("nla.keyboard.nlaug", "__rand_sent_aug__", True),
+    "keyboard_sent_aug": ("nla.keyboard.nlaug", "__keyboard_sent_aug__", True),
+    "edge_n_gram": ("nla.edge_n_gram", "__edge_n_gram__", False),
+    "word_boundary": ("nla.word_boundary", "__word_boundary__", False),
+}
+
+
+def open_file(path, mode):
+    """
+    open a text file, gzipped if the path ends with .gz, '-' for stdin/stdout,
+    which are left open when the context exits
+    """
+    if path == "-":
+        return nullcontext(sys.stdin if "r" in mode else sys.stdout)
+
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, mode + "b"), encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8", buffering=1 << 20)
+
+
+def read(lines, fmt, column=0, field="text", keep=None):
+    """
+    lazily parse the input lines
+    :param lines: iterable of lines
+    :param fmt: 'txt', 'tsv' or 'jsonl'
+    :param column: column of the text in a tsv
+    :param field: field of the text in a jsonl
+    :param keep: identifier columns/fields to carry through, defaults to all the
+        other columns of a tsv and none of a jsonl
+    :return: generator of (text, identifiers), the identifiers are keyed by
+        position so that they never clash with the augmentation arguments
+    """
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line:
+            continue
+
+        if fmt == "txt":
+            yield line, {}
+
+        elif fmt == "tsv":
+            values = line.split("\t")
+            columns = (
+                [int(k) for k in keep]
+                if keep is not None
+                else [i for i in range(len(values)) if i != column]
+            )
+            yield values[column], {"id{}".format(i): values[i] for i in columns}
+
+        else:
+            record = json.loads(line)
+            yield record[field], {
+                "id{}".format(i): record.get(k) for i, k in enumerate(keep or [])
+            }
+
+
+def write(rows, fmt, keep=None):
+    """
+    format the output rows, augmented text, original text then identifiers
+    """
+    if fmt == "jsonl":
+        names = ["augmented", "original"] + list(keep or [])
+        return "".join(
+            json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+    return "".join("\t".join(map(str, row)) + "\n" for row in rows)
+
+
+class Record:
+    """
+    runs an augmentation on a (text, identifiers) record, the identifiers of
+    the record are passed as the identifier keyword arguments
+    """
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, record):
+        text, identifiers = record
+        return self.function(text, **identifiers)
+
+
+def augmentation(name, degree, count, method, position):
+    """
+    :return: function of a single text for the named augmentation
+    """
+    module, function, methods = AUGMENTATIONS[name]
+    function = getattr(__import__(module, fromlist=[function]), function)
+
+    if methods:
+        return partial(
+            function, degree=degree, count=count, method=method, position=position
+        )
+
+    return partial(function, degree=degree, count=count)
+
+
+def record_function(args):
+    """
+    :return: Record of the augmentation given on the command line
+    """
+    degree = (
+        float(args.degree) if args.augmentation == "word_boundary" else int(args.degree)
+    )
+    return Record(
+        augmentation(args.augmentation, degree, args.count, args.method, args.position)
+    )
+
+
+def run(args):
+    """
+    :return: number of input lines and output rows
+    """
+    function = record_function(args)
+
+    if args.seed is not None:
+        rng.seed(args.seed)
+
+    keep = args.keep.split(",") if args.keep else None
+    nlines = nrows = 0
+
+    with open_file(args.input, "r") as fin, open_file(args.output, "w") as fout:
+
+        def records():
+            nonlocal nlines
+
+            for record in read(fin, args.format, args.column, args.field, keep):
+                nlines += 1
+                yield record
+
+        # a single process runs serially, on the same seeded path as the others
+        backend = args.backend or ("serial" if args.processes == 1 else None)
+        outputs = iter_backend(
+            records(),
+            function,
+            backend,
+            chunksize=args.chunksize,
+            ordered=args.ordered,
+            max_inflight=args.max_inflight,
+            workers=args.processes,
+        )
+
+        for rows in batched(outputs, BUFFER_ROWS):
+            fout.write(write(rows, args.format, keep))
+            nrows += len(rows)
+
+    return nlines, nrows
+
+
+def arguments(p):
+    """
+    add the input format and augmentation arguments to a parser
+    """
+    p.add_argument("augmentation", choices=sorted(AUGMENTATIONS))
+    p.add_argument("input", help="input file, .gz for gzip, - for stdin")
+    p.add_argument("output", help="output file, .gz for gzip, - for stdout")
+    p.add_argument("--format", choices=["txt", "tsv", "jsonl"], help="input format")
+    p.add_argument("--column", type=int, default=0, help="text column of a tsv")
+    p.add_argument("--field", default="text", help="text field of a jsonl")
+    p.add_argument(
+        "--keep", help="comma separated identifier columns/fields to carry through"
+    )
+    p.add_argument("--degree", default="1")
+    p.add_argument("--count", type=int, default=1)
+    p.add_argument("--method", default="random")
+    p.add_argument("--position", default="random")
+    p.add_argument("--chunksize", type=int, default=256)
+    p.add_argument("--seed", type=int, help="seed for reproducible outputs")
+    return p
+
+
+def parser():
+    p = arguments(
+        argparse.ArgumentParser(
+            prog="python -m nla", description="stream a corpus through an augmentation"
+        )
+    )
+    p.add_argument(
+        "--processes", type=int, help="worker processes, 1 to run serially"
+    )
+    p.add_argument(
+        "--backend",
+        choices=["auto"] + sorted(BACKENDS),
+        help="execution backend, defaults to auto",
+    )
+    p.add_argument("--max-inflight", type=int, default=65536)
+    p.add_argument(
+        "--unordered",
+        dest="ordered",
+        action="store_false",
+        help="write outputs as they complete",
+    )
+    return p
+
+
+def input_format(path):
+    """
+    :return: input format from the extension of the path, 'txt' by default
+    """
+    name = path[:-3] if path.endswith(".gz") else path
+    return next((f for f in ["tsv", "jsonl"] if name.endswith("." + f)), "txt")
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+
+    if args.format is None:
+        args.format = input_format(args.input)
+
+    start = time.time()
+    nlines, nrows = run(args)
+    elapsed = time.time() - start
+
+    print(
+        "{} lines, {} outputs in {:.1f}s, {:.0f} lines/s".format(
+            nlines, nrows, elapsed, nlines / elapsed if elapsed else 0.0
+        ),
+        file=sys.stderr,
+    )
@@ -0,0 +1,263 @@
+"""
+Columnar input and output.
+
+The list entry points return one tuple per output, (augmented, original,
+*identifiers), repeating the original and the identifiers in every row. The
+columnar mode takes a column of strings, a list, numpy array, pandas Series or
+Arrow array, and returns parallel arrays instead: the augmented strings, the
+index of their original in the input column, and the identifiers, stored once
+for the whole column or once per input.
+
+    from nla.columnar import augment_columns
+
+    columns = augment_columns(
+        {"stage": "keyboard_sent_aug", "count": 3, "degree": 2},
+        df["query"],
+        category=df["category"],
+        source="generic1",
+    )
+    columns.to_pandas()
+"""
+
+import numpy as np
+from nla.pipeline import Pipeline, Stage
+from nla.parallelize import *
+
+
+def factorize(values):
+    """
+    code the values by their first appearance, with a dict rather than a sort
+    so that values of mixed types and missing values can be coded
+    :param values: hashable values
+    :type values: numpy.ndarray
+    :return: codes, -1 for a missing value, None or NaN, and the distinct
+        values that are not missing
+    """
+    positions = {}
+    codes = np.fromiter(
+        (
+            -1 if v is None or v != v else positions.setdefault(v, len(positions))
+            for v in values.tolist()
+        ),
+        dtype=np.int64,
+        count=len(values),
+    )
+
+    uniques = np.empty(len(positions), dtype=object)
+    uniques[:] = list(positions)
+    return codes, uniques
+
+
+class Columns:
+    """
+    augmented strings with the index of their original, the originals and the
+    identifiers are stored once
+    """
+
+    def __init__(self, augmented, index, original, identifiers):
+        """
+        :param augmented: augmented strings
+        :type augmented: numpy.ndarray
+        :param index: index of the original of every augmented string
+        :type index: numpy.ndarray
+        :param original: input strings
+        :type original: numpy.ndarray
+        :param identifiers: identifier name to a scalar, constant for the whole
+            column, or to an array with a value per input
+        :type identifiers: dict
+        """
+        self.augmented = augmented
+        self.index = index
+        self.original = original
+        self.identifiers = identifiers
+
+    def __len__(self):
+        return len(self.augmented)
+
+    def column(self, name):
+        """
+        :param name: 'augmented', 'original' or an identifier
+        :type name: str
+        :return: array with a value per augmented string, a scalar identifier
+            is returned as is
+        """
+        if name == "augmented":
+            return self.augmented
+
+        if name == "original":
+            return self.original[self.index]
+
+        value = self.identifiers[name]
+        return value[self.index] if isinstance(value, np.ndarray) else value
+
+    def rows(self):
+        """
+        :return: generator over the tuples of the list entry points
+        """
+        names = ["augmented", "original"] + list(self.identifiers)
+        columns = [
+            c if isinstance(c, np.ndarray) else [c] * len(self)
+            for c in map(self.column, names)
+        ]
+        return zip(*columns)
+
+    def to_pandas(self):
+        """
+        :return: pandas DataFrame, the originals and the identifiers with a
+            value per input are categorical, coded by the index, None and NaN
+            are missing values
+        """
+        import pandas as pd
+
+        data = {"augmented": self.augmented}
+
+        for name, value in [("original", self.original)] + list(
+            self.identifiers.items()
+        ):
+            if isinstance(value, np.ndarray):
+                codes, uniques = factorize(value)
+                value = pd.Categorical.from_codes(codes[self.index], uniques)
+            data[name] = value
+
+        return pd.DataFrame(data)
+
+    def to_arrow(self):
+        """
+        :return: pyarrow Table, the originals and the identifiers with a value
+            per input are dictionary encoded, None and NaN are null
+        """
+        import pyarrow as pa
+
+        data = {"augmented": pa.array(self.augmented, type=pa.string())}
+
+        for name, value in [("original", self.original)] + list(
+            self.identifiers.items()
+        ):
+            if isinstance(value, np.ndarray):
+                codes, uniques = factorize(value)
+                codes = codes[self.index]
+                value = pa.DictionaryArray.from_arrays(
+                    pa.array(codes, mask=codes < 0), pa.array(uniques)
+                )
+            else:
+                value = pa.array([value] * len(self))
+            data[name] = value
+
+        return pa.table(data)
+
+    def __repr__(self):
+        return "Columns({} outputs of {} inputs, identifiers {})".format(
+            len(self), len(self.original), list(self.identifiers)
+        )
+
+
+def to_array(column):
+    """
+    :param column: list, numpy array, pandas Series or Arrow array
+    :return: numpy object array
+    """
+    if hasattr(column, "to_pylist"):
+        column = column.to_pylist()
+    elif hasattr(column, "tolist"):
+        column = column.tolist()
+
+    array = np.empty(len(column), dtype=object)
+    array[:] = column
+    return array
+
+
+class _Batch:
+    """
+    augments a batch of an input column, returns the augmented strings and the
+    number of them for every input of the batch
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def __call__(self, task):
+        start, texts = task
+        augmented = []
+        counts = np.zeros(len(texts), dtype=np.int64)
+
+        for i, text in enumerate(texts):
+            before = len(augmented)
+            augmented.extend(self.pipeline.variants(text))
+            counts[i] = len(augmented) - before
+
+        return [(start, augmented, counts)]
+
+
+def augment_columns(
+    augmentation, texts, parallel=True, batch_size=1024, pool=None, **kwargs
+):
+    """
+    run an augmentation on a column of strings
+    :param augmentation: Pipeline, Stage or stage configuration
+    :param texts: column of strings to augment
+    :type texts: list, numpy.ndarray, pandas.Series or pyarrow.Array
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param batch_size: number of inputs sent to a worker at once
+    :type batch_size: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param kwargs: identifiers, a scalar for the whole column or a column with
+        a value per input
+    :return: Columns
+    """
+    if not isinstance(augmentation, Pipeline):
+        augmentation = Pipeline([augmentation])
+
+    original = to_array(texts)
+
+    identifiers = {}
+    for name, value in kwargs.items():
+        if isinstance(value, (str, bytes)) or not hasattr(value, "__len__"):
+            identifiers[name] = value
+            continue
+
+        value = to_array(value)
+        assert len(value) == len(
+            original
+        ), "identifier {} needs a value for every input".format(name)
+        identifiers[name] = value
+
+    tasks = (
+        (start, original[start : start + batch_size].tolist())
+        for start in range(0, len(original), batch_size)
+    )
+    function = _Batch(augmentation)
+
+    # the batches carry their offset, so they can complete in any order
+    results = sorted(
+        (
+            iter_parallel(tasks, function, ordered=False, pool=pool)
+            if parallel
+            else iter_serial(tasks, function)
+        ),
+        key=lambda result: result[0],
+    )
+
+    augmented = np.empty(sum(len(r[1]) for r in results), dtype=object)
+    augmented[:] = [a for r in results for a in r[1]]
+
+    index = np.repeat(
+        np.arange(len(original), dtype=np.int64),
+        np.concatenate([r[2] for r in results]) if results else 0,
+    )
+
+    return Columns(augmented, index, original, identifiers)
+
+
+if __name__ == "__main__":
+    data = ["DEEP NEURAL", "CRAVING MANIFEST"]
+    columns = augment_columns(
+        Stage("edge_n_gram", count=2, degree=2),
+        data,
+        parallel=True,
+        category=["a", "b"],
+        dummy_identifier_1="generic1",
+    )
+    print(columns)
+    print(list(columns.rows()))
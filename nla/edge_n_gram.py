@@ -1,5 +1,6 @@
 from itertools import product
-from random import sample
+from nla.rng import stream
+from nla import stats
 from nla.parallelize import *
 from functools import partial
 
@@ -20,21 +21,57 @@ def __edge_n_gram__(query, count, degree=4, **kwargs):
 
     # remove ~'degree' number of characters from every word in the sentence
     y = [
-        {
-            w[: (-1 * i)] if (len(w) > i) & (len(w[: (-1 * i)]) >= threshold) else w
-            for i in range(1, degree + 1)
-        }
+        sorted(
+            {
+                w[: (-1 * i)]
+                if (len(w) > i) & (len(w[: (-1 * i)]) >= threshold)
+                else w
+                for i in range(1, degree + 1)
+            }
+        )
         for w in query.split()
     ]
 
+    # size of the product of the truncations of every word
+    total = 1
+    for t in y:
+        total *= len(t)
+
+    if stats.enabled:
+        stats.count("edge_n_gram.product", total)
+        stats.count("edge_n_gram.outputs", min(count, total))
+
     # add the augmented sentence along with the identifiers
-    new = [(" ".join(a), query) + tuple(kwargs.values()) for a in product(*y)]
-    new = sample(new, count) if count < len(new) else new
-    
-    return new
+    if count >= total:
+        return [(" ".join(a), query) + tuple(kwargs.values()) for a in product(*y)]
+
+    # sample distinct indices of the product and decode only those
+    return [
+        (" ".join(combination(y, ix)), query) + tuple(kwargs.values())
+        for ix in stream().sample(range(total), count)
+    ]
+
+
+def combination(y, index):
+    """
+    decode an index of the product of the sequences into its combination, in
+    the order of itertools.product
+    :param y: sequences
+    :type y: list
+    :param index: index in the product
+    :type index: int
+    :return: combination at the index
+    """
+    result = []
+
+    for t in reversed(y):
+        index, i = divmod(index, len(t))
+        result.append(t[i])
+
+    return result[::-1]
 
 
-def edge_n_gram(queries, count, degree, parallel=True, **kwargs):
+def edge_n_gram(queries, count, degree, parallel=True, pool=None, **kwargs):
     """
     run the augmentation on list of sentences
     :param queries: sentences to augment
@@ -45,6 +82,8 @@ def edge_n_gram(queries, count, degree, parallel=True, **kwargs):
     :type degree: int
     :param parallel: run in parallel
     :type parallel: bool
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
     :param kwargs:
     :return:
     """
@@ -55,7 +94,7 @@ def edge_n_gram(queries, count, degree, parallel=True, **kwargs):
             degree=degree,
             count=count,
         )
-        return run_parallel(queries, function)
+        return run_parallel(queries, function, pool=pool)
 
     else:
 #         return [
@@ -71,6 +110,64 @@ def edge_n_gram(queries, count, degree, parallel=True, **kwargs):
         return output
 
 
+# lazy counterpart of edge_n_gram
+def iter_edge_n_gram(
+    queries,
+    count,
+    degree,
+    parallel=True,
+    chunksize=64,
+    ordered=True,
+    max_inflight=None,
+    pool=None,
+    backend=None,
+    **kwargs
+):
+    """
+    lazily run the augmentation on any iterable of sentences
+    :param queries: sentences to augment
+    :type queries: iterable
+    :param count: number of output for each query
+    :type count: int
+    :param degree: number of characters to remove from each word
+    :type degree: int
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param chunksize: number of sentences sent to a worker at once
+    :type chunksize: int
+    :param ordered: yield outputs in the input order
+    :type ordered: bool
+    :param max_inflight: maximum sentences being processed at once
+    :type max_inflight: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param backend: 'auto' or one of the parallelize BACKENDS, defaults to
+        get_backend()
+    :type backend: str
+    :param kwargs:
+    :return: generator over the augmented tuples
+    """
+    function = partial(
+        __edge_n_gram__,
+        **kwargs,
+        degree=degree,
+        count=count,
+    )
+
+    if parallel:
+        return iter_backend(
+            queries,
+            function,
+            backend,
+            chunksize=chunksize,
+            ordered=ordered,
+            max_inflight=max_inflight,
+            pool=pool,
+        )
+
+    return iter_serial(queries, function)
+
+
 if __name__ == "__main__":
     # serial execution
     print(__edge_n_gram__(query="DEEP NEURAL CRAVING", count=10, degree=4, args="generic"))
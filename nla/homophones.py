@@ -1,23 +1,147 @@
 import os
-import transly.pronunciation as tp
-
+import threading
+import numpy as np
+from nla.cache import LRUCache
+from nla import stats
 
 filepath = os.path.dirname(os.path.abspath(__file__))
 
-pronunciation = tp.load_model(model_path="cmu")
-wordgen = tp.load_model(filepath + "/models/homophones/", "model.h5")
+# the models, and transly with tensorflow, are loaded on first use
+pronunciation = None
+wordgen = None
+_lock = threading.Lock()
 
 
-def genome(query, beamwidth=50):
-    query = query.upper()
+def load():
+    """
+    load the grapheme to phoneme and the phoneme to grapheme models, once per
+    process. tensorflow isn't fork safe, preload this module in a 'forkserver'
+    WorkerPool to share the models with the workers
+    :return: pronunciation and word generation models
+    """
+    global pronunciation, wordgen
 
-    result = []
+    with _lock:
+        if wordgen is None:
+            with stats.timer("genome.load"):
+                import transly.pronunciation as tp
+
+                pronunciation = tp.load_model(model_path="cmu")
+                wordgen = tp.load_model(filepath + "/models/homophones/", "model.h5")
+
+    return pronunciation, wordgen
+
+
+def loaded():
+    """
+    :return: True if the models are loaded
+    """
+    return wordgen is not None
+
+
+def warmup():
+    """
+    load the models and run them once, so that the first genome call doesn't
+    pay for the model loading and the graph building
+    """
+    load()
+    pronunciation.infer("A", " ")
+    wordgen.beamsearch(pronunciation.infer("A", " "), mode="", beam_width=1)
+
+
+# memo of the grapheme to phoneme step keyed by chunk and of the phoneme to
+# grapheme step keyed by (phonemes, beam width)
+cache = LRUCache(maxsize=100000)
+
+
+def configure_cache(maxsize=100000, eviction="lru", path=None):
+    """
+    replace the chunk memo, the cached entries are dropped
+    :param maxsize: maximum number of cached chunks, None for unbounded
+    :type maxsize: int
+    :param eviction: 'lru' or 'fifo'
+    :type eviction: str
+    :param path: file to persist the memo to with save_cache, loaded if it exists
+    :type path: str
+    :return: the new cache
+    """
+    global cache
+
+    cache = LRUCache(maxsize=maxsize, eviction=eviction, path=path)
+    return cache
+
+
+def save_cache(path=None):
+    """
+    persist the chunk memo to disk
+    :param path: defaults to the path given to configure_cache
+    :type path: str
+    """
+    cache.save(path)
+
+
+def cache_stats():
+    """
+    :return: hit/miss statistics of the chunk memo
+    """
+    return cache.stats()
+
+
+def phonemes(chunk):
+    """
+    grapheme to phoneme, memoized
+    :param chunk: characters
+    :type chunk: str
+    :return: space separated phonemes
+    """
+    return cache.get_or_compute(("g2p", chunk), _infer, chunk)
+
+
+def graphemes(phoneme, beam_width):
+    """
+    phoneme to grapheme, memoized
+    :param phoneme: space separated phonemes
+    :type phoneme: str
+    :param beam_width: number of candidates
+    :type beam_width: int
+    :return: list of candidate spellings
+    """
+    return list(
+        cache.get_or_compute(
+            ("p2g", phoneme, beam_width), _beamsearch, phoneme, beam_width
+        )
+    )
+
+
+def _infer(chunk):
+    model = load()[0]
+
+    with stats.timer("genome.g2p"):
+        return model.infer(chunk, " ")
+
+
+def _beamsearch(phoneme, beam_width):
+    model = load()[1]
+
+    with stats.timer("genome.p2g"):
+        return tuple(model.beamsearch(phoneme, mode="", beam_width=beam_width))
+
+
+def chunks(query, beamwidth=50):
+    """
+    split a query in the chunks genome runs the models on
+    :param query: word to augment
+    :type query: str
+    :param beamwidth: number of outputs
+    :type beamwidth: int
+    :return: list of parts, a part is a list of (chunk, beam width) whose
+        spellings are concatenated
+    """
+    parts = []
     splits = [4]
 
     if len(query) < 10:
-        result += wordgen.beamsearch(
-            pronunciation.infer(query, " "), mode="", beam_width=beamwidth // 3
-        )
+        parts.append([(query, beamwidth // 3)])
         splits += [3]
 
     for nsplit in splits:
@@ -35,15 +159,201 @@ def genome(query, beamwidth=50):
             qsplit[-2] = qsplit[-2] + qsplit[-1]
             qsplit = qsplit[:-1]
 
-        z = [
-            wordgen.beamsearch(
-                pronunciation.infer(word, " "), mode="", beam_width=beamwidth // beamw
-            )
-            for word in qsplit
-        ]
+        parts.append([(word, beamwidth // beamw) for word in qsplit])
+
+    return parts
+
+
+def assemble(parts, spellings):
+    """
+    :param parts: chunks of a query
+    :param spellings: function from (chunk, beam width) to the chunk spellings
+    :return: list of distinct homophones, in the order of the spellings
+    """
+    result = []
+
+    for part in parts:
+        z = [spellings(chunk, beam_width) for chunk, beam_width in part]
         result += ["".join(i) for i in zip(*z)]
-    return list(set(result))
+
+    # not a set, its order would depend on PYTHONHASHSEED
+    return list(dict.fromkeys(result))
+
+
+def genome(query, beamwidth=50):
+    query = query.upper()
+
+    return assemble(
+        chunks(query, beamwidth),
+        lambda chunk, beam_width: graphemes(phonemes(chunk), beam_width),
+    )
+
+
+def infer_batch(model, texts):
+    """
+    greedy decoding of a batch of texts, batched counterpart of model.infer
+    :param model: character level seq2seq model
+    :param texts: list of texts
+    :type texts: list
+    :return: list of space separated outputs
+    """
+    encoder_input = np.array(
+        [
+            [model.input_char2ix[c] for c in t]
+            + [model.pad_index] * (model.max_length_input - len(t))
+            for t in texts
+        ]
+    )
+    decoder_input = np.full((len(texts), model.max_length_output), model.pad_index)
+    decoder_input[:, 0] = model.go_index
+
+    finished = np.zeros(len(texts), dtype=bool)
+
+    for i in range(2, model.max_length_output):
+        output = model.model.predict([encoder_input, decoder_input], verbose=0)
+        decoder_input[:, i] = np.where(
+            finished, model.pad_index, output[:, i].argmax(axis=-1)
+        )
+
+        finished |= decoder_input[:, i] == model.pad_index
+        if finished.all():
+            break
+
+    return [
+        model.decode(ix2char=model.output_ix2char, vector=d[1:], separator=" ")
+        for d in decoder_input
+    ]
+
+
+def beamsearch_batch(model, texts, beam_width):
+    """
+    beam search of a batch of texts, batched counterpart of model.beamsearch
+    with word level input
+    :param model: seq2seq model
+    :param texts: list of space separated texts
+    :type texts: list
+    :param beam_width: number of results for every text
+    :type beam_width: int
+    :return: list of results for every text
+    """
+    b, w = len(texts), beam_width
+    length = model.max_length_output
+
+    encoder_input = np.repeat(
+        [
+            [model.input_char2ix[c] for c in t.split()]
+            + [model.pad_index] * (model.max_length_input - len(t.split()))
+            for t in texts
+        ],
+        w,
+        axis=0,
+    )
+
+    decoder_input = np.full((b, w, length), model.pad_index)
+    decoder_input[:, :, 0] = model.go_index
+
+    score = np.ones((b, w))
+    rows = np.arange(b)[:, None]
+
+    for i in range(1, length):
+        output = model.model.predict(
+            [encoder_input, decoder_input.reshape(b * w, length)], verbose=0
+        )[:, i].reshape(b, w, -1)
+
+        # top k of every beam and their scores
+        topk = output.argsort(axis=-1)[..., -w:][..., ::-1]
+        valk = np.take_along_axis(output, topk, axis=-1) * score[..., None]
+
+        # at the first step all the beams are the same
+        if i == 1:
+            topk, valk = topk[:, 0], valk[:, 0]
+        else:
+            topk, valk = topk.reshape(b, w * w), valk.reshape(b, w * w)
+
+        idx = valk.argsort(axis=1)[:, -w:][:, ::-1]
+
+        decoder_input = decoder_input[rows, idx // w if i != 1 else 0 * idx]
+        decoder_input[:, :, i] = np.take_along_axis(topk, idx, axis=1)
+        score = np.take_along_axis(valk, idx, axis=1)
+
+    return [
+        [
+            model.decode(ix2char=model.output_ix2char, vector=d[1:], separator="")
+            for d in beams
+        ]
+        for beams in decoder_input
+    ]
+
+
+def genome_many(queries, beamwidth=50, batch_size=256):
+    """
+    homophones of many words, the chunks of all the words are deduplicated
+    and run through the models in padded batches
+    :param queries: words to augment
+    :type queries: list
+    :param beamwidth: number of outputs
+    :type beamwidth: int
+    :param batch_size: number of chunks in a model batch
+    :type batch_size: int
+    :return: list of homophones for every word
+    """
+    plans = [chunks(query.upper(), beamwidth) for query in queries]
+    pairs = {pair for parts in plans for part in parts for pair in part}
+
+    # grapheme to phoneme for the chunks missing from the memo
+    g2p = {chunk: cache.get(("g2p", chunk)) for chunk in {c for c, _ in pairs}}
+    missing = sorted(chunk for chunk, value in g2p.items() if value is None)
+
+    if missing:
+        load()
+
+    for i in range(0, len(missing), batch_size):
+        batch = missing[i : i + batch_size]
+
+        with stats.timer("genome.g2p_batch"):
+            phonemes_batch = infer_batch(pronunciation, batch)
+
+        for chunk, phoneme in zip(batch, phonemes_batch):
+            cache.put(("g2p", chunk), phoneme)
+            g2p[chunk] = phoneme
+
+    # phoneme to grapheme, batched per beam width
+    p2g = {}
+    missing = {}
+
+    for chunk, beam_width in pairs:
+        key = ("p2g", g2p[chunk], beam_width)
+        p2g[key] = cache.get(key)
+
+        if p2g[key] is None:
+            missing.setdefault(beam_width, set()).add(g2p[chunk])
+
+    if missing:
+        load()
+
+    for beam_width, phoneme_set in missing.items():
+        phoneme_list = sorted(phoneme_set)
+
+        for i in range(0, len(phoneme_list), batch_size):
+            batch = phoneme_list[i : i + batch_size]
+
+            with stats.timer("genome.p2g_batch"):
+                spellings_batch = beamsearch_batch(wordgen, batch, beam_width)
+
+            for phoneme, spellings in zip(batch, spellings_batch):
+                key = ("p2g", phoneme, beam_width)
+                cache.put(key, tuple(spellings))
+                p2g[key] = tuple(spellings)
+
+    return [
+        assemble(
+            parts,
+            lambda chunk, beam_width: list(p2g[("p2g", g2p[chunk], beam_width)]),
+        )
+        for parts in plans
+    ]
 
 
 if __name__ == "__main__":
     print(genome("CARROM", beamwidth=20))
+    print(genome_many(["CARROM", "POWDER", "PARACETAMOL"], beamwidth=20))
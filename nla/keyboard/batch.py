@@ -0,0 +1,752 @@
+"""
+Batch engine for the random and keyboard augmentations. A batch of words is
+packed into a padded uint32 array of character codes with a lengths vector, the
+edits are drawn and applied as array operations for the whole batch and the
+words are decoded back to strings only at the end.
+"""
+
+import re
+import numpy as np
+from nla.rng import randint, random
+from functools import partial
+from nla.keyboard.randaug import pos_word, check_method
+from nla.keyboard.keyaug import nn_sample
+from nla.parallelize import *
+
+# character codes of the replacement/insertion alphabet, 'A' to 'Z'
+ALPHABET = (ord("A"), ord("Z") + 1)
+
+
+def pack(words, extra=0):
+    """
+    pack the words in a padded array of character codes
+    :param words: words to pack
+    :type words: list
+    :param extra: number of padding columns to add for growing words
+    :type extra: int
+    :return: codes of shape (len(words), max length + extra), lengths
+    """
+    lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    width = int(lengths.max()) if len(words) else 0
+
+    codes = np.zeros((len(words), width + extra), dtype=np.uint32)
+
+    if width:
+        codes[:, :width] = (
+            np.array(words, dtype="<U{}".format(width))
+            .view(np.uint32)
+            .reshape(len(words), width)
+        )
+
+    return codes, lengths
+
+
+def unpack(codes):
+    """
+    decode an array of character codes, the characters of a row need to be
+    contiguous and followed by zero padding only
+    :param codes: codes of shape (words, width)
+    :type codes: numpy.ndarray
+    :return: list of words
+    """
+    if not codes.shape[1]:
+        return [""] * codes.shape[0]
+
+    return (
+        np.ascontiguousarray(codes, dtype=np.uint32)
+        .view("<U{}".format(codes.shape[1]))
+        .ravel()
+        .tolist()
+    )
+
+
+def candidates(lengths, width, start, stop, step):
+    """
+    mask of the positions in range(start, length + stop, step) of every row
+    :param lengths: length of every row
+    :param width: number of columns of the mask
+    :param start: first position of every row
+    :param stop: offset of the end of the range from the length of the row
+    :param step: step of every row
+    :return: boolean mask of shape (rows, width)
+    """
+    pos = np.arange(width)[None, :]
+    start, step = start[:, None], step[:, None]
+
+    return (
+        (pos >= start) & (pos < (lengths + stop)[:, None]) & ((pos - start) % step == 0)
+    )
+
+
+def select(mask, k):
+    """
+    select k distinct positions uniformly among the candidates of every row
+    :param mask: candidate positions
+    :type mask: numpy.ndarray
+    :param k: number of positions to select in every row
+    :type k: numpy.ndarray
+    :return: boolean mask of the selected positions
+    """
+    keys = random(mask.shape)
+    keys[~mask] = 2.0
+
+    ranks = np.empty(mask.shape, dtype=np.int64)
+    np.put_along_axis(
+        ranks, keys.argsort(axis=1), np.arange(mask.shape[1])[None, :], axis=1
+    )
+
+    return mask & (ranks < k[:, None])
+
+
+def gaps(lengths, width, start, stop, step, k):
+    """
+    select the gaps of the insertions as the scalar functions do, k positions
+    in range(start, length + stop, step) counted in the growing word, the j-th
+    of a row goes before the character at its position - j of the word
+    :param lengths: length of every row
+    :param width: number of columns of the mask, at least the longest row
+    :param start: first position of every row
+    :param stop: offset of the end of the range from the length of the row
+    :param step: step of every row
+    :param k: number of insertions in every row
+    :return: boolean mask of shape (rows, width), True before the characters
+        getting a new one
+    """
+    grown = select(
+        candidates(lengths, width + int(k.max(initial=0)), start, stop, step), k
+    )
+    rows, cols = grown.nonzero()
+    j = grown.cumsum(axis=1)[rows, cols] - 1
+
+    sel = np.zeros((len(lengths), width), dtype=bool)
+    sel[rows, cols - j] = True
+    return sel
+
+
+def letters(size):
+    return randint(*ALPHABET, size=size).astype(np.uint32)
+
+
+def batch_swap(codes, lengths, degree):
+    """
+    swap random characters, vectorized counterpart of randaug.swap
+    :param codes: packed words
+    :param lengths: length of every word
+    :param degree: degree of every word
+    :return: codes, lengths and whether any edit was applied to a row
+    """
+    single = degree == 1
+    n, width = codes.shape
+
+    start = np.where(single, 0, randint(1, 3, n))
+    step = np.where(single, 1, 3)
+    k = np.where(single, 1, np.minimum(lengths // 3, degree))
+
+    sel = select(candidates(lengths, width, start, -1, step), k)
+    rows, cols = sel.nonzero()
+
+    # positions are 3 apart, so the swapped pairs never overlap
+    lr = np.where(single[rows], 1, randint(0, 2, len(rows)) * 2 - 1)
+    partner = cols + lr
+
+    codes[rows, cols], codes[rows, partner] = (codes[rows, partner], codes[rows, cols])
+
+    return codes, lengths, sel.any(axis=1)
+
+
+def batch_delete(codes, lengths, degree):
+    """
+    delete random characters, vectorized counterpart of randaug.delete
+    :param codes: packed words
+    :param lengths: length of every word
+    :param degree: degree of every word
+    :return: codes, lengths and whether any edit was applied to a row
+    """
+    single = degree == 1
+    n, width = codes.shape
+
+    start = np.where(single, 0, randint(0, 2, n))
+    step = np.where(single, 1, 2)
+    k = np.where(single, 1, np.minimum(lengths // 2, degree))
+
+    sel = select(candidates(lengths, width, start, -1, step), k)
+    pos = np.arange(width)[None, :]
+    keep = (pos < lengths[:, None]) & ~sel
+
+    # move the kept characters to the front, preserving their order
+    order = (~keep).argsort(axis=1, kind="stable")
+    codes = np.take_along_axis(codes, order, axis=1)
+    lengths = keep.sum(axis=1)
+    codes[pos >= lengths[:, None]] = 0
+
+    return codes, lengths, sel.any(axis=1)
+
+
+def batch_insert(codes, lengths, degree):
+    """
+    insert random characters, vectorized counterpart of randaug.insert
+    :param codes: packed words, with at least one padding column
+    :param lengths: length of every word
+    :param degree: degree of every word
+    :return: codes, lengths and whether any edit was applied to a row
+    """
+    single = degree == 1
+    n, width = codes.shape
+
+    # a selected position is a gap, the new character goes before position
+    start = np.where(single, 0, randint(0, 2, n))
+    step = np.where(single, 1, 2)
+    k = np.where(single, 1, np.minimum(lengths, degree))
+    stop = np.where(single, -1, k - 1)
+
+    sel = gaps(lengths, width, start, stop, step, k)
+    shift = sel.cumsum(axis=1)
+
+    out = np.zeros((n, width + int(k.max(initial=0))), dtype=np.uint32)
+
+    rows, cols = (np.arange(width)[None, :] < lengths[:, None]).nonzero()
+    out[rows, cols + shift[rows, cols]] = codes[rows, cols]
+
+    rows, cols = sel.nonzero()
+    out[rows, cols + shift[rows, cols] - 1] = letters(len(rows))
+
+    return out, lengths + sel.sum(axis=1), sel.any(axis=1)
+
+
+def batch_replace(codes, lengths, degree):
+    """
+    replace random characters, vectorized counterpart of randaug.replace
+    :param codes: packed words
+    :param lengths: length of every word
+    :param degree: degree of every word
+    :return: codes, lengths and whether any edit was applied to a row
+    """
+    single = degree == 1
+    n, width = codes.shape
+
+    start = np.where(single, 0, randint(0, 2, n))
+    step = np.ones(n, dtype=np.int64)
+    k = np.where(single, 1, np.minimum(lengths, degree))
+
+    sel = select(candidates(lengths, width, start, -1, step), k)
+    codes[sel] = letters(int(sel.sum()))
+
+    return codes, lengths, sel.any(axis=1)
+
+
+def _nn_insert(codes, lengths, degree):
+    n, width = codes.shape
+
+    # a selected position is a gap, the new character goes before position
+    start = randint(0, 2, n)
+    step = np.full(n, 2)
+    k = np.minimum(lengths, degree)
+
+    sel = gaps(lengths, width, start, k - 1, step, k)
+    shift = sel.cumsum(axis=1)
+
+    out = np.zeros((n, width + int(k.max(initial=0))), dtype=np.uint32)
+
+    rows, cols = (np.arange(width)[None, :] < lengths[:, None]).nonzero()
+    out[rows, cols + shift[rows, cols]] = codes[rows, cols]
+
+    # neighbour of the character the new one goes before
+    rows, cols = sel.nonzero()
+    before = codes[rows, cols]
+
+    inserted = np.zeros(out.shape, dtype=bool)
+    inserted[rows, cols + shift[rows, cols] - 1] = True
+    out[inserted] = nn_sample(before)
+
+    return out, lengths + sel.sum(axis=1), inserted
+
+
+def _nn_replace(codes, lengths, degree):
+    n, width = codes.shape
+
+    start = randint(0, 2, n)
+    step = np.ones(n, dtype=np.int64)
+    k = np.minimum(lengths, degree)
+
+    sel = select(candidates(lengths, width, start, -1, step), k)
+    codes[sel] = nn_sample(codes[sel])
+
+    return codes, lengths, sel
+
+
+def batch_nn_insert(codes, lengths, degree):
+    """
+    insert keyboard neighbours, vectorized counterpart of keyaug.nn_insert
+    :param codes: packed words, with at least one padding column
+    :param lengths: length of every word
+    :param degree: degree of every word
+    :return: codes, lengths and whether any edit was applied to a row
+    """
+    codes, lengths, inserted = _nn_insert(codes, lengths, degree)
+    return codes, lengths, inserted.any(axis=1)
+
+
+def batch_nn_replace(codes, lengths, degree):
+    """
+    replace with keyboard neighbours, vectorized counterpart of
+    keyaug.nn_replace
+    :param codes: packed words
+    :param lengths: length of every word
+    :param degree: degree of every word
+    :return: codes, lengths and whether any edit was applied to a row
+    """
+    codes, lengths, replaced = _nn_replace(codes, lengths, degree)
+    return codes, lengths, replaced.any(axis=1)
+
+
+def batch_nn_swap(codes, lengths, degree):
+    """
+    insert or replace keyboard neighbours and swap them with a character next
+    to them, vectorized counterpart of keyaug.nn_swap
+    :param codes: packed words, with at least one padding column
+    :param lengths: length of every word
+    :param degree: degree of every word
+    :return: codes, lengths and whether any edit was applied to a row
+    """
+    n, width = codes.shape
+    inserting = randint(0, 2, n).astype(bool)
+
+    out = np.zeros((n, width + int(degree.max(initial=0))), dtype=np.uint32)
+    edited = np.zeros(out.shape, dtype=bool)
+    lengths = lengths.copy()
+
+    for function, rows in ((_nn_insert, inserting), (_nn_replace, ~inserting)):
+        rows = rows.nonzero()[0]
+        if len(rows):
+            c, lengths[rows], e = function(codes[rows], lengths[rows], degree[rows])
+            out[rows, : c.shape[1]] = c
+            edited[rows, : e.shape[1]] = e
+
+    # swap in position order, as the scalar function does
+    for ix in range(1, out.shape[1]):
+        rows = edited[:, ix].nonzero()[0]
+        if not len(rows):
+            continue
+
+        partner = ix + randint(-1, 2, len(rows))
+        partner = np.where(partner < lengths[rows], partner, ix)
+
+        out[rows, ix], out[rows, partner] = out[rows, partner], out[rows, ix]
+
+    return out, lengths, edited.any(axis=1)
+
+
+# batch augmentations selected by the method argument
+BATCH_FUNCTIONS = {
+    "swap": [batch_swap],
+    "delete": [batch_delete],
+    "insert": [batch_insert],
+    "replace": [batch_replace],
+    "random": [batch_swap, batch_insert, batch_replace, batch_delete],
+}
+
+# batch keyboard augmentations selected by the method argument, nn_replace is
+# listed thrice in random as in keyaug.NN_FUNCTIONS
+NN_BATCH_FUNCTIONS = {
+    "swap": [batch_nn_swap],
+    "insert": [batch_nn_insert],
+    "replace": [batch_nn_replace],
+    "random": [
+        batch_nn_swap,
+        batch_nn_insert,
+        batch_nn_replace,
+        batch_nn_replace,
+        batch_nn_replace,
+    ],
+}
+
+
+def augment(words, degrees, functions):
+    """
+    augment every word once with a function drawn from the functions
+    :param words: words to augment
+    :type words: list
+    :param degrees: number of places to augment in every word
+    :type degrees: numpy.ndarray
+    :param functions: batch functions to draw from
+    :type functions: list
+    :return: list of augmented words, None where no augmentation was possible
+    """
+    n = len(words)
+    codes, lengths = pack(words, extra=1)
+    fid = randint(0, len(functions), n)
+
+    output = [None] * n
+
+    for i, function in enumerate(functions):
+        rows = (fid == i).nonzero()[0]
+        if not len(rows):
+            continue
+
+        out, out_lengths, applied = function(codes[rows], lengths[rows], degrees[rows])
+
+        # a row where no edit could be applied gives no output, like the
+        # empty variant spaces of the scalar functions
+        valid = applied & (out_lengths > 0)
+
+        for row, word, ok in zip(rows.tolist(), unpack(out), valid.tolist()):
+            if ok:
+                output[row] = word
+
+    return output
+
+
+def _fetch(words, degree, count, functions, position):
+    """
+    :return: distinct augmented words for every word, in draw order
+    """
+    splits = [pos_word(word, position) for word in words]
+    # insertion ordered, so that a seeded stream gives the same sequence
+    results = [{} for _ in words]
+
+    # two rounds of count candidates, the retry budget of __fetch__
+    pending = np.arange(len(words))
+
+    for _ in range(2):
+        if not len(pending):
+            break
+
+        rows = np.repeat(pending, count)
+        augwords = augment(
+            [splits[r][1] for r in rows],
+            randint(0, degree, len(rows)) + 1,
+            functions,
+        )
+
+        for row, augword in zip(rows.tolist(), augwords):
+            if augword is not None and len(results[row]) < count:
+                word_head, _, word_tail = splits[row]
+                results[row].setdefault(word_head + augword + word_tail)
+
+        pending = np.array([i for i in pending if len(results[i]) < count], dtype=int)
+
+    return results
+
+
+def __batch_fetch__(words, degree, count, method="random", position="random", **kwargs):
+    """
+    run the given augmentation on a batch of words, batch counterpart of
+    __fetch__
+    :param words: words to augment
+    :type words: list
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs for each word
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :return: list of tuples with augmented word, word and identifiers
+    """
+    functions = BATCH_FUNCTIONS
+    check_method(method, functions)
+
+    words = list(words)
+    results = _fetch(words, degree, count, functions[method], position)
+
+    return [
+        (w, word) + tuple(kwargs.values())
+        for word, result in zip(words, results)
+        for w in result
+    ]
+
+
+# run_parallel wrapper on __batch_fetch__
+def batch_fetch(
+    words,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    batch_size=4096,
+    pool=None,
+    **kwargs
+):
+    """
+    run the given augmentation on given list of words, in batches
+    :param words: list of words to augment
+    :type words: list
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param batch_size: number of words augmented at once
+    :type batch_size: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param kwargs:
+    :return: list of tuples with augmented word, word and identifiers
+    """
+    function = partial(
+        __batch_fetch__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+    batches = list(batched(words, batch_size))
+
+    if parallel:
+        return run_parallel(batches, function, pool=pool, nogil=True)
+
+    return list(iter_serial(batches, function))
+
+
+def __batch_nn_fetch__(
+    words, degree, count, method="random", position="random", **kwargs
+):
+    """
+    run the given keyboard augmentation on a batch of words, batch
+    counterpart of __nn_fetch__
+    :param words: words to augment
+    :type words: list
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs for each word
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :return: list of tuples with augmented word, word and identifiers
+    """
+    functions = NN_BATCH_FUNCTIONS
+    check_method(method, functions)
+
+    words = list(words)
+    alpha = [not re.match(r"[^A-Z]", pos_word(word, position)[1]) for word in words]
+
+    results = iter(
+        _fetch(
+            [word for word, a in zip(words, alpha) if a],
+            degree,
+            count,
+            functions[method],
+            position,
+        )
+    )
+
+    output = []
+
+    for word, a in zip(words, alpha):
+        if a:
+            output.extend((w, word) + tuple(kwargs.values()) for w in next(results))
+        else:
+            # as __nn_fetch__, the word is returned as it is
+            output.append((word, word) + tuple(kwargs.values()))
+
+    return output
+
+
+# run_parallel wrapper on __batch_nn_fetch__
+def batch_nn_fetch(
+    words,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    batch_size=4096,
+    pool=None,
+    **kwargs
+):
+    """
+    run the given keyboard augmentation on given list of words, in batches
+    :param words: list of words to augment
+    :type words: list
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param batch_size: number of words augmented at once
+    :type batch_size: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param kwargs:
+    :return: list of tuples with augmented word, word and identifiers
+    """
+    function = partial(
+        __batch_nn_fetch__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+    batches = list(batched(words, batch_size))
+
+    if parallel:
+        return run_parallel(batches, function, pool=pool, nogil=True)
+
+    return list(iter_serial(batches, function))
+
+
+def __batch_keyboard_sent_aug__(
+    sentences, degree, count, method="random", position="random", **kwargs
+):
+    """
+    run the given keyboard augmentation on a batch of sentences, batch
+    counterpart of __keyboard_sent_aug__
+    :param sentences: sentences to augment
+    :type sentences: list
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs for each sentence
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :return: list of augmented sentence, sentence and identifiers
+    """
+    functions = NN_BATCH_FUNCTIONS
+    check_method(method, functions)
+
+    splits = {}
+    rows, tokens = [], []
+
+    for sentence in sentences:
+        words = sentence.split()
+
+        for w in words:
+            # words that don't contain only alphabets are kept as they are
+            if w not in splits:
+                splits[w] = None if re.findall(r"[^A-Z]", w) else pos_word(w, position)
+
+        for _ in range(count):
+            row = []
+
+            for w in words:
+                if splits[w] is None:
+                    row.append(str(w))
+                else:
+                    row.append(len(tokens))
+                    tokens.append(w)
+
+            rows.append((sentence, row))
+
+    augwords = augment(
+        [splits[w][1] for w in tokens],
+        np.full(len(tokens), degree),
+        functions[method],
+    )
+
+    for i, (w, augword) in enumerate(zip(tokens, augwords)):
+        word_head, word, word_tail = splits[w]
+        augwords[i] = word_head + (word if augword is None else augword) + word_tail
+
+    return [
+        [
+            " ".join(augwords[w] if isinstance(w, int) else w for w in row),
+            sentence,
+        ]
+        + list(kwargs.values())
+        for sentence, row in rows
+    ]
+
+
+# run_parallel wrapper on __batch_keyboard_sent_aug__
+def batch_keyboard_sent_aug(
+    sentences,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    batch_size=1024,
+    pool=None,
+    **kwargs
+):
+    """
+    run the given keyboard augmentation on given list of sentences, in batches
+    :param sentences: list of sentences to augment
+    :type sentences: list
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param batch_size: number of sentences augmented at once
+    :type batch_size: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param kwargs:
+    :return: list of augmented sentence, sentence and identifiers
+    """
+    function = partial(
+        __batch_keyboard_sent_aug__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+    batches = list(batched(sentences, batch_size))
+
+    if parallel:
+        return run_parallel(batches, function, pool=pool, nogil=True)
+
+    return list(iter_serial(batches, function))
+
+
+if __name__ == "__main__":
+    query = ["DEEP", "NEURAL", "CRAVING"]
+    print(
+        __batch_fetch__(
+            words=query,
+            degree=2,
+            count=5,
+            method="random",
+            position="random",
+            dummy_identifier_1="generic1",
+        )
+    )
+
+    print(
+        batch_fetch(
+            words=query * 1000,
+            degree=3,
+            count=2,
+            method="insert",
+            position="first",
+            parallel=True,
+        )[:10]
+    )
+
+    data = ["1234 56789 ABCD", "DEEP", "NEURAL CRAVING"]
+    print(
+        batch_keyboard_sent_aug(
+            sentences=data,
+            degree=2,
+            count=2,
+            method="random",
+            position="random",
+            parallel=False,
+            dummy_identifier_1="generic1",
+        )
+    )
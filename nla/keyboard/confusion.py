@@ -0,0 +1,417 @@
+"""
+Weighted typo confusion model.
+
+A confusion model gives, for every intended character, the characters typed
+instead of it with their weights. It is either written by hand, one entry per
+line
+
+    # intended typed weight
+    A S 12
+    A Q 3
+
+or fitted from a log of (typed, intended) pairs: the pairs are aligned, every
+substituted character counts as a confusion of the intended one and every
+inserted character as a confusion of the character it was inserted before,
+as nn_replace and nn_insert draw them. A prior adds weight to the keyboard
+neighbours, so that the neighbours missing from the log can still be drawn.
+
+Every row is compiled into a Walker/Vose alias table, so a weighted draw takes
+one uniform and constant time whatever the number of candidates. The binary
+file follows the keyboard layout format, with the alias tables appended
+
+    magic     6 bytes   b"NLACNF"
+    version   uint16
+    offsets   uint32    number of offsets
+    codes     uint32    number of candidate codes
+    int64[offsets]      offsets
+    uint32[codes]       candidate codes
+    float64[codes]      probability of keeping a candidate
+    uint32[codes]       alias of a candidate, index in codes
+
+usage:
+    python -m nla.keyboard.confusion fit typos.tsv confusion.bin --prior 1
+    python -m nla.keyboard.confusion build matrix.txt confusion.bin
+    python -m nla.keyboard.confusion dump confusion.bin
+
+    keyaug.use_confusion("confusion.bin")
+"""
+
+import struct
+import argparse
+from difflib import SequenceMatcher
+import numpy as np
+from nla.keyboard.layout import NAMES
+
+MAGIC = b"NLACNF"
+VERSION = 1
+HEADER = struct.Struct("<6sHII")
+
+
+def alias_table(weights):
+    """
+    Vose's alias method
+    :param weights: positive weights
+    :type weights: list
+    :return: prob, alias, candidate i is kept with probability prob[i] and
+        replaced with alias[i] otherwise
+    """
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+
+    prob = [1.0] * n
+    alias = list(range(n))
+
+    small = [i for i, s in enumerate(scaled) if s < 1]
+    large = [i for i, s in enumerate(scaled) if s >= 1]
+
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], l
+
+        scaled[l] += scaled[s] - 1
+        (small if scaled[l] < 1 else large).append(l)
+
+    # left overs are 1 up to rounding
+    return prob, alias
+
+
+def compile_confusion(matrix):
+    """
+    compile a confusion matrix into alias tables, as CSR arrays indexed by
+    character code
+    :param matrix: intended character to {typed character: weight}
+    :type matrix: dict
+    :return: offsets, codes, prob, alias
+    """
+    rows = {}
+    for c, row in matrix.items():
+        row = {t: w for t, w in row.items() if w > 0}
+        if row:
+            rows[c] = row
+
+    assert rows, "the confusion matrix needs a positive weight"
+
+    size = max(map(ord, rows), default=-1) + 1
+    offsets = np.zeros(size + 1, dtype=np.int64)
+
+    for c, row in rows.items():
+        offsets[ord(c) + 1] = len(row)
+    offsets = offsets.cumsum()
+
+    codes = np.zeros(offsets[-1], dtype=np.uint32)
+    prob = np.ones(offsets[-1], dtype=np.float64)
+    alias = np.zeros(offsets[-1], dtype=np.uint32)
+
+    for c, row in rows.items():
+        start, end = offsets[ord(c)], offsets[ord(c) + 1]
+        typed = sorted(row)
+        p, a = alias_table([row[t] for t in typed])
+
+        codes[start:end] = [ord(t) for t in typed]
+        prob[start:end] = p
+        alias[start:end] = [start + i for i in a]
+
+    return offsets, codes, prob, alias
+
+
+def to_dict(offsets, codes, prob, alias):
+    """
+    :return: intended character to {typed character: probability} of compiled
+        alias tables
+    """
+    matrix = {}
+
+    for c in range(len(offsets) - 1):
+        start, end = offsets[c], offsets[c + 1]
+        if end == start:
+            continue
+
+        n = end - start
+        p = np.asarray(prob[start:end], dtype=np.float64) / n
+        np.add.at(p, alias[start:end] - start, (1 - prob[start:end]) / n)
+
+        matrix[chr(c)] = {chr(t): float(w) for t, w in zip(codes[start:end], p)}
+
+    return matrix
+
+
+def rows(offsets, codes, prob, alias):
+    """
+    alias tables as python lists for the scalar draws
+    :return: intended character to (candidates, prob, alias), alias indexes
+        the candidates
+    """
+    table = {}
+
+    for c in range(len(offsets) - 1):
+        start, end = int(offsets[c]), int(offsets[c + 1])
+        if end > start:
+            table[chr(c)] = (
+                [chr(t) for t in codes[start:end]],
+                prob[start:end].tolist(),
+                [int(a) - start for a in alias[start:end]],
+            )
+
+    return table
+
+
+def pick(row, uniform):
+    """
+    weighted draw from an alias table in constant time
+    :param row: (candidates, prob, alias), see rows
+    :param uniform: uniform float in [0, 1)
+    :return: index of the candidate
+    """
+    candidates, prob, alias = row
+    u = uniform * len(candidates)
+    i = int(u)
+    return i if u - i < prob[i] else alias[i]
+
+
+def draw(row, uniform):
+    """
+    weighted draw from an alias table in constant time
+    :param row: (candidates, prob, alias), see rows
+    :param uniform: uniform float in [0, 1)
+    :return: candidate
+    """
+    return row[0][pick(row, uniform)]
+
+
+def sample(offsets, codes, prob, alias, chars, uniforms):
+    """
+    weighted draw of a candidate for every character, vectorized
+    :param chars: character codes
+    :type chars: numpy.ndarray
+    :param uniforms: uniform floats in [0, 1), one per character
+    :type uniforms: numpy.ndarray
+    :return: candidate codes and whether a character has a row, characters
+        without one are kept as is
+    """
+    chars = np.asarray(chars, dtype=np.int64)
+
+    clipped = np.minimum(chars, len(offsets) - 2)
+    start = offsets[clipped]
+    counts = np.where(chars < len(offsets) - 1, offsets[clipped + 1] - start, 0)
+
+    u = uniforms * counts
+    i = u.astype(np.int64)
+    j = np.minimum(start + i, len(codes) - 1)
+
+    drawn = np.where((u - i) < prob[j], codes[j], codes[alias[j]])
+    has = counts > 0
+    return np.where(has, drawn, chars).astype(np.uint32), has
+
+
+def parse(lines):
+    """
+    parse a plain confusion matrix, 'intended typed weight' per line
+    :param lines: lines of the matrix
+    :type lines: iterable
+    :return: intended character to {typed character: weight}
+    """
+    matrix = {}
+
+    for number, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+
+        values = line.split()
+        assert len(values) == 3, "line {}: expected 'intended typed weight'".format(
+            number
+        )
+
+        intended, typed = (NAMES.get(v, v) for v in values[:2])
+        assert len(intended) == len(typed) == 1, (
+            "line {}: characters need to be single characters or one of ".format(number)
+            + str(list(NAMES))[1:-1]
+        )
+
+        row = matrix.setdefault(intended, {})
+        row[typed] = row.get(typed, 0.0) + float(values[2])
+
+    return matrix
+
+
+def fit(pairs, neighbours=None, prior=1.0):
+    """
+    fit a confusion matrix from typos
+    :param pairs: iterable of (typed, intended, count)
+    :type pairs: iterable
+    :param neighbours: keyboard neighbour map weighted by the prior, see
+        keyaug.load
+    :type neighbours: dict
+    :param prior: weight added to every keyboard neighbour
+    :type prior: float
+    :return: intended character to {typed character: weight}
+    """
+    matrix = {}
+
+    def add(intended, typed, weight):
+        row = matrix.setdefault(intended, {})
+        row[typed] = row.get(typed, 0.0) + weight
+
+    for typed, intended, count in pairs:
+        matcher = SequenceMatcher(None, intended, typed, autojunk=False)
+
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == "replace" and i2 - i1 == j2 - j1:
+                for c, t in zip(intended[i1:i2], typed[j1:j2]):
+                    add(c, t, count)
+
+            elif op == "insert" and intended:
+                # inserted before intended[i1], after the last character at
+                # the end of the word
+                c = intended[min(i1, len(intended) - 1)]
+                for t in typed[j1:j2]:
+                    add(c, t, count)
+
+    if neighbours and prior > 0:
+        for c, values in neighbours.items():
+            for t in values:
+                add(c, t, prior)
+
+    return matrix
+
+
+def read_log(lines, typed=0, intended=1, count=None):
+    """
+    lazily parse a tab separated typo log
+    :param lines: lines of the log
+    :param typed: column of the typed text
+    :param intended: column of the intended text
+    :param count: column of the number of occurrences, 1 each if None
+    :return: generator of (typed, intended, count)
+    """
+    for line in lines:
+        values = line.rstrip("\n").split("\t")
+        if len(values) <= max(typed, intended):
+            continue
+
+        yield (
+            values[typed].upper(),
+            values[intended].upper(),
+            float(values[count]) if count is not None else 1.0,
+        )
+
+
+def save(path, offsets, codes, prob, alias):
+    """
+    write compiled alias tables in the binary confusion format
+    """
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(offsets), len(codes)))
+        f.write(np.ascontiguousarray(offsets, dtype="<i8").tobytes())
+        f.write(np.ascontiguousarray(codes, dtype="<u4").tobytes())
+        f.write(np.ascontiguousarray(prob, dtype="<f8").tobytes())
+        f.write(np.ascontiguousarray(alias, dtype="<u4").tobytes())
+
+
+def open_confusion(path):
+    """
+    memory-map a binary confusion file, read-only
+    :param path: path of the binary confusion model
+    :type path: str
+    :return: offsets, codes, prob, alias
+    """
+    with open(path, "rb") as f:
+        magic, version, noffsets, ncodes = HEADER.unpack(f.read(HEADER.size))
+
+    assert magic == MAGIC, "{} is not a confusion model file".format(path)
+    assert version == VERSION, "{} is version {}, expected version {}".format(
+        path, version, VERSION
+    )
+
+    arrays = []
+    offset = HEADER.size
+
+    # offsets, codes, prob, alias
+    for dtype, shape in [
+        ("<i8", noffsets),
+        ("<u4", ncodes),
+        ("<f8", ncodes),
+        ("<u4", ncodes),
+    ]:
+        arrays.append(
+            np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+        )
+        offset += np.dtype(dtype).itemsize * shape
+
+    return tuple(arrays)
+
+
+def build(matrix, output):
+    """
+    compile a plain confusion matrix into a binary confusion file
+    :param matrix: path of the matrix
+    :type matrix: str
+    :param output: path of the binary confusion model
+    :type output: str
+    """
+    with open(matrix) as f:
+        save(output, *compile_confusion(parse(f)))
+
+
+def dump(path):
+    """
+    :return: plain matrix of a binary confusion file, with probabilities
+    """
+    names = {v: k for k, v in NAMES.items()}
+
+    return "\n".join(
+        "{} {} {:.6g}".format(names.get(c, c), names.get(t, t), w)
+        for c, row in to_dict(*open_confusion(path)).items()
+        for t, w in row.items()
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="typo confusion model tool")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("fit", help="fit a model from a typo log")
+    command.add_argument("log", help="tab separated typed and intended texts")
+    command.add_argument("output")
+    command.add_argument("--typed", type=int, default=0, help="typed column")
+    command.add_argument("--intended", type=int, default=1, help="intended column")
+    command.add_argument("--count", type=int, help="occurrences column")
+    command.add_argument(
+        "--prior", type=float, default=1.0, help="weight of every keyboard neighbour"
+    )
+    command.add_argument("--matrix", help="also write the fitted plain matrix")
+
+    command = commands.add_parser("build", help="compile a plain matrix")
+    command.add_argument("matrix")
+    command.add_argument("output")
+
+    command = commands.add_parser("dump", help="print a compiled model")
+    command.add_argument("model")
+
+    args = parser.parse_args()
+
+    if args.command == "fit":
+        # imported here, keyaug imports this module
+        from nla.keyboard.keyaug import load
+
+        with open(args.log) as f:
+            matrix = fit(
+                read_log(f, args.typed, args.intended, args.count), load(), args.prior
+            )
+
+        save(args.output, *compile_confusion(matrix))
+
+        if args.matrix:
+            names = {v: k for k, v in NAMES.items()}
+            with open(args.matrix, "w") as f:
+                for c, row in sorted(matrix.items()):
+                    for t, w in sorted(row.items()):
+                        f.write(
+                            "{} {} {:g}\n".format(names.get(c, c), names.get(t, t), w)
+                        )
+
+    elif args.command == "build":
+        build(args.matrix, args.output)
+    else:
+        print(dump(args.model))
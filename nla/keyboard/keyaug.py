@@ -1,14 +1,142 @@
-import pickle
-from nla.keyboard.randaug import choice, pos_word
-from random import randrange
+import numpy as np
+from nla.rng import random, stream
+from nla import stats
+from nla.keyboard.randaug import choice, pos_word, check_method
+from nla.keyboard.layout import open_layout, to_dict
+from nla.keyboard import confusion as _confusion
+from nla.keyboard.variants import spaces, draw, every, variants
+from nla.keyboard.variants import apply_script, INSERT, REPLACE
 import re
 from functools import partial
 from nla.parallelize import *
 from pathlib import Path
 
 path2script = str(Path(__file__).resolve())
-path = path2script.rsplit("/", 1)[0] + "/keyboard.pkl"
-nnkey = pickle.load(open(path, "rb"))
+path = path2script.rsplit("/", 1)[0] + "/keyboard.bin"
+
+# loaded on first use
+nnkey = None
+nntable = None
+
+# weighted confusion model, see use_confusion, neighbours are uniform if None
+confusion = None
+confusion_rows = None
+
+
+def layout():
+    """
+    the compiled keyboard layout, memory-mapped read-only once per process,
+    the pages are shared by every process using the layout
+    :return: offsets, codes, see nla.keyboard.layout
+    """
+    global nntable
+
+    if nntable is None:
+        nntable = open_layout(path)
+
+    return nntable
+
+
+def use_layout(layout_path):
+    """
+    use another compiled keyboard layout in the current process, the cached
+    layout and the variant spaces built from it are dropped and the new one
+    opened on next use. pass it as the initializer of a WorkerPool for workers
+    that don't fork from this process
+    :param layout_path: path of a binary layout, see nla.keyboard.layout
+    :type layout_path: str
+    """
+    global path, nnkey, nntable
+
+    path = layout_path
+    nnkey = nntable = None
+    variants.cache_clear()
+
+
+def load():
+    """
+    the keyboard neighbour map as a dict, once per process
+    :return: character to neighbouring characters mapping
+    """
+    global nnkey
+
+    if nnkey is None:
+        nnkey = to_dict(*layout())
+
+    return nnkey
+
+
+def use_confusion(model):
+    """
+    draw the neighbours from a weighted confusion model in the current
+    process, see nla.keyboard.confusion. the characters missing from the model
+    keep their uniform keyboard neighbours. nn_fetch draws its distinct
+    variants by weight too, the cached variant spaces are dropped
+
+    workers that don't fork from this process load it in their initializer:
+        WorkerPool(
+            preload=["nla.keyboard.keyaug"],
+            initializer=use_confusion,
+            initargs=("confusion.bin",),
+        )
+    :param model: path of a binary confusion model, None for uniform
+        neighbours
+    :type model: str
+    """
+    global confusion, confusion_rows
+
+    if model is None:
+        confusion = confusion_rows = None
+    else:
+        confusion = _confusion.open_confusion(model)
+        confusion_rows = _confusion.rows(*confusion)
+
+    variants.cache_clear()
+
+
+def nn_sample(chars):
+    """
+    draw a random keyboard neighbour for every character, vectorized
+    :param chars: character codes
+    :type chars: numpy.ndarray
+    :return: neighbour codes, characters without neighbours are kept as is
+    """
+    offsets, codes = layout()
+    chars = np.asarray(chars, dtype=np.int64)
+
+    if confusion is not None:
+        weighted, has = _confusion.sample(*confusion, chars, random(chars.shape))
+        if has.all():
+            return weighted
+
+    clipped = np.minimum(chars, len(offsets) - 2)
+    start = offsets[clipped]
+    counts = np.where(chars < len(offsets) - 1, offsets[clipped + 1] - start, 0)
+
+    draw = start + (random(chars.shape) * counts).astype(np.int64)
+    draw = np.minimum(draw, len(codes) - 1)
+
+    uniform = np.where(counts > 0, codes[draw], chars).astype(np.uint32)
+
+    if confusion is not None:
+        return np.where(has, weighted, uniform)
+    return uniform
+
+
+def neighbour(char):
+    """
+    draw a random keyboard neighbour of a character
+    :param char: character
+    :type char: str
+    :return: neighbouring character
+    """
+    if confusion_rows is not None:
+        row = confusion_rows.get(char)
+        if row is not None:
+            return _confusion.draw(row, stream().random())
+
+    neighbours = load()[char]
+    return stream().choice(neighbours)
 
 
 # operations at a given index
@@ -26,12 +154,14 @@ def nn_insert(word, degree, position="random"):
 
     degree = min(len(word), degree)
 
-    start_idx = choice([0, 1], 1)[0]
-    idx = choice(list(range(start_idx, len(word) - 1 + degree, 2)), size=degree)
+    start_idx = stream().randrange(2)
+    idx = choice(range(start_idx, len(word) - 1 + degree, 2), size=degree)
     idx.sort()
 
-    for ix in idx:
-        word = word[:ix] + choice(nnkey[word[ix]], 1)[0] + word[ix:]
+    # the drawn positions count the characters inserted before them, the
+    # returned ones index the augmented word
+    script = [(ix - j, INSERT, neighbour(word[ix - j])) for j, ix in enumerate(idx)]
+    word = apply_script(word, script)
 
     return word_head + word + word_tail, idx
 
@@ -51,11 +181,12 @@ def nn_replace(word, degree, position="random"):
 
     degree = min(len(word), degree)
 
-    start_idx = choice([0, 1], 1)[0]
-    idx = choice(list(range(start_idx, len(word) - 1)), size=degree)
+    start_idx = stream().randrange(2)
+    idx = choice(range(start_idx, len(word) - 1), size=degree)
 
-    for ix in idx:
-        word = word[:ix] + choice(nnkey[word[ix]], 1)[0] + word[ix + 1 :]
+    script = [(ix, REPLACE, neighbour(word[ix])) for ix in idx]
+    script.sort()
+    word = apply_script(word, script)
 
     return word_head + word + word_tail, idx
 
@@ -84,6 +215,15 @@ def nn_swap(word, degree, position="random"):
     return word_head + "".join(word) + word_tail, idx
 
 
+# keyboard augmentations selected by the method argument
+NN_FUNCTIONS = {
+    "swap": nn_swap,
+    "insert": nn_insert,
+    "replace": nn_replace,
+    "random": [nn_swap, nn_insert, nn_replace, nn_replace, nn_replace],
+}
+
+
 def __nn_fetch__(word, degree, count, method="random", position="random", **kwargs):
     """
     run the given augmentation
@@ -91,7 +231,7 @@ def __nn_fetch__(word, degree, count, method="random", position="random", **kwar
     :type word: str
     :param degree: number of places to augment in the string
     :type degree: int
-    :param count: number of outputs
+    :param count: number of distinct outputs, None for all the variants
     :type count: int
     :param method: method of augmentation
     :type method: str
@@ -99,39 +239,35 @@ def __nn_fetch__(word, degree, count, method="random", position="random", **kwar
     :type position: str
     :return:
     """
-    functions = {
-        "swap": nn_swap,
-        "insert": nn_insert,
-        "replace": nn_replace,
-        "random": [nn_swap, nn_insert, nn_replace, nn_replace, nn_replace],
-    }
+    check_method(method, NN_FUNCTIONS)
+    return _nn_fetch(word, degree, count, method, position, **kwargs)
 
-    assert method in functions, "method argument needs to be either {}".format(
-        str(list(functions.keys()))[1:-1]
-    )
+
+def _nn_fetch(word, degree, count, method="random", position="random", **kwargs):
+    """
+    __nn_fetch__ without the method check, a pipeline Stage checks the
+    method once instead of on every text
+    """
+    functions = NN_FUNCTIONS
 
     word_head, word, word_tail = pos_word(word, position)
 
     if re.match(r"[^A-Z]", word):
-        return [(str(word), str(word))]
+        word = word_head + word + word_tail
+        return [(word, word) + tuple(kwargs.values())]
 
-    words = set()
-    iterator = 0
-
-    while len(words) < count and iterator < count * 2:
-        # select and run the function based on the method
-        function = (
-            choice(functions[method], 1)[0] if method == "random" else functions[method]
-        )
+    # nn_replace is listed thrice in random, it is drawn thrice as often
+    names = [
+        f.__name__
+        for f in (functions[method] if method == "random" else [functions[method]])
+    ]
 
-        # select a degree based on the degree argument
-        a_degree = randrange(0, degree) + 1
+    candidates = spaces(word, degree, names)
+    words = every(candidates) if count is None else draw(candidates, count)
+    words = [word_head + w + word_tail for w in words]
 
-        # call the selected function
-        augword = function(word, a_degree)[0]
-        words.add(word_head + augword + word_tail)
-
-        iterator += 1
+    if stats.enabled:
+        stats.count("nn_fetch.outputs", len(words))
 
     word = word_head + word + word_tail
     return [(w, word) + tuple(kwargs.values()) for w in words]
@@ -139,7 +275,14 @@ def __nn_fetch__(word, degree, count, method="random", position="random", **kwar
 
 # run_parallel wrapper on __nn_fetch__
 def nn_fetch(
-    words, degree, count, method="random", position="random", parallel=True, **kwargs
+    words,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    pool=None,
+    **kwargs
 ):
     """
     run the given augmentation on given list of words
@@ -155,6 +298,8 @@ def nn_fetch(
     :type position: str
     :param parallel: run in parallel
     :type parallel: bool
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
     :param kwargs:
     :return:
     """
@@ -168,7 +313,7 @@ def nn_fetch(
             count=count,
             position=position,
         )
-        return run_parallel(words, function)
+        return run_parallel(words, function, pool=pool)
 
     else:
         return [
@@ -179,6 +324,72 @@ def nn_fetch(
         ]
 
 
+# lazy counterpart of nn_fetch
+def iter_nn_fetch(
+    words,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    chunksize=64,
+    ordered=True,
+    max_inflight=None,
+    pool=None,
+    backend=None,
+    **kwargs
+):
+    """
+    lazily run the given augmentation on any iterable of words
+    :param words: iterable of words to augment
+    :type words: iterable
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param chunksize: number of words sent to a worker at once
+    :type chunksize: int
+    :param ordered: yield outputs in the input order
+    :type ordered: bool
+    :param max_inflight: maximum words being processed at once
+    :type max_inflight: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param backend: 'auto' or one of the parallelize BACKENDS, defaults to
+        get_backend()
+    :type backend: str
+    :param kwargs:
+    :return: generator over the augmented tuples
+    """
+    function = partial(
+        __nn_fetch__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+
+    if parallel:
+        return iter_backend(
+            words,
+            function,
+            backend,
+            chunksize=chunksize,
+            ordered=ordered,
+            max_inflight=max_inflight,
+            pool=pool,
+        )
+
+    return iter_serial(words, function)
+
+
 if __name__ == "__main__":
     query = "DEEP"
     print(
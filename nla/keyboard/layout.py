@@ -0,0 +1,186 @@
+"""
+Compiled keyboard layout format.
+
+A layout is compiled from a plain description, one key per line with its
+neighbouring keys, e.g.
+
+    # key = neighbours
+    Q = W S A
+    space = C V B N M
+
+into a binary file made of a fixed size header followed by two arrays, the
+neighbours of the character c being codes[offsets[ord(c)] : offsets[ord(c) + 1]]
+
+    magic     6 bytes   b"NLAKEY"
+    version   uint16
+    offsets   uint32    number of offsets
+    codes     uint32    number of neighbour codes
+    int64[offsets]      offsets
+    uint32[codes]       neighbour codes
+
+The file is memory-mapped read-only, so loading is near-zero and every
+process using it shares the same pages.
+
+usage:
+    python -m nla.keyboard.layout build keyboard.txt keyboard.bin
+    python -m nla.keyboard.layout dump keyboard.bin
+"""
+
+import struct
+import argparse
+import numpy as np
+
+MAGIC = b"NLAKEY"
+VERSION = 1
+HEADER = struct.Struct("<6sHII")
+
+# names of the keys that can't be written as themselves in a description
+NAMES = {"space": " "}
+
+
+def compile_layout(neighbours):
+    """
+    compile a character to neighbours mapping into CSR arrays indexed by
+    character code
+    :param neighbours: character to neighbouring characters mapping
+    :type neighbours: dict
+    :return: offsets, codes
+    """
+    size = max(map(ord, neighbours), default=-1) + 1
+
+    counts = np.zeros(size, dtype=np.int64)
+    for c, n in neighbours.items():
+        counts[ord(c)] = len(n)
+
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    offsets[1:] = counts.cumsum()
+
+    codes = np.zeros(offsets[-1], dtype=np.uint32)
+    for c, n in neighbours.items():
+        codes[offsets[ord(c)] : offsets[ord(c) + 1]] = [ord(x) for x in n]
+
+    return offsets, codes
+
+
+def to_dict(offsets, codes):
+    """
+    :return: character to neighbouring characters mapping of compiled arrays
+    """
+    return {
+        chr(c): [chr(x) for x in codes[offsets[c] : offsets[c + 1]]]
+        for c in range(len(offsets) - 1)
+        if offsets[c + 1] > offsets[c]
+    }
+
+
+def parse(lines):
+    """
+    parse a plain layout description
+    :param lines: lines of the description
+    :type lines: iterable
+    :return: character to neighbouring characters mapping
+    """
+    neighbours = {}
+
+    for number, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+
+        assert "=" in line, "line {}: expected 'key = neighbours'".format(number)
+        key, values = (part.split() for part in line.split("=", 1))
+
+        assert len(key) == 1, "line {}: expected a single key".format(number)
+        neighbours[NAMES.get(key[0], key[0])] = [NAMES.get(v, v) for v in values]
+
+    for key, values in neighbours.items():
+        assert all(len(c) == 1 for c in [key] + values), (
+            "keys and neighbours need to be single characters or one of "
+            + str(list(NAMES))[1:-1]
+        )
+
+    return neighbours
+
+
+def save(path, offsets, codes):
+    """
+    write compiled arrays in the binary layout format
+    """
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(offsets), len(codes)))
+        f.write(np.ascontiguousarray(offsets, dtype="<i8").tobytes())
+        f.write(np.ascontiguousarray(codes, dtype="<u4").tobytes())
+
+
+def open_layout(path):
+    """
+    memory-map a binary layout file, read-only
+    :param path: path of the binary layout
+    :type path: str
+    :return: offsets, codes
+    """
+    with open(path, "rb") as f:
+        magic, version, noffsets, ncodes = HEADER.unpack(f.read(HEADER.size))
+
+    assert magic == MAGIC, "{} is not a keyboard layout file".format(path)
+    assert version == VERSION, "{} is version {}, expected version {}".format(
+        path, version, VERSION
+    )
+
+    offsets = np.memmap(path, dtype="<i8", mode="r", offset=HEADER.size, shape=noffsets)
+    codes = np.memmap(
+        path,
+        dtype="<u4",
+        mode="r",
+        offset=HEADER.size + 8 * noffsets,
+        shape=ncodes,
+    )
+
+    return offsets, codes
+
+
+def build(description, output):
+    """
+    compile a plain layout description into a binary layout file
+    :param description: path of the description
+    :type description: str
+    :param output: path of the binary layout
+    :type output: str
+    """
+    with open(description) as f:
+        offsets, codes = compile_layout(parse(f))
+
+    save(output, offsets, codes)
+
+
+def dump(path):
+    """
+    :return: plain description of a binary layout file
+    """
+    names = {v: k for k, v in NAMES.items()}
+
+    return "\n".join(
+        "{} = {}".format(
+            names.get(key, key), " ".join(names.get(v, v) for v in values)
+        )
+        for key, values in to_dict(*open_layout(path)).items()
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="keyboard layout tool")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("build", help="compile a layout description")
+    command.add_argument("description")
+    command.add_argument("output")
+
+    command = commands.add_parser("dump", help="print a compiled layout")
+    command.add_argument("layout")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.description, args.output)
+    else:
+        print(dump(args.layout))
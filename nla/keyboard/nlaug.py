@@ -1,7 +1,17 @@
 from functools import partial
+from collections import Counter
+from itertools import chain
 from nla.keyboard.randaug import *
 from nla.keyboard.keyaug import *
 from nla.parallelize import *
+from nla.keyboard.variants import Variants, SPACES
+from nla import stats
+
+# words containing any other character are left as is
+NON_ALPHA = re.compile(r"[^A-Z]")
+
+# maximum variants drawn for a token by the vocabulary mode
+POOL_SIZE = 32
 
 
 def __rand_sent_aug__(
@@ -21,20 +31,21 @@ def __rand_sent_aug__(
     :type position: str
     :return:
     """
+    check_method(method, FUNCTIONS)
+    return _rand_sent_aug(sentence, degree, count, method, position, **kwargs)
+
+
+def _rand_sent_aug(
+    sentence, degree, count, method="random", position="random", **kwargs
+):
+    """
+    __rand_sent_aug__ without the method check, a pipeline Stage checks the
+    method once instead of on every text
+    """
     words = []
 
     # functions to select from
-    functions = {
-        "swap": swap,
-        "delete": delete,
-        "insert": insert,
-        "replace": replace,
-        "random": [swap, insert, replace, delete],
-    }
-
-    assert method in functions, "method argument needs to be either {}".format(
-        str(list(functions.keys()))[1:-1]
-    )
+    functions = FUNCTIONS
 
     # running for desired count
     for _ in range(count):
@@ -46,15 +57,23 @@ def __rand_sent_aug__(
         # # select a degree based on the degree argument
         # a_degree = randrange(0, degree) + 1
 
-        # call the selected function
-        augword = function(word=sentence, degree=degree, position=position)
+        # call the selected function, at degree 1 a single variant is decoded
+        # instead of building all of them
+        if degree == 1:
+            word_head, part, word_tail = pos_word(sentence, position)
+            augword = Variants(
+                SPACES[function.__name__](part, degree), word_head, word_tail
+            ).choice()
+        else:
+            augword = function(word=sentence, degree=degree, position=position)
 
         if augword:
-            if degree == 1:
-                augword = choice(augword, 1)[0]
-
             # append the augmented word with other identifiers
             words.append([augword, sentence] + list(kwargs.values()))
+
+    if stats.enabled:
+        stats.count("rand_sent_aug.outputs", min(count, len(words)))
+
     return choice(words, size=count)
 
 
@@ -75,16 +94,18 @@ def __keyboard_sent_aug__(
     :type position: str
     :return:
     """
-    functions = {
-        "swap": nn_swap,
-        "insert": nn_insert,
-        "replace": nn_replace,
-        "random": [nn_swap, nn_insert, nn_replace, nn_replace, nn_replace],
-    }
+    check_method(method, NN_FUNCTIONS)
+    return _keyboard_sent_aug(sentence, degree, count, method, position, **kwargs)
 
-    assert method in functions, "method argument needs to be either {}".format(
-        str(list(functions.keys()))[1:-1]
-    )
+
+def _keyboard_sent_aug(
+    sentence, degree, count, method="random", position="random", **kwargs
+):
+    """
+    __keyboard_sent_aug__ without the method check, a pipeline Stage checks the
+    method once instead of on every text
+    """
+    functions = NN_FUNCTIONS
 
     all_augword = []
 
@@ -95,7 +116,7 @@ def __keyboard_sent_aug__(
         # running for every word in the sentence
         for w in sentence.split():
             # return the query as it is if it doesn't contain only alphabets
-            if re.findall(r"[^A-Z]", w):
+            if NON_ALPHA.search(w):
                 augword.append(str(w))
                 continue
 
@@ -110,6 +131,90 @@ def __keyboard_sent_aug__(
         # append the augmented sentence along with the identifiers
         all_augword.append([" ".join(augword), sentence] + list(kwargs.values()))
 
+    if stats.enabled:
+        stats.count("keyboard_sent_aug.outputs", len(all_augword))
+
+    return all_augword
+
+
+def __vocab_keyboard_sent_aug__(
+    sentences,
+    degree,
+    count,
+    method="random",
+    position="random",
+    pool_size=POOL_SIZE,
+    **kwargs
+):
+    """
+    run the given augmentation on a batch of sentences, once per unique token
+    instead of once per occurrence. every token of the batch is classified
+    once and gets a pool of at most pool_size variants, the sentences are then
+    assembled from the pools, so the work grows with the vocabulary of the
+    batch rather than its number of tokens
+    :param sentences: sentences to augment
+    :type sentences: list
+    :param degree: number of places to augment in every word
+    :type degree: int
+    :param count: number of outputs for every sentence
+    :type count: int
+    :param method: method to augment
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :param pool_size: maximum variants drawn for a token
+    :type pool_size: int
+    :return: list of augmented rows, as __keyboard_sent_aug__
+    """
+    functions = NN_FUNCTIONS
+    check_method(method, functions)
+
+    rs = stream()
+    tokenized = [sentence.split() for sentence in sentences]
+    occurrences = Counter(chain.from_iterable(tokenized))
+
+    pools = {}
+    for w, n in occurrences.items():
+        if NON_ALPHA.search(w):
+            continue
+
+        variants = []
+        for _ in range(min(n * count, pool_size)):
+            function = (
+                choice(functions[method], 1)[0]
+                if method == "random"
+                else functions[method]
+            )
+            variants.append(function(word=w, degree=degree, position=position)[0])
+
+        # a pool covering every use of the token is consumed as is, like
+        # independent draws, a smaller one is sampled from
+        pools[w] = variants if n * count <= pool_size else tuple(variants)
+
+    identifiers = list(kwargs.values())
+    all_augword = []
+
+    for sentence, words in zip(sentences, tokenized):
+        for _ in range(count):
+            augword = []
+
+            for w in words:
+                variants = pools.get(w)
+
+                if variants is None:
+                    augword.append(w)
+                elif type(variants) is list:
+                    augword.append(variants.pop())
+                else:
+                    augword.append(rs.choice(variants))
+
+            all_augword.append([" ".join(augword), sentence] + identifiers)
+
+    if stats.enabled:
+        stats.count("keyboard_sent_aug.tokens", sum(occurrences.values()))
+        stats.count("keyboard_sent_aug.vocabulary", len(occurrences))
+        stats.count("keyboard_sent_aug.outputs", len(all_augword))
+
     return all_augword
 
 
@@ -121,6 +226,7 @@ def rand_sent_aug(
     method="random",
     position="random",
     parallel=True,
+    pool=None,
     **kwargs
 ):
     """
@@ -131,6 +237,7 @@ def rand_sent_aug(
     :param method:
     :param position:
     :param parallel:
+    :param pool: pool to reuse instead of starting a new one
     :param kwargs:
     :return:
     """
@@ -143,7 +250,7 @@ def rand_sent_aug(
             count=count,
             position=position,
         )
-        return run_parallel(sentences, function)
+        return run_parallel(sentences, function, pool=pool)
 
     else:
 #         return [
@@ -171,6 +278,7 @@ def keyboard_sent_aug(
     method="random",
     position="random",
     parallel=True,
+    pool=None,
     **kwargs
 ):
     """
@@ -182,6 +290,7 @@ def keyboard_sent_aug(
     :param method:
     :param position:
     :param parallel:
+    :param pool: pool to reuse instead of starting a new one
     :param kwargs:
     :return:
     """
@@ -194,7 +303,7 @@ def keyboard_sent_aug(
             count=count,
             position=position,
         )
-        return run_parallel(sentences, function)
+        return run_parallel(sentences, function, pool=pool)
 
     else:
 #         return [
@@ -214,6 +323,192 @@ def keyboard_sent_aug(
         return output
 
 
+# run_parallel wrapper on __vocab_keyboard_sent_aug__
+def vocab_keyboard_sent_aug(
+    sentences,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    batch_size=4096,
+    pool_size=POOL_SIZE,
+    pool=None,
+    **kwargs
+):
+    """
+    keyboard_sent_aug memoized on the unique tokens of every batch, for
+    corpora where a few tokens make up most occurrences
+    :param sentences: list of sentences to augment
+    :type sentences: list
+    :param degree: number of places to augment in every word
+    :type degree: int
+    :param count: number of outputs for every sentence
+    :type count: int
+    :param method: method to augment
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param batch_size: number of sentences sharing the pools of their tokens
+    :type batch_size: int
+    :param pool_size: maximum variants drawn for a token in a batch
+    :type pool_size: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param kwargs:
+    :return: list of augmented rows
+    """
+    function = partial(
+        __vocab_keyboard_sent_aug__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+        pool_size=pool_size,
+    )
+    batches = list(batched(sentences, batch_size))
+
+    if parallel:
+        return run_parallel(batches, function, pool=pool)
+
+    return list(iter_serial(batches, function))
+
+
+# lazy counterpart of rand_sent_aug
+def iter_rand_sent_aug(
+    sentences,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    chunksize=64,
+    ordered=True,
+    max_inflight=None,
+    pool=None,
+    backend=None,
+    **kwargs
+):
+    """
+    lazily run the given augmentation on any iterable of sentences
+    :param sentences: iterable of sentences to augment
+    :type sentences: iterable
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param chunksize: number of sentences sent to a worker at once
+    :type chunksize: int
+    :param ordered: yield outputs in the input order
+    :type ordered: bool
+    :param max_inflight: maximum sentences being processed at once
+    :type max_inflight: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param backend: 'auto' or one of the parallelize BACKENDS, defaults to
+        get_backend()
+    :type backend: str
+    :param kwargs:
+    :return: generator over the augmented rows
+    """
+    function = partial(
+        __rand_sent_aug__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+
+    if parallel:
+        return iter_backend(
+            sentences,
+            function,
+            backend,
+            chunksize=chunksize,
+            ordered=ordered,
+            max_inflight=max_inflight,
+            pool=pool,
+        )
+
+    return iter_serial(sentences, function)
+
+
+# lazy counterpart of keyboard_sent_aug
+def iter_keyboard_sent_aug(
+    sentences,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    chunksize=64,
+    ordered=True,
+    max_inflight=None,
+    pool=None,
+    backend=None,
+    **kwargs
+):
+    """
+    lazily run the given augmentation on any iterable of sentences
+    :param sentences: iterable of sentences to augment
+    :type sentences: iterable
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param chunksize: number of sentences sent to a worker at once
+    :type chunksize: int
+    :param ordered: yield outputs in the input order
+    :type ordered: bool
+    :param max_inflight: maximum sentences being processed at once
+    :type max_inflight: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param backend: 'auto' or one of the parallelize BACKENDS, defaults to
+        get_backend()
+    :type backend: str
+    :param kwargs:
+    :return: generator over the augmented rows
+    """
+    function = partial(
+        __keyboard_sent_aug__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+
+    if parallel:
+        return iter_backend(
+            sentences,
+            function,
+            backend,
+            chunksize=chunksize,
+            ordered=ordered,
+            max_inflight=max_inflight,
+            pool=pool,
+        )
+
+    return iter_serial(sentences, function)
+
+
 if __name__ == "__main__":
     data = ["1234 56789 ABCD", "DEEP", "NEURAL CRAVING"]
     rsa = rand_sent_aug(
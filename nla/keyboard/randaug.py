@@ -2,23 +2,25 @@
 Approximate time for an augmentation is 20-30 micro seconds a word
 """
 
-from numpy.random import shuffle
-from random import choice as rchoice
-import string
-from random import randrange
 from functools import partial
+from nla.rng import stream
+from nla import stats
 from nla.parallelize import *
+from nla.keyboard.variants import spaces, draw, every
+from nla.keyboard.variants import apply_script, INSERT, REPLACE, DELETE
+
+POSITIONS = ["first", "middle", "end", "random"]
 
 
 def choice(iterable, size):
     """
-    faster version of numpy.random.choice function
+    faster version of numpy.random.choice function, size distinct elements
+    in random order, the iterable is left untouched
     :param iterable:
     :param size:
     :return:
     """
-    shuffle(iterable)
-    return iterable[:size]
+    return stream().sample(iterable, size)
 
 
 def pos_word(word, position):
@@ -30,9 +32,8 @@ def pos_word(word, position):
     :type position: str
     :return:
     """
-    positions = ["first", "middle", "end", "random"]
-    assert position in positions, "position argument needs to be either {}".format(
-        str(positions)[1:-1]
+    assert position in POSITIONS, "position argument needs to be either {}".format(
+        str(POSITIONS)[1:-1]
     )
 
     marker = len(word) // 2
@@ -117,12 +118,11 @@ def delete(word, degree, position="random"):
 
     degree = min(len(word) // 2, degree)
 
-    start_idx = choice([0, 1], 1)[0]
-    idx = choice(list(range(start_idx, len(word) - 1, 2)), size=degree)
-    idx[::-1].sort()
+    start_idx = stream().randrange(2)
+    idx = choice(range(start_idx, len(word) - 1, 2), size=degree)
+    idx.sort()
 
-    for ix in idx:
-        word = word[:ix] + word[ix + 1 :]
+    word = apply_script(word, [(ix, DELETE, "") for ix in idx])
 
     return word_head + word + word_tail
 
@@ -143,19 +143,21 @@ def insert(word, degree, position="random"):
     if degree == 1:
         return [
             word_head
-            + "".join((word[:i], rchoice(string.ascii_uppercase), word[i:]))
+            + "".join((word[:i], stream().letter(), word[i:]))
             + word_tail
             for i in range(len(word) - 1)
         ]
 
     degree = min(len(word), degree)
 
-    start_idx = choice([0, 1], 1)[0]
-    idx = choice(list(range(start_idx, len(word) - 1 + degree, 2)), size=degree)
+    start_idx = stream().randrange(2)
+    idx = choice(range(start_idx, len(word) - 1 + degree, 2), size=degree)
     idx.sort()
 
-    for ix in idx:
-        word = word[:ix] + rchoice(string.ascii_uppercase) + word[ix:]
+    # the drawn positions count the letters inserted before them
+    letter = stream().letter
+    script = [(ix - j, INSERT, letter()) for j, ix in enumerate(idx)]
+    word = apply_script(word, script)
 
     return word_head + word + word_tail
 
@@ -176,22 +178,47 @@ def replace(word, degree, position="random"):
     if degree == 1:
         return [
             word_head
-            + "".join((word[:i], rchoice(string.ascii_uppercase), word[i + 1 :]))
+            + "".join((word[:i], stream().letter(), word[i + 1 :]))
             + word_tail
             for i in range(len(word) - 1)
         ]
 
     degree = min(len(word), degree)
 
-    start_idx = choice([0, 1], 1)[0]
-    idx = choice(list(range(start_idx, len(word) - 1)), size=degree)
+    start_idx = stream().randrange(2)
+    idx = choice(range(start_idx, len(word) - 1), size=degree)
 
-    for ix in idx:
-        word = word[:ix] + rchoice(string.ascii_uppercase) + word[ix + 1 :]
+    # letters drawn in the order of the positions, the script is sorted after
+    letter = stream().letter
+    script = [(ix, REPLACE, letter()) for ix in idx]
+    script.sort()
+    word = apply_script(word, script)
 
     return word_head + word + word_tail
 
 
+# augmentations selected by the method argument
+FUNCTIONS = {
+    "swap": swap,
+    "delete": delete,
+    "insert": insert,
+    "replace": replace,
+    "random": [swap, insert, replace, delete],
+}
+
+
+def check_method(method, functions):
+    """
+    :param method: method of augmentation
+    :type method: str
+    :param functions: method to augmentation mapping
+    :type functions: dict
+    """
+    assert method in functions, "method argument needs to be either {}".format(
+        str(list(functions.keys()))[1:-1]
+    )
+
+
 def __fetch__(word, degree, count, method="random", position="random", **kwargs):
     """
     run the given augmentation on a word
@@ -199,7 +226,7 @@ def __fetch__(word, degree, count, method="random", position="random", **kwargs)
     :type word: str
     :param degree: number of places to augment in the string
     :type degree: int
-    :param count: number of outputs
+    :param count: number of distinct outputs, None for all the variants
     :type count: int
     :param method: method of augmentation
     :type method: str
@@ -207,42 +234,43 @@ def __fetch__(word, degree, count, method="random", position="random", **kwargs)
     :type position: str
     :return:
     """
-    functions = {
-        "swap": swap,
-        "delete": delete,
-        "insert": insert,
-        "replace": replace,
-        "random": [swap, insert, replace, delete],
-    }
+    check_method(method, FUNCTIONS)
+    return _fetch(word, degree, count, method, position, **kwargs)
 
-    assert method in functions, "method argument needs to be either {}".format(
-        str(list(functions.keys()))[1:-1]
-    )
-
-    words = set()
-    iterator = 0
 
-    while len(words) < count and iterator < count * 2:
-        function = (
-            choice(functions[method], 1)[0] if method == "random" else functions[method]
-        )
-        a_degree = randrange(0, degree) + 1
+def _fetch(word, degree, count, method="random", position="random", **kwargs):
+    """
+    __fetch__ without the method check, a pipeline Stage checks the
+    method once instead of on every text
+    """
+    functions = FUNCTIONS
 
-        augword = function(word, a_degree, position=position)
+    names = (
+        [f.__name__ for f in functions[method]] if method == "random" else [method]
+    )
 
-        if augword:
-            if a_degree == 1:
-                augword = choice(augword, 1)[0]
+    # the variants of every method and degree are indexed, and drawn without
+    # repetition, instead of generated and deduplicated
+    word_head, part, word_tail = pos_word(word, position)
+    candidates = spaces(part, degree, names)
+    words = every(candidates) if count is None else draw(candidates, count)
 
-            words.add(augword)
-        iterator += 1
+    if stats.enabled:
+        stats.count("fetch.outputs", len(words))
 
-    return [(w, word) + tuple(kwargs.values()) for w in words]
+    return [(word_head + w + word_tail, word) + tuple(kwargs.values()) for w in words]
 
 
 # run_parallel wrapper on __fetch__
 def fetch(
-    words, degree, count, method="random", position="random", parallel=True, **kwargs
+    words,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    pool=None,
+    **kwargs
 ):
     """
     run the given augmentation on given list of words
@@ -258,6 +286,8 @@ def fetch(
     :type position: str
     :param parallel: run in parallel
     :type parallel: bool
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
     :param kwargs:
     :return:
     """
@@ -271,7 +301,7 @@ def fetch(
             count=count,
             position=position,
         )
-        return run_parallel(words, function)
+        return run_parallel(words, function, pool=pool)
 
     else:
         return [
@@ -287,6 +317,72 @@ def fetch(
         ]
 
 
+# lazy counterpart of fetch
+def iter_fetch(
+    words,
+    degree,
+    count,
+    method="random",
+    position="random",
+    parallel=True,
+    chunksize=64,
+    ordered=True,
+    max_inflight=None,
+    pool=None,
+    backend=None,
+    **kwargs
+):
+    """
+    lazily run the given augmentation on any iterable of words
+    :param words: iterable of words to augment
+    :type words: iterable
+    :param degree: number of places to augment in the string
+    :type degree: int
+    :param count: number of outputs
+    :type count: int
+    :param method: method of augmentation
+    :type method: str
+    :param position: position to augment in every word of the sentence
+    :type position: str
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param chunksize: number of words sent to a worker at once
+    :type chunksize: int
+    :param ordered: yield outputs in the input order
+    :type ordered: bool
+    :param max_inflight: maximum words being processed at once
+    :type max_inflight: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param backend: 'auto' or one of the parallelize BACKENDS, defaults to
+        get_backend()
+    :type backend: str
+    :param kwargs:
+    :return: generator over the augmented tuples
+    """
+    function = partial(
+        __fetch__,
+        **kwargs,
+        degree=degree,
+        method=method,
+        count=count,
+        position=position,
+    )
+
+    if parallel:
+        return iter_backend(
+            words,
+            function,
+            backend,
+            chunksize=chunksize,
+            ordered=ordered,
+            max_inflight=max_inflight,
+            pool=pool,
+        )
+
+    return iter_serial(words, function)
+
+
 if __name__ == "__main__":
     query = "DEEP"
     print(
@@ -0,0 +1,573 @@
+"""
+Variant spaces of the augmentations.
+
+The edits an augmentation can make to a word at a given degree, e.g. the
+positions to replace and the letters to put there, are counted and indexed
+without being generated, so that distinct variants can be drawn without
+retries and all the variants of a word can be listed.
+
+An edit is a set of k positions, each with one of radix choices (a letter, a
+keyboard neighbour, a direction). The number of edits is the elementary
+symmetric polynomial of degree k of the radices, computed with a table that
+also decodes an index into its edit.
+
+The keyboard spaces are weighted when a confusion model is loaded, see
+keyaug.use_confusion: the positions of an edit are drawn uniformly and the
+neighbour at every position from the alias table of its character, as
+nn_replace and nn_insert draw them, and the distinct edits are kept.
+"""
+
+import string
+from itertools import accumulate
+from math import comb
+from operator import mul
+from functools import lru_cache, partial
+from nla.rng import stream
+from nla import stats
+from nla.keyboard.confusion import pick
+
+LETTERS = string.ascii_uppercase
+
+# number of memoized variant spaces, words repeat a lot in a corpus
+CACHE_SIZE = 4096
+
+# consecutive duplicate weighted draws of a part of a space after which the
+# rest of the part is drawn uniformly, the few edits left may weigh so little
+# that drawing them by weight would take forever
+MAX_REJECTIONS = 32
+
+
+# operations of an edit script
+INSERT, REPLACE, DELETE = 0, 1, 2
+
+
+def apply_script(word, script):
+    """
+    build an edited word in a single pass, copying the untouched spans of the
+    word once instead of the whole word once per edit
+    :param word: word to edit
+    :type word: str
+    :param script: list of (position, op, char) sorted by position then op,
+        positions index the original word, an insert goes before the character
+        at its position, or at the end for len(word), char is '' for a delete
+    :type script: list
+    :return: edited word
+    """
+    # appending to the only reference of a string extends it in place
+    edited = ""
+    last = 0
+
+    for position, op, char in script:
+        edited += word[last:position] + char
+        last = position if op == INSERT else position + 1
+
+    return edited + word[last:]
+
+
+class Edits:
+    """
+    indexable space of the sets of k positions with a choice at every position
+    """
+
+    def __init__(self, positions, radices, k, choose=None):
+        """
+        :param positions: candidate positions
+        :type positions: sequence
+        :param radices: number of choices at every position, 0 to exclude it,
+            or a single number for all the positions
+        :type radices: list or int
+        :param k: number of positions of an edit
+        :type k: int
+        :param choose: function of (position, RandomBuffer) drawing a weighted
+            choice at a position, None if the choices are uniform
+        """
+        self.positions = positions
+        self.radices = radices
+        self.k = k
+        self.choose = choose
+        self.columns = None
+        self.eligible = None
+
+        m = len(positions)
+
+        if k <= 0 or m < k:
+            self.size = 0
+
+        elif isinstance(radices, int):
+            # C(m, k) sets of positions times radices ** k choices
+            self.size = comb(m, k) * radices**k
+
+        elif k == 1:
+            self.size = sum(radices)
+
+        elif k == 2:
+            # sum of r_a * r_b over the pairs of positions a < b
+            total = sum(radices)
+            self.size = (total * total - sum(map(mul, radices, radices))) // 2
+
+        else:
+            self.size = self.tabulate()[k][m]
+
+    def tabulate(self):
+        """
+        :return: columns[j][t], the number of edits of j positions among the
+            last t positions, computed on first use
+        """
+        if self.columns is None:
+            reverse = self.radices[::-1]
+            column = [1] * (len(reverse) + 1)
+            self.columns = [column]
+
+            for _ in range(self.k):
+                column = [0, *accumulate(map(mul, reverse, column))]
+                self.columns.append(column)
+
+        return self.columns
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        """
+        :return: list of (position, choice), in the order of the positions
+        """
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+
+        positions, radices, k = self.positions, self.radices, self.k
+
+        if isinstance(radices, int):
+            # decode the choices and the rank of the positions in lexicographic
+            # order of the combinations
+            m = len(positions)
+            choices, rank = divmod(index, comb(m, k))
+            edits = []
+            i, j = 0, k
+
+            while j:
+                first = comb(m - i - 1, j - 1)
+                if rank < first:
+                    choices, choice = divmod(choices, radices)
+                    edits.append((positions[i], choice))
+                    j -= 1
+                else:
+                    rank -= first
+                i += 1
+
+            return edits
+
+        edits = []
+        columns = self.tabulate()
+        t, j = len(positions), k
+
+        for position in positions:
+            if j == 0:
+                break
+
+            # edits not using this position come first
+            t -= 1
+            skip = columns[j][t]
+            if index < skip:
+                continue
+
+            choice, index = divmod(index - skip, columns[j - 1][t])
+            edits.append((position, choice))
+            j -= 1
+
+        return edits
+
+    def sample(self, rs):
+        """
+        draw an edit, the positions uniformly and the choices with choose
+        :param rs: RandomBuffer
+        :return: list of (position, choice), in the order of the positions
+        """
+        if self.eligible is None:
+            radices = self.radices
+            self.eligible = (
+                list(self.positions)
+                if isinstance(radices, int)
+                else [p for p, r in zip(self.positions, radices) if r]
+            )
+
+        return [
+            (p, self.choose(p, rs)) for p in sorted(rs.sample(self.eligible, self.k))
+        ]
+
+
+class Variants:
+    """
+    indexable space of the variants of a word, made of parts of edits and the
+    function applying them
+    """
+
+    def __init__(self, parts, head="", tail=""):
+        """
+        :param parts: list of (Edits, function of the word part and the edits)
+        :type parts: list
+        :param head: unaugmented head of the word, see randaug.pos_word
+        :param tail: unaugmented tail of the word
+        """
+        self.parts = [(edits, apply) for edits, apply in parts if edits.size]
+        self.head = head
+        self.tail = tail
+
+        self.size = sum(edits.size for edits, _ in self.parts)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        """
+        :return: variant of the word at the index
+        """
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+
+        for edits, apply in self.parts:
+            if index < edits.size:
+                return self.head + apply(edits[index]) + self.tail
+            index -= edits.size
+
+    def choice(self):
+        """
+        :return: random variant, None if the space is empty
+        """
+        return next(self.iterate(stream()), None)
+
+    def iterate(self, rs):
+        """
+        lazily draw the distinct variants in random order, uniformly, or by
+        weight if the edits have a choose function
+        :param rs: RandomBuffer
+        :return: generator over the variants
+        """
+        if not any(edits.choose for edits, _ in self.parts):
+            for index in rs.permutation(self.size):
+                yield self[index]
+            return
+
+        # a part is picked by its number of edits left, an edit of the part by
+        # weight, a drawn edit is rejected
+        left = [edits.size for edits, _ in self.parts]
+        drawn = [set() for _ in self.parts]
+        rejections = [0] * len(self.parts)
+        orders = [None] * len(self.parts)
+        total = self.size
+
+        while total:
+            pick = rs.randrange(total)
+            for i, n in enumerate(left):
+                pick -= n
+                if pick < 0:
+                    break
+
+            edits, apply = self.parts[i]
+
+            if rejections[i] < MAX_REJECTIONS:
+                edit = edits.sample(rs)
+            else:
+                if orders[i] is None:
+                    orders[i] = rs.permutation(edits.size)
+                edit = edits[next(orders[i])]
+
+            key = tuple(edit)
+            if key in drawn[i]:
+                rejections[i] += 1
+                continue
+
+            if rejections[i] < MAX_REJECTIONS:
+                rejections[i] = 0
+            drawn[i].add(key)
+            left[i] -= 1
+            total -= 1
+
+            yield self.head + apply(edit) + self.tail
+
+
+def _starts(k, starts, step, stop, radix, choose=None):
+    """
+    edits of k positions from every start, as the multi position augmentations
+    draw their start then their positions
+    :param radix: number of choices, or list of them indexed by position
+    :param choose: weighted choice at a position, see Edits
+    """
+    parts = []
+
+    for start in starts:
+        positions = range(start, stop, step)
+        radices = radix if isinstance(radix, int) else radix[start:stop:step]
+        parts.append(Edits(positions, radices, min(k, len(positions)), choose))
+
+    return parts
+
+
+# the random augmentations, word part and degree to parts of edits
+def swap_space(word, degree):
+    n = len(word)
+
+    def apply(edits):
+        chars = list(word)
+        for ix, c in edits:
+            lr = 1 if c == 0 or degree == 1 else -1
+            chars[ix], chars[ix + lr] = chars[ix + lr], chars[ix]
+        return "".join(chars)
+
+    if degree == 1:
+        return [(Edits(range(n - 1), 1, 1), apply)]
+
+    k = min(n // 3, degree)
+    return [(e, apply) for e in _starts(k, (2, 1), 3, n - 1, 2)]
+
+
+def delete_space(word, degree):
+    n = len(word)
+
+    def apply(edits):
+        return apply_script(word, [(ix, DELETE, "") for ix, _ in edits])
+
+    if degree == 1:
+        return [(Edits(range(n - 1), 1, 1), apply)]
+
+    k = min(n // 2, degree)
+    return [(e, apply) for e in _starts(k, (0, 1), 2, n - 1, 1)]
+
+
+def insert_space(word, degree):
+    n = len(word)
+
+    def apply(edits):
+        # the positions of the edits count the letters inserted before them
+        return apply_script(
+            word, [(ix - j, INSERT, LETTERS[c]) for j, (ix, c) in enumerate(edits)]
+        )
+
+    if degree == 1:
+        return [(Edits(range(n - 1), 26, 1), apply)]
+
+    k = min(n, degree)
+    return [(e, apply) for e in _starts(k, (0, 1), 2, n - 1 + k, 26)]
+
+
+def replace_space(word, degree):
+    n = len(word)
+
+    def apply(edits):
+        return apply_script(word, [(ix, REPLACE, LETTERS[c]) for ix, c in edits])
+
+    if degree == 1:
+        return [(Edits(range(n - 1), 26, 1), apply)]
+
+    k = min(n, degree)
+    return [(e, apply) for e in _starts(k, (0, 1), 1, n - 1, 26)]
+
+
+SPACES = {
+    "swap": swap_space,
+    "delete": delete_space,
+    "insert": insert_space,
+    "replace": replace_space,
+}
+
+
+# the keyboard augmentations, they also take the keyboard neighbour map and
+# the rows of the confusion model, if any
+def _neighbours(word, neighbours, rows, directions):
+    """
+    :return: candidates at every position of the word, from the confusion
+        model when it has a row for the character, and the weighted choice at
+        a position, None without a model
+    """
+    tables = [None] * len(word) if rows is None else [rows.get(c) for c in word]
+
+    if not any(tables):
+        return [neighbours.get(c, []) for c in word], None
+
+    nbs = [
+        neighbours.get(c, []) if table is None else table[0]
+        for c, table in zip(word, tables)
+    ]
+
+    def choose(position, rs):
+        table = tables[position]
+        c = (
+            rs.randrange(len(nbs[position]))
+            if table is None
+            else pick(table, rs.random())
+        )
+        # the direction of a swap is uniform
+        return 3 * c + rs.randrange(3) if directions and position else c
+
+    return nbs, choose
+
+
+def nn_insert_space(word, degree, neighbours, rows=None, directions=False):
+    """
+    a neighbour of a character is inserted before it, with directions the
+    inserted character is then swapped with the next, the previous or neither
+    """
+    n = len(word)
+    k = min(n, degree)
+    nbs, choose = _neighbours(word, neighbours, rows, directions)
+
+    def apply(edits):
+        chars = list(word)
+        for j, (ix, c) in enumerate(edits):
+            c, lr = divmod(c, 3) if directions and ix > 0 else (c, 2)
+            chars.insert(ix + j, nbs[ix][c])
+            _swap(chars, ix + j, lr)
+        return "".join(chars)
+
+    radix = [len(nb) * (3 if directions and p else 1) for p, nb in enumerate(nbs)]
+    return [(e, apply) for e in _starts(k, (0, 1), 2, n, radix, choose)]
+
+
+def nn_replace_space(word, degree, neighbours, rows=None, directions=False):
+    """
+    a character is replaced with one of its neighbours, with directions it is
+    then swapped with the next, the previous or neither
+    """
+    n = len(word)
+    k = min(n, degree)
+    nbs, choose = _neighbours(word, neighbours, rows, directions)
+
+    def apply(edits):
+        chars = list(word)
+        for ix, c in edits:
+            c, lr = divmod(c, 3) if directions and ix > 0 else (c, 2)
+            chars[ix] = nbs[ix][c]
+            _swap(chars, ix, lr)
+        return "".join(chars)
+
+    radix = [len(nb) * (3 if directions and p else 1) for p, nb in enumerate(nbs)]
+    return [(e, apply) for e in _starts(k, (0, 1), 1, n - 1, radix, choose)]
+
+
+def nn_swap_space(word, degree, neighbours, rows=None):
+    return nn_insert_space(word, degree, neighbours, rows, True) + nn_replace_space(
+        word, degree, neighbours, rows, True
+    )
+
+
+def _swap(chars, ix, lr):
+    # lr 0 swaps with the next character, 1 with the previous, 2 with neither
+    if lr < 2:
+        other = ix + 1 if lr == 0 else ix - 1
+        chars[ix], chars[other] = chars[other], chars[ix]
+
+
+NN_SPACES = {
+    "nn_swap": nn_swap_space,
+    "nn_insert": nn_insert_space,
+    "nn_replace": nn_replace_space,
+}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def variants(name, word, degree):
+    """
+    variant space of a word part, memoized, the keyboard spaces are weighted
+    by the confusion model loaded when they are built
+    :param name: augmentation, one of SPACES or NN_SPACES
+    :type name: str
+    :param word: word part to augment
+    :type word: str
+    :param degree: exact degree
+    :type degree: int
+    :return: Variants
+    """
+    if name in NN_SPACES:
+        # imported here, keyaug depends on this module
+        from nla.keyboard import keyaug
+
+        return Variants(
+            NN_SPACES[name](word, degree, keyaug.load(), keyaug.confusion_rows)
+        )
+
+    return Variants(SPACES[name](word, degree))
+
+
+def spaces(word, degree, names):
+    """
+    lazily built variant spaces of every augmentation and every degree up to
+    the given degree
+    :param word: word part to augment
+    :type word: str
+    :param degree: maximum degree
+    :type degree: int
+    :param names: augmentation names, a repeated name is drawn more often
+    :type names: list
+    :return: list of (function building the Variants, weight)
+    """
+    weights = {}
+    for name in names:
+        weights[name] = weights.get(name, 0) + 1
+
+    return [
+        (partial(variants, name, word, d), weight)
+        for name, weight in weights.items()
+        for d in range(1, degree + 1)
+    ]
+
+
+def draw(spaces, count):
+    """
+    distinct variants, every draw picks a space at random then the next edit
+    of that space drawn by Variants.iterate, so no edit is drawn twice and
+    fewer than count variants are returned only when the spaces run out
+    :param spaces: list of (function building the Variants, weight), see spaces
+    :type spaces: list
+    :param count: number of variants
+    :type count: int
+    :return: list of variants in draw order
+    """
+    rs = stream()
+    built = {}
+    weights = [weight for _, weight in spaces]
+    total = sum(weights)
+    # insertion ordered, so that a seeded stream gives the same sequence
+    result = {}
+    draws = 0
+
+    while len(result) < count and total:
+        # pick a space by weight, an exhausted space weighs 0
+        draw = rs.random() * total
+        for i, weight in enumerate(weights):
+            draw -= weight
+            if draw < 0:
+                break
+
+        if i not in built:
+            built[i] = spaces[i][0]().iterate(rs)
+
+        variant = next(built[i], None)
+
+        if variant is None:
+            total -= weights[i]
+            weights[i] = 0
+        else:
+            result.setdefault(variant)
+            draws += 1
+
+    if stats.enabled:
+        stats.count("variants.draws", draws)
+        stats.count("variants.duplicates", draws - len(result))
+        stats.count("variants.exhausted", len(result) < count)
+
+    return list(result)
+
+
+def every(spaces):
+    """
+    :param spaces: list of (function building the Variants, weight), see spaces
+    :type spaces: list
+    :return: list of all the distinct variants
+    """
+    result = {}
+
+    for space, _ in spaces:
+        space = space()
+        for index in range(len(space)):
+            result.setdefault(space[index])
+
+    return list(result)
@@ -1 +1,2 @@
-from nla.parallelize.parallel import *
\ No newline at end of file
+from nla.parallelize.parallel import *
+from nla.parallelize.backend import *
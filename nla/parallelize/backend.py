@@ -0,0 +1,357 @@
+"""
+Execution backends of the parallel entry points.
+
+A backend lazily runs a function returning a list of outputs over the rows of
+an iterable: 'serial' in the calling thread, 'thread' on a pool of threads,
+for the numpy batch paths that release the GIL, and 'process' on a pool of
+processes. 'auto' times the first rows serially, estimates what the rest would
+cost on every backend, and picks the cheapest with a chunk size worth a few
+milliseconds of work, so that a small online batch doesn't start a pool of
+processes for three words.
+
+usage:
+    run_parallel(words, function)  # default backend, 'auto' unless changed
+    run_parallel(words, function, backend="thread")
+    set_backend("serial")
+    register_backend("dask", my_backend)
+
+After nla.rng.seed(value), 'auto' calibrates and runs whole seed blocks of
+nla.rng.SEED_ROWS rows, every backend gives the same outputs.
+"""
+
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from nla import rng, stats
+from nla.parallelize.parallel import (
+    iter_parallel,
+    iter_serial,
+    batched,
+    get_default_pool,
+    _seed,
+)
+
+__all__ = [
+    "BACKENDS",
+    "register_backend",
+    "get_backend",
+    "set_backend",
+    "iter_threads",
+    "iter_backend",
+    "run_parallel",
+]
+
+# rows timed serially by 'auto' before it picks a backend, the calibration
+# stops early once it took CALIBRATION_SECONDS
+CALIBRATION = 8
+CALIBRATION_SECONDS = 0.02
+
+# estimated seconds to start a pool of processes, skipped with a reused pool
+PROCESS_STARTUP = 0.25
+# estimated seconds to ship a row to a worker process and its outputs back, in
+# chunks, the caller unpickles the outputs of every worker
+PROCESS_OVERHEAD = 5e-6
+# estimated seconds to start a pool of threads
+THREAD_STARTUP = 0.002
+
+# seconds of work in a chunk picked by 'auto'
+CHUNK_SECONDS = 0.01
+
+_default_backend = "auto"
+
+
+def _serial(data, function, chunksize, ordered, max_inflight, workers, pool):
+    return iter_serial(data, function)
+
+
+def _thread(data, function, chunksize, ordered, max_inflight, workers, pool):
+    return iter_threads(data, function, chunksize, ordered, max_inflight, workers)
+
+
+def _process(data, function, chunksize, ordered, max_inflight, workers, pool):
+    return iter_parallel(
+        data,
+        function,
+        chunksize=chunksize,
+        ordered=ordered,
+        max_inflight=max_inflight,
+        processes=workers,
+        pool=pool,
+    )
+
+
+# name to function of (data, function, chunksize, ordered, max_inflight,
+# workers, pool) returning an iterator over the outputs
+BACKENDS = {"serial": _serial, "thread": _thread, "process": _process}
+
+
+def register_backend(name, backend):
+    """
+    add a backend, or replace one
+    :param name: backend name
+    :type name: str
+    :param backend: function of (data, function, chunksize, ordered,
+        max_inflight, workers, pool) returning an iterator over the outputs
+    """
+    assert name != "auto", "auto picks among the other backends"
+    BACKENDS[name] = backend
+
+
+def get_backend():
+    """
+    :return: backend used when none is passed
+    """
+    return _default_backend
+
+
+def set_backend(name):
+    """
+    :param name: backend used when none is passed, 'auto' or one of BACKENDS
+    :type name: str
+    :return: the previous default backend
+    """
+    global _default_backend
+
+    _check(name)
+    previous, _default_backend = _default_backend, name
+    return previous
+
+
+def _check(name):
+    assert name == "auto" or name in BACKENDS, "backend needs to be auto or {}".format(
+        str(list(BACKENDS))[1:-1]
+    )
+
+
+def _run_batch(function, batch):
+    return [output for row in batch for output in function(row)]
+
+
+def iter_threads(
+    data, function, chunksize=1, ordered=True, max_inflight=None, threads=None
+):
+    """
+    lazily run the function on a pool of threads, worth it only when the
+    function releases the GIL, e.g. numpy on large arrays
+    :param data: any iterable, it is consumed lazily
+    :param function: function returning a list of outputs for a single row
+    :param chunksize: number of rows in a thread task
+    :type chunksize: int
+    :param ordered: yield outputs in the input order, else as they complete
+    :type ordered: bool
+    :param max_inflight: maximum rows submitted but not yet yielded, defaults
+        to two tasks per thread
+    :type max_inflight: int
+    :param threads: number of threads, defaults to the cpu count
+    :type threads: int
+    :return: generator over the outputs
+
+    after nla.rng.seed(value), every thread runs its seed blocks on streams of
+    its own, the outputs are those of a seeded iter_parallel
+    """
+    threads = threads or multiprocessing.cpu_count()
+    data, function, chunksize, max_inflight = _seed(
+        data, function, chunksize, max_inflight
+    )
+    tasks = max((max_inflight or 2 * threads * chunksize) // chunksize, 1)
+    run = partial(_run_batch, function)
+
+    with ThreadPoolExecutor(threads, thread_name_prefix="nla") as executor:
+        pending = deque() if ordered else set()
+
+        def completed():
+            if ordered:
+                return [pending.popleft()]
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            pending.difference_update(done)
+            return done
+
+        try:
+            for batch in batched(data, chunksize):
+                future = executor.submit(run, batch)
+
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+
+                while len(pending) >= tasks:
+                    for future in completed():
+                        yield from future.result()
+
+            while pending:
+                for future in completed():
+                    yield from future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def choose(per_item, remaining, workers, nogil=False, pool=None):
+    """
+    cost model of 'auto'
+    :param per_item: seconds a row takes serially
+    :type per_item: float
+    :param remaining: number of rows left, None if unknown
+    :type remaining: int
+    :param workers: number of threads or processes available
+    :type workers: int
+    :param nogil: the function releases the GIL, threads are considered
+    :type nogil: bool
+    :param pool: pool of processes that would be reused, free to start
+    :return: backend name and chunk size
+    """
+    if remaining is None:
+        # an unsized stream is assumed long
+        remaining = max(int(1 / max(per_item, 1e-9)), CALIBRATION)
+
+    workers = max(min(workers, remaining), 1)
+    serial = per_item * remaining
+
+    costs = {"serial": serial}
+    if workers > 1:
+        if nogil:
+            costs["thread"] = THREAD_STARTUP + serial / workers
+
+        startup = 0.0 if pool is not None else PROCESS_STARTUP
+        costs["process"] = startup + serial / workers + remaining * PROCESS_OVERHEAD
+
+    backend = min(costs, key=costs.get)
+
+    # a few milliseconds of work per chunk, at least four chunks per worker
+    chunksize = int(CHUNK_SECONDS / max(per_item, 1e-9))
+    chunksize = max(min(chunksize, -(-remaining // (4 * workers))), 1)
+
+    return backend, chunksize
+
+
+def _auto(data, function, chunksize, ordered, max_inflight, workers, pool, nogil):
+    size = len(data) if hasattr(data, "__len__") else None
+    data = iter(data)
+    workers = workers or multiprocessing.cpu_count()
+
+    if rng.seeded():
+        # the rows are grouped in seed blocks before the calibration, so that
+        # the calibrated rows run on their seeded streams, the rows of 'auto'
+        # become blocks and the chosen backend runs the blocks as they are
+        data, function, _, max_inflight = _seed(data, function, 1, max_inflight)
+        if size is not None:
+            size = -(-size // rng.SEED_ROWS)
+        if chunksize is not None:
+            chunksize = -(-chunksize // rng.SEED_ROWS)
+
+    # calibrate on the first rows, their outputs are kept
+    outputs = []
+    n = 0
+    start = time.perf_counter()
+
+    for row in data:
+        outputs.extend(function(row))
+        n += 1
+        if n == CALIBRATION or time.perf_counter() - start > CALIBRATION_SECONDS:
+            break
+    else:
+        # the data fit in the calibration
+        yield from outputs
+        return
+
+    per_item = (time.perf_counter() - start) / n
+    yield from outputs
+
+    remaining = size - n if size is not None else None
+    if remaining == 0:
+        return
+
+    backend, chosen = choose(per_item, remaining, workers, nogil, pool)
+
+    if stats.enabled:
+        stats.count("backend." + backend)
+
+    yield from BACKENDS[backend](
+        data, function, chunksize or chosen, ordered, max_inflight, workers, pool
+    )
+
+
+def iter_backend(
+    data,
+    function,
+    backend=None,
+    chunksize=None,
+    ordered=True,
+    max_inflight=None,
+    workers=None,
+    pool=None,
+    nogil=False,
+):
+    """
+    lazily run the function over the data on a backend
+    :param data: any iterable, it is consumed lazily
+    :param function: function returning a list of outputs for a single row
+    :param backend: 'auto' or one of BACKENDS, defaults to get_backend()
+    :type backend: str
+    :param chunksize: number of rows sent to a worker at once, picked by
+        'auto', else defaults to 1
+    :type chunksize: int
+    :param ordered: yield outputs in the input order, else as they complete
+    :type ordered: bool
+    :param max_inflight: maximum rows handed to the workers but not yet
+        yielded
+    :type max_inflight: int
+    :param workers: number of threads or processes, defaults to the cpu count
+    :type workers: int
+    :param pool: pool of processes to reuse, defaults to the installed default
+        pool
+    :type pool: WorkerPool
+    :param nogil: the function releases the GIL, 'auto' considers threads
+    :type nogil: bool
+    :return: iterator over the outputs
+    """
+    backend = backend or _default_backend
+    pool = pool or get_default_pool()
+    _check(backend)
+
+    if backend == "auto":
+        return _auto(
+            data, function, chunksize, ordered, max_inflight, workers, pool, nogil
+        )
+
+    return BACKENDS[backend](
+        data, function, chunksize or 1, ordered, max_inflight, workers, pool
+    )
+
+
+def run_parallel(data, function, chunksize=None, pool=None, backend=None, nogil=False):
+    """
+    parallelize
+    :param data: iterator
+    :param function:
+    :param chunksize: number of rows sent to a worker at once, picked by
+        'auto', else defaults to 1
+    :type chunksize: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param backend: 'auto' or one of BACKENDS, defaults to get_backend()
+    :type backend: str
+    :param nogil: the function releases the GIL, 'auto' considers threads
+    :type nogil: bool
+    :return:
+    """
+    processes = multiprocessing.cpu_count()
+
+    if hasattr(data, "__len__"):
+        processes = max(min(processes, len(data)), 1)
+
+    return list(
+        iter_backend(
+            data,
+            function,
+            backend,
+            chunksize=chunksize,
+            workers=processes,
+            pool=pool,
+            nogil=nogil,
+        )
+    )
@@ -1,21 +1,401 @@
 from multiprocessing.pool import Pool
 import multiprocessing
+import threading
+import atexit
+import importlib
+from itertools import islice
+from nla import rng, stats
+
+__all__ = [
+    "preload",
+    "WorkerPool",
+    "get_default_pool",
+    "set_default_pool",
+    "batched",
+    "iter_serial",
+    "iter_parallel",
+]
+
+# pool used by every entry point when none is passed explicitly
+_default_pool = None
+
+
+class _Throttle:
+    """
+    bounds the number of items handed to the pool but not yet consumed
+    """
+
+    def __init__(self, data, max_inflight):
+        self.data = data
+        self.slots = threading.Semaphore(max_inflight)
+        self.closed = False
+
+    def __iter__(self):
+        for row in self.data:
+            self.slots.acquire()
+            if self.closed:
+                return
+            yield row
+
+    def release(self):
+        self.slots.release()
+
+    def close(self):
+        # unblock the pool's task handler so that the pool can shut down
+        self.closed = True
+        self.slots.release()
+
+
+def preload(modules):
+    """
+    import the modules and load their assets in the current process
+    :param modules: module names, a module's load() function is called if it
+        has one, e.g. 'nla.keyboard.keyaug' or 'nla.homophones'
+    :type modules: list
+    """
+    for name in modules:
+        module = importlib.import_module(name)
+
+        if callable(getattr(module, "load", None)):
+            module.load()
+
+
+def _initialize(modules, initializer, initargs):
+    # forked workers would otherwise share the random stream of the parent,
+    # and ship back the stats recorded by the parent before the fork. the
+    # seeded calls seed the tasks of the workers, never the workers themselves
+    rng.seed(None)
+    stats.reset()
+    preload(modules)
+
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _ping(_):
+    return multiprocessing.current_process().pid
+
+
+class WorkerPool:
+    """
+    long-lived pool of workers shared across augmentation calls
+
+    usage:
+        with WorkerPool(processes=8) as pool:
+            fetch(words, degree=2, count=2, pool=pool)
+            edge_n_gram(queries, count=2, degree=2, pool=pool)
+
+    assets of the preloaded modules are loaded once and shared by the workers,
+    in the parent before forking with 'fork' and in the server process with
+    'forkserver'. with 'spawn' every worker loads its own copy at startup.
+    """
+
+    def __init__(
+        self,
+        processes=None,
+        maxtasksperchild=None,
+        preload=(),
+        context=None,
+        initializer=None,
+        initargs=(),
+    ):
+        """
+        :param processes: number of worker processes, defaults to the cpu count
+        :type processes: int
+        :param maxtasksperchild: tasks a worker completes before it is replaced
+        :type maxtasksperchild: int
+        :param preload: modules to load before the workers take any work
+        :type preload: list
+        :param context: start method, 'fork', 'spawn' or 'forkserver', defaults
+            to the platform default
+        :type context: str
+        :param initializer: called in every worker after the preload
+        :param initargs: arguments of the initializer
+        :type initargs: tuple
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.maxtasksperchild = maxtasksperchild
+        self.preload = list(preload)
+        self.context = multiprocessing.get_context(context)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.pool = None
+
+    def start(self):
+        """
+        start the workers and wait until every one of them is up
+        """
+        if self.pool is None:
+            method = self.context.get_start_method()
+
+            if method == "fork":
+                # children inherit the loaded assets copy-on-write
+                preload(self.preload)
+            elif method == "forkserver":
+                self.context.set_forkserver_preload(self.preload)
+
+            with stats.timer("pool.start"):
+                self.pool = self.context.Pool(
+                    processes=self.processes,
+                    initializer=_initialize,
+                    initargs=(self.preload, self.initializer, self.initargs),
+                    maxtasksperchild=self.maxtasksperchild,
+                )
+                self.pool.map(_ping, range(self.processes), 1)
+        return self
+
+    def imap(self, function, data, chunksize=1):
+        return self.start().pool.imap(function, data, chunksize)
+
+    def imap_unordered(self, function, data, chunksize=1):
+        return self.start().pool.imap_unordered(function, data, chunksize)
+
+    def close(self):
+        """
+        let the workers finish pending work and shut them down
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        if get_default_pool() is self:
+            set_default_pool(None)
+
+    def terminate(self):
+        """
+        stop the workers immediately
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+        if get_default_pool() is self:
+            set_default_pool(None)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+
+def get_default_pool():
+    """
+    :return: the pool installed with set_default_pool, if any
+    """
+    return _default_pool
+
+
+def set_default_pool(pool):
+    """
+    install a pool to be reused by every parallel call that doesn't pass one
+    :param pool: pool to install, None to uninstall
+    :type pool: WorkerPool
+    :return: the previously installed pool
+    """
+    global _default_pool
+
+    previous, _default_pool = _default_pool, pool
+    return previous
+
+
+@atexit.register
+def _close_default_pool():
+    if _default_pool is not None:
+        _default_pool.close()
+
+
+def batched(data, size):
+    """
+    lazily split an iterable in lists of the given size
+    :param data: iterable
+    :param size: number of rows in a batch
+    :type size: int
+    :return: generator over the batches
+    """
+    data = iter(data)
+
+    while True:
+        batch = list(islice(data, size))
+        if not batch:
+            return
+        yield batch
+
+
+class _Seeded:
+    """
+    runs a task of whole seed blocks, (first block index, rows), every block
+    of nla.rng.SEED_ROWS rows on the stream seeded for that block
+    """
+
+    def __init__(self, function, seeds):
+        self.function = function
+        self.seeds = seeds
+
+    def __call__(self, task):
+        block, rows = task
+        outputs = []
+
+        for start in range(0, len(rows), rng.SEED_ROWS):
+            with rng.task_stream(self.seeds(block)):
+                for row in rows[start : start + rng.SEED_ROWS]:
+                    outputs.extend(self.function(row))
+            block += 1
+
+        return outputs
+
+
+def _seed(data, function, chunksize, max_inflight, seeds=None):
+    """
+    after nla.rng.seed(value), or with explicit seeds, group the rows in tasks
+    of whole seed blocks, so that a block never spans two workers
+    :return: data, function, chunksize and max_inflight counted in tasks,
+        unchanged if unseeded or already seeded
+    """
+    if isinstance(function, _Seeded):
+        seeds = None
+    elif seeds is None:
+        seeds = rng.task_seeds()
+
+    if seeds is None:
+        return data, function, chunksize, max_inflight
+
+    blocks = -(-chunksize // rng.SEED_ROWS)
+    size = blocks * rng.SEED_ROWS
+    data = ((i * blocks, rows) for i, rows in enumerate(batched(data, size)))
+
+    if max_inflight is not None:
+        max_inflight = max(max_inflight // size, 1)
+
+    return data, _Seeded(function, seeds), 1, max_inflight
+
+
+class _Collected:
+    """
+    runs a task with the probes on, the stats of the worker are appended to
+    the outputs and merged by the caller. the outputs are counted rather than
+    the rows, a row may be a whole batch
+    """
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, task):
+        enabled, stats.enabled = stats.enabled, True
+
+        try:
+            outputs = list(self.function(task))
+            stats.worker(len(outputs))
+        finally:
+            stats.enabled = enabled
+
+        outputs.append(stats.take())
+        return outputs
+
+
+def iter_serial(data, function, seeds=None):
+    """
+    lazily run the function over the data in the current process
+    :param data: iterable
+    :param function: function returning a list of outputs for a single row
+    :param seeds: function from the block index to the SeedSequence of the
+        block, e.g. nla.rng.TaskSeeds, defaults to those of a new call after
+        nla.rng.seed(value)
+    :return: generator over the outputs
+
+    after nla.rng.seed(value), the rows run in seed blocks as in iter_parallel,
+    so the outputs are those of a seeded parallel run
+    """
+    data, function, _, _ = _seed(data, function, 1, None, seeds)
+
+    for row in data:
+        yield from function(row)
 
 
 # function to parallelize takes a single argument
-def run_parallel(data, function):
+def iter_parallel(
+    data,
+    function,
+    chunksize=1,
+    ordered=True,
+    max_inflight=None,
+    processes=None,
+    pool=None,
+):
     """
-    parallelize
-    :param data: iterator
-    :param function:
-    :return:
+    lazily parallelize, yielding outputs as the workers finish them
+    :param data: any iterable, it is consumed lazily
+    :param function: function returning a list of outputs for a single row
+    :param chunksize: number of rows sent to a worker at once
+    :type chunksize: int
+    :param ordered: yield outputs in the input order, else as they complete
+    :type ordered: bool
+    :param max_inflight: maximum rows handed to the pool but not yet yielded,
+        defaults to unbounded
+    :type max_inflight: int
+    :param processes: number of worker processes of a one-off pool, defaults
+        to the cpu count
+    :type processes: int
+    :param pool: pool to reuse, defaults to the installed default pool, if none
+        a one-off pool is created
+    :type pool: WorkerPool
+    :return: generator over the outputs
+
+    after nla.rng.seed(value), every block of nla.rng.SEED_ROWS rows runs on a
+    stream seeded from (value, call, block index) and the chunks are rounded up
+    to whole blocks, so the outputs don't depend on the scheduling
     """
-    output = []
-    num_cores = min(multiprocessing.cpu_count(), len(data))
-    data = (row for row in data)
+    pool = pool or get_default_pool()
+    data, function, chunksize, max_inflight = _seed(
+        data, function, chunksize, max_inflight
+    )
+
+    collect = stats.enabled
+    if collect:
+        function = _Collected(function)
+
+    if pool is None:
+        with stats.timer("pool.start"):
+            pool = Pool(
+                processes=processes or multiprocessing.cpu_count(),
+                initializer=_initialize,
+                initargs=((), None, ()),
+            )
+
+        with pool:
+            yield from _iter_pool(
+                pool, data, function, chunksize, ordered, max_inflight, collect
+            )
+    else:
+        yield from _iter_pool(
+            pool, data, function, chunksize, ordered, max_inflight, collect
+        )
+
+    if collect:
+        stats.report()
+
+
+def _iter_pool(pool, data, function, chunksize, ordered, max_inflight, collect):
+    throttle = None
+    if max_inflight is not None:
+        # a chunk is only dispatched once it is full
+        throttle = _Throttle(data, max(max_inflight, chunksize))
+        data = iter(throttle)
 
-    with Pool(processes=num_cores) as pool:
-        for result in pool.map(function, data):
-            output.extend(result)
+    imap = pool.imap if ordered else pool.imap_unordered
 
-    return output
+    try:
+        for result in imap(function, data, chunksize):
+            if throttle is not None:
+                throttle.release()
+            if collect:
+                stats.current().merge(result.pop())
+            yield from result
+    finally:
+        if throttle is not None:
+            throttle.close()
@@ -0,0 +1,260 @@
+"""
+Composable augmentation pipeline.
+
+A pipeline chains stages, e.g. homophones then keyboard typos then word
+boundary noise, and streams every text through all the stages inside a single
+worker, so the intermediate variants are never collected into lists nor
+pickled between the stages. The stage configurations are validated once, when
+the pipeline is built.
+
+    pipeline = Pipeline(
+        [
+            Stage("homophones", count=3, beamwidth=20),
+            Stage("keyboard_sent_aug", count=2, degree=1, probability=0.5),
+            {"stage": "word_boundary", "count": 2, "degree": 0.6},
+        ]
+    )
+    rows = pipeline.run(sentences, parallel=True, dummy_identifier_1="generic1")
+"""
+
+import inspect
+from functools import partial
+
+from nla.rng import stream
+from nla import stats
+from nla.parallelize import *
+from nla.keyboard.randaug import POSITIONS, check_method
+
+# stage name to (module, function of a single text, method to augmentation
+# mapping or None)
+STAGES = {
+    "homophones": ("nla.homophones", "genome", None),
+    "fetch": ("nla.keyboard.randaug", "_fetch", "FUNCTIONS"),
+    "nn_fetch": ("nla.keyboard.keyaug", "_nn_fetch", "NN_FUNCTIONS"),
+    "rand_sent_aug": ("nla.keyboard.nlaug", "_rand_sent_aug", "FUNCTIONS"),
+    "keyboard_sent_aug": (
+        "nla.keyboard.nlaug",
+        "_keyboard_sent_aug",
+        "NN_FUNCTIONS",
+    ),
+    "edge_n_gram": ("nla.edge_n_gram", "__edge_n_gram__", None),
+    "word_boundary": ("nla.word_boundary", "__word_boundary__", None),
+}
+
+
+class Stage:
+    """
+    one augmentation of a pipeline
+    """
+
+    def __init__(self, name, count=1, probability=1.0, **params):
+        """
+        :param name: augmentation, one of the STAGES
+        :type name: str
+        :param count: fan-out, number of variants of every incoming text
+        :type count: int
+        :param probability: probability of augmenting an incoming text, the
+            text is passed through unchanged otherwise
+        :type probability: float
+        :param params: arguments of the augmentation, degree, method, position
+            or beamwidth
+        """
+        assert name in STAGES, "stage needs to be either {}".format(
+            str(list(STAGES))[1:-1]
+        )
+        assert count >= 1, "count argument needs to be at least 1"
+        assert 0 <= probability <= 1, "probability takes values between 0 and 1"
+
+        module, function, methods = STAGES[name]
+        module = __import__(module, fromlist=[function])
+
+        self.name = name
+        self.timer = "stage." + name
+        self.count = count
+        self.probability = probability
+        self.params = params
+        self.function = getattr(module, function)
+
+        # validate the arguments once instead of on every text
+        signature = inspect.signature(self.function)
+        arguments = [
+            p
+            for p in list(signature.parameters)[1:]
+            if signature.parameters[p].kind != inspect.Parameter.VAR_KEYWORD
+        ]
+        unknown = set(params) - set(arguments)
+        assert not unknown, "{} stage doesn't take {}".format(
+            name, str(sorted(unknown))[1:-1]
+        )
+
+        if name == "homophones":
+            signature.bind("", **params)
+        else:
+            signature.bind("", count=count, **params)
+
+        if methods is not None:
+            check_method(params.get("method", "random"), getattr(module, methods))
+            assert params.get(
+                "position", "random"
+            ) in POSITIONS, "position argument needs to be either {}".format(
+                str(POSITIONS)[1:-1]
+            )
+
+        if name == "word_boundary":
+            assert (
+                0 <= params.get("degree", 1) <= 1
+            ), "degree argument takes values between 0 and 1"
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        :param config: stage arguments with the augmentation under 'stage'
+        :type config: dict
+        :return: Stage
+        """
+        config = dict(config)
+        return cls(config.pop("stage"), **config)
+
+    def augment(self, text):
+        """
+        :param text: text to augment
+        :type text: str
+        :return: list of variants, the text itself if the augmentation has none
+        """
+        with stats.timer(self.timer):
+            if self.name == "homophones":
+                variants = self.function(text, **self.params)
+                variants = stream().sample(variants, self.count)
+            else:
+                variants = [
+                    row[0]
+                    for row in self.function(text, count=self.count, **self.params)
+                ]
+
+        return variants or [text]
+
+    def stream(self, texts):
+        """
+        :param texts: iterable of incoming texts
+        :return: generator over the variants of every text
+        """
+        random = stream().random
+
+        for text in texts:
+            if self.probability < 1 and random() >= self.probability:
+                yield text
+            else:
+                yield from self.augment(text)
+
+    def __repr__(self):
+        return "Stage({!r}, count={}, probability={}{})".format(
+            self.name,
+            self.count,
+            self.probability,
+            "".join(", {}={!r}".format(k, v) for k, v in self.params.items()),
+        )
+
+
+class Pipeline:
+    """
+    chain of stages, the variants of a stage are fed one at a time to the next
+    """
+
+    def __init__(self, stages):
+        """
+        :param stages: list of Stage or stage configurations
+        :type stages: list
+        """
+        assert stages, "a pipeline needs at least one stage"
+
+        self.stages = [
+            stage if isinstance(stage, Stage) else Stage.from_config(stage)
+            for stage in stages
+        ]
+
+    def variants(self, text):
+        """
+        :param text: text to augment
+        :type text: str
+        :return: generator over the outputs of the last stage
+        """
+        texts = iter((text,))
+
+        for stage in self.stages:
+            texts = stage.stream(texts)
+
+        return texts
+
+    def __call__(self, text, **kwargs):
+        """
+        run the pipeline on a text
+        :param text: text to augment
+        :type text: str
+        :param kwargs: identifiers
+        :return: list of tuples with the augmented text, the original text and
+            the identifiers
+        """
+        identifiers = tuple(kwargs.values())
+        return [(v, text) + identifiers for v in self.variants(text)]
+
+    def run(
+        self,
+        texts,
+        parallel=True,
+        chunksize=64,
+        ordered=True,
+        max_inflight=None,
+        pool=None,
+        backend=None,
+        **kwargs
+    ):
+        """
+        lazily run the pipeline on any iterable of texts
+        :param texts: iterable of texts to augment
+        :type texts: iterable
+        :param parallel: run in parallel
+        :type parallel: bool
+        :param chunksize: number of texts sent to a worker at once
+        :type chunksize: int
+        :param ordered: yield outputs in the input order
+        :type ordered: bool
+        :param max_inflight: maximum texts being processed at once
+        :type max_inflight: int
+        :param pool: pool to reuse instead of starting a new one
+        :type pool: WorkerPool
+        :param backend: 'auto' or one of the parallelize BACKENDS, defaults to
+            get_backend()
+        :type backend: str
+        :param kwargs: identifiers
+        :return: generator over the augmented tuples
+        """
+        function = partial(self, **kwargs)
+
+        if parallel:
+            return iter_backend(
+                texts,
+                function,
+                backend,
+                chunksize=chunksize,
+                ordered=ordered,
+                max_inflight=max_inflight,
+                pool=pool,
+            )
+
+        return iter_serial(texts, function)
+
+    def __repr__(self):
+        return "Pipeline({!r})".format(self.stages)
+
+
+if __name__ == "__main__":
+    pipeline = Pipeline(
+        [
+            Stage("keyboard_sent_aug", count=2, degree=1),
+            Stage("edge_n_gram", count=2, degree=2, probability=0.5),
+            {"stage": "word_boundary", "count": 2, "degree": 0.6},
+        ]
+    )
+
+    data = ["DEEP NEURAL", "CRAVING MANIFEST"]
+    print(list(pipeline.run(data, parallel=True, dummy_identifier_1="generic1")))
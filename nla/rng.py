@@ -0,0 +1,266 @@
+"""
+Random number layer of the augmentations.
+
+Every process has one stream, a numpy Generator plus a buffer of uniforms
+drawn in blocks, so that the scalar hot paths pay a list lookup instead of a
+call into the RNG per draw. The vectorized paths draw from the same Generator.
+
+Streams are derived from a SeedSequence. Workers of a pool get their own
+stream, and after seed(value) every parallel or serial call splits its rows in
+blocks of SEED_ROWS consecutive rows and runs every block on a stream seeded
+from (value, call, block), so that seeded runs are reproducible no matter the
+backend, the chunk size or which worker takes which block.
+"""
+
+import string
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+# uniforms drawn at once, the first block of a stream is FIRST_BLOCK and the
+# next ones double up to BLOCK, so that the short lived stream of a seed block
+# doesn't draw thousands of uniforms it never uses
+BLOCK = 4096
+FIRST_BLOCK = 64
+
+# rows of a block running on its own stream after seed(value), the outputs of a
+# seeded run depend on it, it is fixed so that they depend on nothing else
+SEED_ROWS = 64
+
+LETTERS = string.ascii_uppercase
+
+
+class RandomBuffer:
+    """
+    numpy Generator serving scalar draws from pre-drawn blocks
+    """
+
+    def __init__(self, seed=None, block=BLOCK):
+        """
+        :param seed: int, SeedSequence or None for fresh entropy
+        :param block: maximum number of uniforms drawn at once
+        :type block: int
+        """
+        self.generator = np.random.default_rng(seed)
+        self.block = block
+        self.size = min(FIRST_BLOCK, block)
+        self.next = iter(()).__next__
+
+    def random(self):
+        """
+        :return: uniform float in [0, 1)
+        """
+        try:
+            return self.next()
+        except StopIteration:
+            self.next = iter(self.generator.random(self.size).tolist()).__next__
+            self.size = min(2 * self.size, self.block)
+            return self.next()
+
+    def randrange(self, n):
+        """
+        :return: uniform int in [0, n)
+        """
+        if n < 1 << 53:
+            return int(self.random() * n)
+
+        # too large for the precision of a float
+        nbytes = (n.bit_length() + 7) // 8
+
+        while True:
+            value = int.from_bytes(self.generator.bytes(nbytes), "little")
+            value >>= nbytes * 8 - n.bit_length()
+            if value < n:
+                return value
+
+    def choice(self, sequence):
+        """
+        :return: uniform element of a non empty sequence
+        """
+        return sequence[int(self.random() * len(sequence))]
+
+    def letter(self):
+        """
+        :return: uniform uppercase ascii letter
+        """
+        return LETTERS[int(self.random() * 26)]
+
+    def sample(self, population, k):
+        """
+        k distinct elements in random order, min(k, len(population)) if k is
+        larger than the population
+        :param population: sequence, a range is never materialized
+        :type population: sequence
+        :param k: number of elements
+        :type k: int
+        :return: list of elements
+        """
+        n = len(population)
+        k = min(k, n)
+
+        if k == 1:
+            return [population[int(self.random() * n)]]
+
+        if 4 * k < n:
+            # sparse, draw with rejection of the repeated indices
+            seen = set()
+            result = []
+
+            while len(result) < k:
+                i = self.randrange(n)
+                if i not in seen:
+                    seen.add(i)
+                    result.append(population[i])
+
+            return result
+
+        # partial Fisher-Yates shuffle of a copy
+        result = list(population)
+        random = self.random
+
+        for i in range(k):
+            j = i + int(random() * (n - i))
+            result[i], result[j] = result[j], result[i]
+
+        return result[:k]
+
+    def permutation(self, n):
+        """
+        lazy random permutation of range(n), a sparse Fisher-Yates shuffle
+        keeping only the displaced elements, so drawing the first k elements
+        costs O(k) whatever n
+        :param n: size of the range
+        :type n: int
+        :return: generator over the permuted range
+        """
+        displaced = {}
+
+        for i in range(n):
+            j = i + self.randrange(n - i)
+            yield displaced.get(j, j)
+            displaced[j] = displaced.pop(i, i)
+
+
+# stream of the current process
+_stream = RandomBuffer()
+
+
+class _Local(threading.local):
+    # stream of the seeded task running in the thread, see task_stream
+    stream = None
+
+
+_local = _Local()
+
+# entropy set with seed(), None if unseeded
+_entropy = None
+
+# number of seeded parallel calls made by this process
+_calls = 0
+
+
+def stream():
+    """
+    :return: RandomBuffer of the seeded task running in the current thread,
+        else of the current process
+    """
+    return _local.stream or _stream
+
+
+def generator():
+    """
+    :return: numpy Generator of the current stream
+    """
+    return stream().generator
+
+
+def seed(value=None):
+    """
+    seed the stream of the current process and the tasks of the subsequent
+    parallel calls
+    :param value: int or None to reseed from fresh entropy and make parallel
+        calls unseeded again
+    :type value: int
+    """
+    global _stream, _entropy, _calls
+
+    sequence = np.random.SeedSequence(value)
+
+    _stream = RandomBuffer(sequence.spawn(1)[0])
+    _entropy = sequence.entropy if value is not None else None
+    _calls = 0
+
+
+def reseed(sequence):
+    """
+    replace the stream of the current process, used by the workers
+    :param sequence: SeedSequence or None for fresh entropy
+    """
+    global _stream
+
+    _stream = RandomBuffer(sequence)
+
+
+@contextmanager
+def task_stream(sequence):
+    """
+    run a seeded task on a stream of its own in the current thread, the
+    stream of the process and of the other threads is left untouched
+    :param sequence: SeedSequence of the task
+    """
+    previous = _local.stream
+    _local.stream = RandomBuffer(sequence)
+
+    try:
+        yield
+    finally:
+        _local.stream = previous
+
+
+def seeded():
+    """
+    :return: True if the parallel calls are seeded, see seed
+    """
+    return _entropy is not None
+
+
+def task_seeds():
+    """
+    seed sequence factory of a new parallel call
+    :return: function from block index to SeedSequence, None if unseeded or
+        called from a seeded task, whose nested calls run on the task stream
+    """
+    global _calls
+
+    if _entropy is None or _local.stream is not None:
+        return None
+
+    _calls += 1
+    return TaskSeeds(_entropy, _calls)
+
+
+class TaskSeeds:
+    """
+    seed sequence of a task, keyed by the entropy and the task index prefixed
+    with a key, e.g. the parallel call or the shard
+    """
+
+    def __init__(self, entropy, *key):
+        self.entropy = entropy
+        self.key = key
+
+    def __call__(self, task):
+        return np.random.SeedSequence(self.entropy, spawn_key=self.key + (task,))
+
+
+# drop-in replacements of the numpy.random functions, on the current stream
+def randint(low, high=None, size=None, dtype="int64"):
+    return stream().generator.integers(low, high, size, dtype=dtype)
+
+
+def random(size=None):
+    return stream().generator.random(size)
+
+
+def binomial(n, p, size=None):
+    return stream().generator.binomial(n, p, size)
@@ -0,0 +1,464 @@
+"""
+Micro-batching service for the homophones.
+
+The seq2seq models behind genome are much faster on batches, but online
+callers ask for one word at a time. A GenomeServer queues the concurrent
+requests and a single thread coalesces them: a batch is closed when it holds
+max_batch requests or max_wait seconds after its first request, whichever
+comes first, and runs through genome_many, which deduplicates the chunks and
+runs the models on padded batches. Every request gets a concurrent.futures
+Future, wrap it with asyncio.wrap_future in async code.
+
+The server runs in process, or behind a Unix socket speaking JSON lines, so
+that several processes share one copy of the models. It keeps the latency of
+the last requests, from submission to result, and reports its percentiles.
+
+usage:
+    server = GenomeServer(max_batch=64, max_wait=0.005)
+    future = server.submit("CARROM", beamwidth=20)
+    future.result()
+    server.latency()
+
+    python -m nla.server serve --socket /tmp/nla.sock --max-batch 64
+    python -m nla.server load --socket /tmp/nla.sock --clients 32 --requests 2000
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import socketserver
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from nla import stats
+from nla.homophones import genome_many
+
+# latencies kept for the percentiles
+WINDOW = 100000
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    coalesces concurrent requests into batched calls of a function on a
+    dedicated thread
+    """
+
+    def __init__(self, function, max_batch=64, max_wait=0.005, window=WINDOW):
+        """
+        :param function: function from a list of requests to the list of
+            their results
+        :param max_batch: maximum requests in a batch
+        :type max_batch: int
+        :param max_wait: seconds a batch waits for more requests after its
+            first one
+        :type max_wait: float
+        :param window: number of latest latencies kept
+        :type window: int
+        """
+        assert max_batch > 0, "max_batch needs to be positive"
+        assert max_wait >= 0, "max_wait can't be negative"
+
+        self.function = function
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.latencies = deque(maxlen=window)
+        self.batches = self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        # concurrent first submits start a single thread
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._loop, name="nla-batcher", daemon=True
+                )
+                self.thread.start()
+        return self
+
+    def submit(self, request):
+        """
+        :param request: argument of the function, in a list with the others of
+            its batch
+        :return: Future of the result
+        """
+        future = Future()
+        self.start().queue.put((request, future, time.perf_counter()))
+        return future
+
+    def __call__(self, request):
+        return self.submit(request).result()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+
+            try:
+                # past the deadline only the requests already queued join
+                if timeout > 0:
+                    item = self.queue.get(timeout=timeout)
+                else:
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+
+            batch, stop = self._collect(item)
+            self._run(batch)
+
+            if stop:
+                return
+
+    def _run(self, batch):
+        # cancelled requests are dropped
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        try:
+            results = list(self.function([request for request, _, _ in batch]))
+
+            # a missing result would leave its future pending forever
+            if len(results) != len(batch):
+                raise ValueError(
+                    "the batch function returned {} results for {} requests".format(
+                        len(results), len(batch)
+                    )
+                )
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            results = None
+
+        end = time.perf_counter()
+
+        with self.lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.latencies.extend(end - start for _, _, start in batch)
+
+        if stats.enabled:
+            stats.count("server.batches")
+            stats.count("server.requests", len(batch))
+
+        if results is not None:
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def latency(self):
+        """
+        :return: number of requests and batches, mean batch size and latency
+            percentiles in milliseconds over the latest requests
+        """
+        with self.lock:
+            latencies = np.array(self.latencies)
+            report = {
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch": self.requests / self.batches if self.batches else 0.0,
+            }
+
+        for p in PERCENTILES:
+            key = "p{:g}_ms".format(p)
+            report[key] = (
+                float(np.percentile(latencies, p)) * 1e3 if len(latencies) else None
+            )
+
+        report["max_ms"] = float(latencies.max()) * 1e3 if len(latencies) else None
+        return report
+
+    def close(self):
+        """
+        run the queued requests and stop the thread
+        """
+        with self.lock:
+            thread, self.thread = self.thread, None
+
+        if thread is not None:
+            self.queue.put(_STOP)
+            thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _genome_batch(requests, batch_size):
+    # genome_many takes a single beam width, the batch is split by beam width
+    groups = {}
+    for i, (query, beamwidth) in enumerate(requests):
+        groups.setdefault(beamwidth, []).append(i)
+
+    results = [None] * len(requests)
+
+    for beamwidth, indices in groups.items():
+        queries = [requests[i][0] for i in indices]
+        for i, homophones in zip(indices, genome_many(queries, beamwidth, batch_size)):
+            results[i] = homophones
+
+    return results
+
+
+class GenomeServer(MicroBatcher):
+    """
+    micro-batching genome
+    """
+
+    def __init__(self, max_batch=64, max_wait=0.005, batch_size=256, window=WINDOW):
+        """
+        :param max_batch: maximum words in a batch
+        :type max_batch: int
+        :param max_wait: seconds a batch waits for more words after its first
+        :type max_wait: float
+        :param batch_size: number of chunks in a model batch, see genome_many
+        :type batch_size: int
+        :param window: number of latest latencies kept
+        :type window: int
+        """
+        super().__init__(
+            lambda requests: _genome_batch(requests, batch_size),
+            max_batch,
+            max_wait,
+            window,
+        )
+
+    def submit(self, query, beamwidth=50):
+        """
+        :param query: word to augment
+        :type query: str
+        :param beamwidth: number of outputs
+        :type beamwidth: int
+        :return: Future of the list of homophones
+        """
+        return super().submit((query, beamwidth))
+
+    def genome(self, query, beamwidth=50):
+        return self.submit(query, beamwidth).result()
+
+    __call__ = genome
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    a JSON line per request, {"query": ..., "beamwidth": ...}, answered with
+    {"homophones": [...]}, {"latency": {...}} for {"latency": true}, or
+    {"error": ...}
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+
+                if request.get("latency"):
+                    response = {"latency": self.server.genome.latency()}
+                else:
+                    homophones = self.server.genome.genome(
+                        request["query"], int(request.get("beamwidth", 50))
+                    )
+                    response = {"homophones": homophones}
+            except Exception as e:
+                response = {"error": "{}: {}".format(type(e).__name__, e)}
+
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class SocketServer(socketserver.ThreadingUnixStreamServer):
+    """
+    GenomeServer behind a Unix socket, a thread per connection submits to the
+    shared batcher so that concurrent connections share the model batches
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, genome=None):
+        """
+        :param path: path of the socket, replaced if it exists
+        :type path: str
+        :param genome: server to share, a default GenomeServer if None
+        :type genome: GenomeServer
+        """
+        if os.path.exists(path):
+            os.unlink(path)
+
+        self.genome = (genome or GenomeServer()).start()
+        super().__init__(path, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        self.genome.close()
+
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class Client:
+    """
+    client of a SocketServer, one connection, not shared across threads
+    """
+
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.file = self.socket.makefile("rwb")
+
+    def request(self, request):
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+        response = json.loads(self.file.readline())
+
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    def genome(self, query, beamwidth=50):
+        """
+        :return: list of homophones
+        """
+        return self.request({"query": query, "beamwidth": beamwidth})["homophones"]
+
+    def latency(self):
+        """
+        :return: latency report of the server
+        """
+        return self.request({"latency": True})["latency"]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def load(genome, queries, clients=32, beamwidth=50):
+    """
+    concurrent load on a server, every client thread sends its requests one
+    after the other
+    :param genome: function from (query, beamwidth) to homophones, called by
+        the client threads, or a socket path, every thread then has a Client
+    :param queries: words to request
+    :type queries: list
+    :param clients: number of concurrent clients
+    :type clients: int
+    :param beamwidth: number of outputs
+    :type beamwidth: int
+    :return: throughput and client side latency percentiles in milliseconds
+    """
+    local = threading.local()
+
+    def call(query):
+        function = genome
+        if isinstance(genome, str):
+            if not hasattr(local, "client"):
+                local.client = Client(genome)
+            function = local.client.genome
+
+        start = time.perf_counter()
+        function(query, beamwidth)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        latencies = np.array(list(executor.map(call, queries)))
+    seconds = time.perf_counter() - start
+
+    report = {
+        "requests": len(queries),
+        "clients": clients,
+        "seconds": seconds,
+        "throughput": len(queries) / seconds,
+    }
+    for p in PERCENTILES:
+        report["p{:g}_ms".format(p)] = float(np.percentile(latencies, p)) * 1e3
+    report["max_ms"] = float(latencies.max()) * 1e3
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m nla.server", description="micro-batching homophone server"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="serve genome on a Unix socket")
+    serve.add_argument("--socket", required=True, help="path of the socket")
+    serve.add_argument("--max-batch", type=int, default=64)
+    serve.add_argument("--max-wait", type=float, default=0.005, help="seconds")
+    serve.add_argument("--batch-size", type=int, default=256)
+
+    bench = commands.add_parser(
+        "load", help="concurrent load, on a socket or an in process server"
+    )
+    bench.add_argument("--socket", help="path of the socket, in process if unset")
+    bench.add_argument("--clients", type=int, default=32)
+    bench.add_argument("--requests", type=int, default=1000)
+    bench.add_argument("--beamwidth", type=int, default=50)
+    bench.add_argument("--max-batch", type=int, default=64)
+    bench.add_argument("--max-wait", type=float, default=0.005, help="seconds")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        genome = GenomeServer(args.max_batch, args.max_wait, args.batch_size)
+        with SocketServer(args.socket, genome) as server:
+            print("serving on {}".format(args.socket), file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return 0
+
+    # imported here, only the load command needs a corpus
+    from nla.benchmark import words
+
+    queries = words(args.requests, "normal")
+
+    if args.socket:
+        report = load(args.socket, queries, args.clients, args.beamwidth)
+        with Client(args.socket) as client:
+            report["server"] = client.latency()
+    else:
+        with GenomeServer(args.max_batch, args.max_wait) as genome:
+            report = load(genome, queries, args.clients, args.beamwidth)
+            report["server"] = genome.latency()
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Sharded processing of corpora larger than memory.
+
+The input file is memory-mapped and split in byte ranges aligned on newlines,
+every shard streams its range through the augmentation and writes its own
+output file, and a merge step concatenates the shard outputs in shard order.
+
+The ranges only depend on the file and the number of shards, and after --seed
+the rows of a shard run in blocks of nla.rng.SEED_ROWS rows, each on a stream
+seeded from (seed, shards, shard, block). The augmentations emit their rows in
+draw order, never in hash order, so the bytes of a shard output only depend on
+the file, --shards and --seed: not on the number of processes, the shard ids
+run together or PYTHONHASHSEED, see tests/test_shard.py. Several
+machines can thus each take a slice of the shard ids of the same file and
+produce disjoint, reproducible outputs with no coordinator.
+
+usage:
+    python -m nla.shard run fetch queries.tsv out.tsv --shards 64 --seed 7
+    python -m nla.shard run fetch queries.tsv out.tsv --shards 64 --seed 7 \
+        --shard-ids 0-31 --processes 8
+    python -m nla.shard merge out.tsv --shards 64 --remove
+"""
+
+import os
+import sys
+import mmap
+import time
+import shutil
+import argparse
+import multiprocessing
+import numpy as np
+from nla import rng
+from nla.parallelize import *
+from nla.cli import (
+    BUFFER_ROWS,
+    arguments,
+    input_format,
+    open_file,
+    read,
+    record_function,
+    write,
+)
+
+
+def ranges(path, shards):
+    """
+    byte ranges of the shards of a file, every range starts at the beginning
+    of a line and ends after a newline or at the end of the file
+    :param path: uncompressed input file
+    :type path: str
+    :param shards: number of shards
+    :type shards: int
+    :return: list of (start, end) for every shard, empty shards are (n, n)
+    """
+    assert shards > 0, "shards needs to be positive"
+
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(0, 0)] * shards
+
+    bounds = [0]
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, shards):
+            bound = max(size * i // shards, bounds[-1])
+
+            # a bound inside a line moves past its newline
+            if 0 < bound < size and mm[bound - 1] != ord("\n"):
+                newline = mm.find(b"\n", bound)
+                bound = size if newline < 0 else newline + 1
+
+            bounds.append(bound)
+
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def lines(path, start, end):
+    """
+    lazily read the lines of a byte range through a memory map
+    :param path: uncompressed input file
+    :type path: str
+    :param start: offset of the first line
+    :type start: int
+    :param end: offset past the last line
+    :type end: int
+    :return: generator over the decoded lines
+    """
+    if start >= end:
+        return
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+
+        while mm.tell() < end:
+            yield mm.readline().decode("utf-8")
+
+
+def shard_path(output, shard, shards):
+    """
+    :return: output file of a shard, out.tsv.gz becomes out-00003-of-00064.tsv.gz
+    """
+    directory, name = os.path.split(output)
+    name, dot, extension = name.partition(".")
+    return os.path.join(
+        directory, "{}-{:05d}-of-{:05d}{}{}".format(name, shard, shards, dot, extension)
+    )
+
+
+def shard_seeds(seed, shard, shards):
+    """
+    :return: function from the block index to the SeedSequence of that block
+        of the shard, None if unseeded
+    """
+    if seed is None:
+        return None
+
+    return rng.TaskSeeds(np.random.SeedSequence(seed).entropy, shards, shard)
+
+
+def run_shard(args, shard):
+    """
+    augment a shard of the input into its output file
+    :param args: parsed command line, see parser
+    :param shard: shard id
+    :type shard: int
+    :return: shard id, number of input lines and output rows
+    """
+    start, end = ranges(args.input, args.shards)[shard]
+    function = record_function(args)
+    seeds = shard_seeds(args.seed, shard, args.shards)
+    keep = args.keep.split(",") if args.keep else None
+
+    nlines = nrows = 0
+
+    def records():
+        nonlocal nlines
+
+        for record in read(
+            lines(args.input, start, end), args.format, args.column, args.field, keep
+        ):
+            nlines += 1
+            yield record
+
+    # the blocks of a shard only depend on its rows, each is seeded
+    outputs = iter_serial(records(), function, seeds=seeds)
+
+    path = shard_path(args.output, shard, args.shards)
+    directory, name = os.path.split(path)
+    # keeps the extension, so that a .gz output is gzipped
+    partial_path = os.path.join(directory, ".partial-" + name)
+
+    with open_file(partial_path, "w") as fout:
+        for rows in batched(outputs, BUFFER_ROWS):
+            fout.write(write(rows, args.format, keep))
+            nrows += len(rows)
+
+    # a complete shard output appears at once, a failed one leaves no file
+    os.replace(partial_path, path)
+
+    return shard, nlines, nrows
+
+
+class _Shard:
+    def __init__(self, args):
+        self.args = args
+
+    def __call__(self, shard):
+        return [run_shard(self.args, shard)]
+
+
+def run(args, shard_ids=None, log=None):
+    """
+    run shards of the input, in parallel across shards
+    :param args: parsed command line, see parser
+    :param shard_ids: shard ids to run, defaults to all of them
+    :type shard_ids: list
+    :param log: called with (shard, lines, outputs) as every shard completes
+    :return: list of (shard, lines, outputs)
+    """
+    shard_ids = list(range(args.shards) if shard_ids is None else shard_ids)
+    assert all(0 <= s < args.shards for s in shard_ids), "shard ids out of range"
+
+    processes = min(args.processes or multiprocessing.cpu_count(), len(shard_ids))
+    function = _Shard(args)
+
+    if processes > 1:
+        outputs = iter_parallel(shard_ids, function, ordered=False, processes=processes)
+    else:
+        outputs = iter_serial(shard_ids, function)
+
+    results = []
+    for result in outputs:
+        results.append(result)
+        if log is not None:
+            log(*result)
+
+    return sorted(results)
+
+
+def merge(output, shards, remove=False):
+    """
+    concatenate the shard outputs in shard order, gzipped outputs concatenate
+    into a valid gzip file
+    :param output: merged output file, the shard outputs are named after it
+    :type output: str
+    :param shards: number of shards
+    :type shards: int
+    :param remove: delete the shard outputs once merged
+    :type remove: bool
+    :return: number of bytes written
+    """
+    paths = [shard_path(output, shard, shards) for shard in range(shards)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    assert not missing, "missing shard outputs: {}".format(", ".join(missing))
+
+    with open(output, "wb") as fout:
+        for path in paths:
+            with open(path, "rb") as fin:
+                shutil.copyfileobj(fin, fout, 1 << 20)
+        size = fout.tell()
+
+    if remove:
+        for path in paths:
+            os.remove(path)
+
+    return size
+
+
+def shard_ids(value):
+    """
+    :param value: comma separated ids and ranges, e.g. '0-15,32'
+    :return: list of shard ids
+    """
+    ids = []
+    for part in value.split(","):
+        first, _, last = part.partition("-")
+        ids.extend(range(int(first), int(last or first) + 1))
+    return ids
+
+
+def parser():
+    p = argparse.ArgumentParser(
+        prog="python -m nla.shard", description="sharded corpus augmentation"
+    )
+    commands = p.add_subparsers(dest="command", required=True)
+
+    command = arguments(commands.add_parser("run", help="augment shards of a file"))
+    command.add_argument("--shards", type=int, required=True)
+    command.add_argument(
+        "--shard-ids", type=shard_ids, help="shards to run, e.g. 0-15,32, default all"
+    )
+    command.add_argument(
+        "--processes", type=int, help="shards run at once, defaults to the cpu count"
+    )
+
+    command = commands.add_parser("merge", help="concatenate the shard outputs")
+    command.add_argument("output")
+    command.add_argument("--shards", type=int, required=True)
+    command.add_argument(
+        "--remove", action="store_true", help="delete the shard outputs"
+    )
+    return p
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+
+    if args.command == "merge":
+        size = merge(args.output, args.shards, args.remove)
+        print("{} shards, {} bytes".format(args.shards, size), file=sys.stderr)
+        return 0
+
+    assert not args.input.endswith(".gz"), "sharding needs an uncompressed input"
+    assert args.output != "-", "every shard writes its own output file"
+    if args.format is None:
+        args.format = input_format(args.input)
+
+    start = time.time()
+    results = run(
+        args,
+        args.shard_ids,
+        log=lambda shard, nlines, nrows: print(
+            "shard {}: {} lines, {} outputs".format(shard, nlines, nrows),
+            file=sys.stderr,
+        ),
+    )
+    elapsed = time.time() - start
+
+    nlines = sum(r[1] for r in results)
+    print(
+        "{} shards, {} lines in {:.1f}s, {:.0f} lines/s".format(
+            len(results), nlines, elapsed, nlines / elapsed if elapsed else 0.0
+        ),
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
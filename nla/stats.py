@@ -0,0 +1,201 @@
+"""
+Instrumentation of the hot paths.
+
+Disabled by default. Every probe in the augmentations is guarded by a check
+of `stats.enabled`, so a disabled probe costs a global lookup and nothing
+else. Once enabled, the probes record counters (candidates drawn, duplicates,
+exhausted spaces, outputs, cache hits) and timers (pool startup, model calls,
+pipeline stages) in the Stats of the current process. The parallel path ships
+the stats of the workers back with their outputs and merges them into the
+stats of the caller, along with the number of outputs every worker produced.
+
+usage:
+    from nla import stats
+
+    stats.enable(hook=print)
+    fetch(words, degree=2, count=3)
+    stats.current().as_dict()
+"""
+
+import os
+import time
+
+# probes are skipped unless enabled
+enabled = False
+
+# called with the Stats after every parallel call and on report()
+_hook = None
+
+
+class Stats:
+    """
+    counters, timers and outputs per worker
+    """
+
+    def __init__(self):
+        self.counters = {}
+        # name to [calls, seconds]
+        self.timers = {}
+        # worker pid to outputs produced
+        self.workers = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def time(self, name, seconds):
+        timer = self.timers.setdefault(name, [0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+
+    def worker(self, pid, outputs):
+        self.workers[pid] = self.workers.get(pid, 0) + outputs
+
+    def merge(self, other):
+        """
+        add the counters, timers and outputs per worker of other stats
+        :param other: Stats
+        """
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+        for name, (calls, seconds) in other.timers.items():
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+
+        for pid, outputs in other.workers.items():
+            self.worker(pid, outputs)
+
+    def clear(self):
+        self.counters.clear()
+        self.timers.clear()
+        self.workers.clear()
+
+    def __bool__(self):
+        return bool(self.counters or self.timers or self.workers)
+
+    def as_dict(self):
+        """
+        :return: counters, timers with their calls, total and mean seconds, and
+            outputs per worker
+        """
+        return {
+            "counters": dict(self.counters),
+            "timers": {
+                name: {
+                    "calls": calls,
+                    "seconds": seconds,
+                    "mean_seconds": seconds / calls if calls else 0.0,
+                }
+                for name, (calls, seconds) in self.timers.items()
+            },
+            "workers": dict(self.workers),
+        }
+
+    def __repr__(self):
+        return "Stats({})".format(self.as_dict())
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _stats.time(self.name, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_no_timer = _NoTimer()
+
+# stats of the current process
+_stats = Stats()
+
+
+def enable(hook=None):
+    """
+    turn the probes on
+    :param hook: called with the Stats after every parallel call and on
+        report(), e.g. to log them
+    """
+    global enabled, _hook
+
+    enabled = True
+    _hook = hook
+
+
+def disable():
+    """
+    turn the probes off, the recorded stats are kept
+    """
+    global enabled, _hook
+
+    enabled = False
+    _hook = None
+
+
+def current():
+    """
+    :return: Stats of the current process, with the merged stats of the
+        workers of its parallel calls
+    """
+    return _stats
+
+
+def reset():
+    _stats.clear()
+
+
+def take():
+    """
+    :return: the recorded Stats, the current process starts over with empty
+        ones, used by the workers to ship their stats
+    """
+    global _stats
+
+    taken, _stats = _stats, Stats()
+    return taken
+
+
+def count(name, n=1):
+    """
+    add to a counter, callers check enabled first
+    """
+    _stats.count(name, n)
+
+
+def timer(name):
+    """
+    :param name: timer name
+    :return: context manager timing its block when enabled
+    """
+    return _Timer(name) if enabled else _no_timer
+
+
+def worker(outputs):
+    """
+    record outputs produced by the current process
+    """
+    _stats.worker(os.getpid(), outputs)
+
+
+def report():
+    """
+    call the hook with the Stats of the current process
+    """
+    if _hook is not None:
+        _hook(_stats)
@@ -1,8 +1,10 @@
-from random import sample
-from numpy.random import binomial, randint
+from collections import defaultdict
+from nla.rng import binomial, randint, stream
+from nla import stats
 from numpy import unique, concatenate
 from nla.parallelize import *
 from functools import partial
+import numpy as np
 
 
 def split(number, nparts):
@@ -38,13 +40,14 @@ def __word_boundary__(query, count, degree=1, **kwargs):
     """
     assert 0 <= degree <= 1, "degree argument takes values between 0 and 1"
 
-    result = set()
+    # insertion ordered, so that a seeded stream gives the same sequence
+    result = {}
 
-    query, actual = "".join(sample(query.split(), len(query.split()))), query
+    query, actual = "".join(stream().sample(query.split(), len(query.split()))), query
 
     # query length
     qlen = len(query)
-    result.add((query, actual) + tuple(kwargs.values())) if len(
+    result.setdefault((query, actual) + tuple(kwargs.values())) if len(
         actual.split()
     ) > 1 else 0
 
@@ -78,7 +81,7 @@ def __word_boundary__(query, count, degree=1, **kwargs):
 
     # insert spaces at ids in idx
     [
-        result.add(
+        result.setdefault(
             (
                 "".join(
                     [
@@ -93,10 +96,105 @@ def __word_boundary__(query, count, degree=1, **kwargs):
         for ids in idx
     ]
 
+    if stats.enabled:
+        stats.count("word_boundary.candidates", count + 1)
+        stats.count("word_boundary.outputs", len(result))
+
     return list(result)
 
 
-def word_boundary(queries, count, degree, parallel=True, **kwargs):
+def __batch_word_boundary__(queries, count, degree=1, **kwargs):
+    """
+    batch counterpart of __word_boundary__, the queries are bucketed by length
+    and the spaces of a whole bucket are drawn and inserted at once
+    :param queries: sentences to augment
+    :type queries: list
+    :param count: number of output for each query
+    :type count: int
+    :param degree: degree of augmentation, takes value between 0 and 1
+    :type degree: float
+    :return:
+    """
+    assert 0 <= degree <= 1, "degree argument takes values between 0 and 1"
+
+    actuals = list(queries)
+    queries = ["".join(stream().sample(q.split(), len(q.split()))) for q in actuals]
+
+    # insertion ordered, so that a seeded stream gives the same sequence
+    results = [
+        {(query, actual) + tuple(kwargs.values()): None}
+        if len(actual.split()) > 1
+        else {}
+        for query, actual in zip(queries, actuals)
+    ]
+
+    # probability of a space for every output, dimension (count,)
+    p = concatenate(
+        [[(0.30 + (0.20 * i)) * degree] * c for i, c in enumerate(split(count, 4))]
+    )
+
+    buckets = defaultdict(list)
+    for i, query in enumerate(queries):
+        buckets[len(query)].append(i)
+
+    for qlen, rows in buckets.items():
+        n = len(rows)
+
+        # number of spaces to add for every query
+        numspace = (
+            randint(3, qlen - 1, n)
+            if qlen >= 10
+            else np.full(n, 3 if qlen in range(6, 10) else 2 if qlen > 1 else 0)
+        )
+        width = int(numspace.max())
+
+        # spaces[q, c, i] is True if a space goes after character i
+        spaces = np.zeros((n, count, qlen), dtype=bool)
+
+        if width:
+            ids = (
+                binomial(1, p[None, :, None], (n, count, width))
+                * (np.arange(width)[None, None, :] < numspace[:, None, None])
+                * randint(1, qlen, (n, count, width))
+            )
+            q, c, _ = ids.nonzero()
+            spaces[q, c, ids[ids != 0] - 1] = True
+
+        # bulk scatter the characters and the spaces in a character buffer
+        chars = (
+            np.array([queries[r] for r in rows], dtype="<U{}".format(max(qlen, 1)))
+            .view(np.uint32)
+            .reshape(n, -1)[:, :qlen]
+        )
+        shift = spaces.cumsum(axis=2)
+        pos = np.arange(qlen)[None, None, :]
+
+        buffer = np.zeros((n, count, max(2 * qlen, 1)), dtype=np.uint32)
+        np.put_along_axis(
+            buffer,
+            pos + shift - spaces,
+            np.broadcast_to(chars[:, None, :], shift.shape),
+            axis=2,
+        )
+        q, c, i = spaces.nonzero()
+        buffer[q, c, i + shift[q, c, i]] = ord(" ")
+
+        outputs = buffer.view("<U{}".format(buffer.shape[2])).reshape(n, count)
+
+        for r, row in zip(rows, outputs.tolist()):
+            results[r].update(
+                dict.fromkeys((w, actuals[r]) + tuple(kwargs.values()) for w in row)
+            )
+
+    if stats.enabled:
+        stats.count("word_boundary.outputs", sum(map(len, results)))
+
+    return [w for result in results for w in result]
+
+
+def word_boundary(
+    queries, count, degree, parallel=True, batch_size=1024, pool=None, **kwargs
+):
     """
     run augmentation on list of sentences
     :param queries: sentences to augment
@@ -107,29 +205,86 @@ def word_boundary(queries, count, degree, parallel=True, **kwargs):
     :type degree: float
     :param parallel: run in parallel
     :type parallel: bool
+    :param batch_size: number of sentences augmented at once
+    :type batch_size: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
     :param kwargs:
     :return:
     """
+    function = partial(
+        __batch_word_boundary__,
+        **kwargs,
+        degree=degree,
+        count=count,
+    )
+    batches = list(batched(queries, batch_size))
+
     if parallel:
-        function = partial(
-            __word_boundary__,
-            **kwargs,
-            degree=degree,
-            count=count,
-        )
-        return run_parallel(queries, function)
+        return run_parallel(batches, function, pool=pool, nogil=True)
 
     else:
-#         return [
-#             __word_boundary__(word, degree=degree, count=count, **kwargs)
-#             for word in queries
-#         ]
-        output = []
-        
-        for word in queries:
-            output.extend(__word_boundary__(word, degree=degree, count=count, **kwargs))
-            
-        return output
+        return list(iter_serial(batches, function))
+
+
+# lazy counterpart of word_boundary
+def iter_word_boundary(
+    queries,
+    count,
+    degree,
+    parallel=True,
+    chunksize=64,
+    ordered=True,
+    max_inflight=None,
+    pool=None,
+    backend=None,
+    **kwargs
+):
+    """
+    lazily run the augmentation on any iterable of sentences
+    :param queries: sentences to augment
+    :type queries: iterable
+    :param count: number of output for each query
+    :type count: int
+    :param degree: degree of augmentation, takes value between 0 and 1
+    :type degree: float
+    :param parallel: run in parallel
+    :type parallel: bool
+    :param chunksize: number of sentences augmented at once, as a batch
+    :type chunksize: int
+    :param ordered: yield outputs in the input order
+    :type ordered: bool
+    :param max_inflight: maximum sentences being processed at once
+    :type max_inflight: int
+    :param pool: pool to reuse instead of starting a new one
+    :type pool: WorkerPool
+    :param backend: 'auto' or one of the parallelize BACKENDS, defaults to
+        get_backend()
+    :type backend: str
+    :param kwargs:
+    :return: generator over the augmented tuples
+    """
+    function = partial(
+        __batch_word_boundary__,
+        **kwargs,
+        degree=degree,
+        count=count,
+    )
+    batches = batched(queries, chunksize)
+
+    if parallel:
+        return iter_backend(
+            batches,
+            function,
+            backend,
+            chunksize=1,
+            ordered=ordered,
+            max_inflight=max_inflight and max(max_inflight // chunksize, 1),
+            pool=pool,
+            nogil=True,
+        )
+
+    return iter_serial(batches, function)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from nla import aio
+
+
+class Blocking:
+    """
+    records its rows, row 0 holds its executor call until the gate opens
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.running = self.most = 0
+        self.lock = threading.Lock()
+        self.delay = 0
+
+    def __call__(self, row):
+        with self.lock:
+            self.rows.append(row)
+            self.running += 1
+            self.most = max(self.most, self.running)
+
+        if row == 0:
+            self.started.set()
+            self.gate.wait(5)
+        else:
+            time.sleep(self.delay)
+
+        with self.lock:
+            self.running -= 1
+        return [row]
+
+
+@pytest.fixture(autouse=True)
+def executor():
+    yield
+    aio.configure()
+    aio.shutdown()
+
+
+async def wait(event):
+    while not event.is_set():
+        await asyncio.sleep(0.001)
+
+
+def test_cancelling_drops_the_batches_not_started():
+    aio.configure(workers=1)
+    function = Blocking()
+
+    async def main():
+        async def consume():
+            return [row async for row in aio.astream(range(100), function, 1)]
+
+        task = asyncio.ensure_future(consume())
+        await wait(function.started)
+
+        # the loop keeps serving while the batch runs
+        assert await asyncio.wait_for(asyncio.sleep(0, "served"), 1) == "served"
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    function.gate.set()
+    aio.shutdown(wait=True)
+
+    assert function.rows == [0]
+
+
+def test_closing_the_generator_cancels_its_batches():
+    aio.configure(workers=1)
+    function = Blocking()
+
+    async def main():
+        stream = aio.astream(range(1, 100), function, 1, max_inflight=8)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(main()) == 1
+    aio.shutdown(wait=True)
+
+    # the outputs are yielded in order, the calls ahead are bounded
+    assert len(function.rows) <= 1 + 8
+
+
+def test_limit_bounds_the_concurrent_calls():
+    aio.configure(workers=8, limit=2)
+    function = Blocking()
+    function.delay = 0.002
+
+    async def main():
+        stream = aio.astream(range(1, 61), function, 5, max_inflight=60)
+        return [row async for row in stream]
+
+    assert asyncio.run(main()) == list(range(1, 61))
+    assert function.most == 2
+
+
+def test_afetch_keeps_the_identifiers():
+    rows = asyncio.run(
+        aio.afetch(["HELLO", "WORLD"], degree=1, count=2, source="generic1")
+    )
+
+    assert [row[1:] for row in rows] == [("HELLO", "generic1")] * 2 + [
+        ("WORLD", "generic1")
+    ] * 2
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from nla import rng
+from nla.keyboard import batch, randaug, keyaug
+from nla.keyboard.variants import variants
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    rng.seed(1)
+    yield
+    rng.seed(None)
+
+
+def scalar_support(function, word, degree, draws):
+    support = set()
+
+    for _ in range(draws):
+        output = function(word, degree)
+        if isinstance(output, tuple):
+            output = output[0]
+        # the single edits list all the variants at once
+        support.update(output if isinstance(output, list) else [output])
+
+    return support
+
+
+def batch_support(function, word, degree, draws):
+    outputs = batch.augment([word] * draws, np.full(draws, degree), [function])
+    return {w for w in outputs if w is not None}
+
+
+def test_pack_unpack_round_trip():
+    words = ["HELLO", "", "A", "KEYBOARD"]
+    codes, lengths = batch.pack(words, extra=2)
+
+    assert codes.shape == (4, 10)
+    assert lengths.tolist() == [5, 0, 1, 8]
+    assert batch.unpack(codes) == words
+
+
+@pytest.mark.parametrize(
+    "scalar, vectorized, word, degree, draws",
+    [
+        (randaug.swap, batch.batch_swap, "HELLO", 1, 500),
+        (randaug.delete, batch.batch_delete, "HELLO", 1, 500),
+        (randaug.insert, batch.batch_insert, "KEYS", 1, 3000),
+        (randaug.replace, batch.batch_replace, "KEYS", 1, 3000),
+        (randaug.swap, batch.batch_swap, "KEYBOARD", 2, 3000),
+        (randaug.delete, batch.batch_delete, "KEYBOARD", 2, 3000),
+        (randaug.insert, batch.batch_insert, "ABC", 2, 30000),
+    ],
+)
+def test_random_batch_matches_scalar(scalar, vectorized, word, degree, draws):
+    assert batch_support(vectorized, word, degree, draws) == scalar_support(
+        scalar, word, degree, draws
+    )
+
+
+@pytest.mark.parametrize(
+    "scalar, vectorized, word, degree, draws",
+    [
+        (keyaug.nn_insert, batch.batch_nn_insert, "HELLO", 1, 3000),
+        (keyaug.nn_replace, batch.batch_nn_replace, "HELLO", 1, 3000),
+        (keyaug.nn_swap, batch.batch_nn_swap, "HELLO", 1, 5000),
+        (keyaug.nn_insert, batch.batch_nn_insert, "ABC", 2, 5000),
+        (keyaug.nn_replace, batch.batch_nn_replace, "ABC", 2, 5000),
+    ],
+)
+def test_keyboard_batch_matches_scalar(scalar, vectorized, word, degree, draws):
+    assert batch_support(vectorized, word, degree, draws) == scalar_support(
+        scalar, word, degree, draws
+    )
+
+
+def test_batch_nn_fetch_keeps_identifiers_of_non_alpha_words():
+    rows = batch.batch_nn_fetch(
+        ["HELLO", "1234"], 1, 2, parallel=False, identifier="id"
+    )
+
+    assert ("1234", "1234", "id") in rows
+    assert all(len(row) == 3 and row[2] == "id" for row in rows)
+
+
+@pytest.mark.parametrize(
+    "scalar, vectorized, word",
+    [
+        (randaug.swap, batch.batch_swap, "AB"),
+        (randaug.delete, batch.batch_delete, "A"),
+    ],
+)
+def test_no_output_when_no_edit_applies(scalar, vectorized, word):
+    # a degree 2 swap needs 3 characters, a degree 2 delete 2 of them
+    assert batch_support(vectorized, word, 2, 200) == set()
+    assert len(variants(scalar.__name__, word, 2)) == 0
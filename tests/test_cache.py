@@ -0,0 +1,75 @@
+import pytest
+
+from nla import homophones
+from nla.cache import LRUCache
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_fifo_evicts_the_oldest():
+    cache = LRUCache(maxsize=2, eviction="fifo")
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert "a" not in cache and "b" in cache and "c" in cache
+
+
+def test_get_or_compute_counts_hits_and_misses():
+    cache = LRUCache()
+    calls = []
+
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [cache.get_or_compute(x, square, x) for x in [2, 3, 2, 2]] == [4, 9, 4, 4]
+    assert calls == [2, 3]
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_persistence(tmp_path):
+    path = str(tmp_path / "memo.cache")
+    cache = LRUCache(path=path)
+    for i in range(5):
+        cache.put(("g2p", str(i)), i)
+    cache.save()
+
+    assert LRUCache(path=path).data == cache.data
+    # the most recently used entries are kept when they don't fit
+    assert list(LRUCache(maxsize=2, path=path).data) == [("g2p", "3"), ("g2p", "4")]
+
+
+@pytest.fixture
+def memo():
+    previous = homophones.cache
+    yield homophones.configure_cache()
+    homophones.cache = previous
+
+
+def test_genome_is_served_from_the_memo(memo):
+    # without the models, every chunk and its spellings come from the memo
+    for chunk, beam_width in sum(homophones.chunks("CARROM", 4), []):
+        memo.put(("g2p", chunk), "P " + chunk)
+        memo.put(("p2g", "P " + chunk, beam_width), (chunk, chunk.lower(), chunk))
+
+    assert not homophones.loaded()
+    assert homophones.genome("CARROM", beamwidth=4)
+    assert memo.stats()["misses"] == 0
+
+
+def test_assemble_keeps_the_spelling_order():
+    parts = [[("A", 1), ("B", 1)], [("AB", 1)]]
+    spellings = {"A": ["X", "Y", "X"], "B": ["Z", "Z", "Z"], "AB": ["XZ", "W"]}
+
+    assert homophones.assemble(parts, lambda c, _: spellings[c]) == ["XZ", "YZ", "W"]
@@ -0,0 +1,115 @@
+import gzip
+import json
+import sys
+
+import pytest
+
+from nla import cli, rng
+
+TSV = "q1\tHELLO WORLD\tx\nq2\t1234\ty\nq3\tKEYBOARD\tz\nq4\t#!?\tw\n"
+
+
+@pytest.mark.parametrize(
+    "augmentation, degree",
+    [
+        ("fetch", "1"),
+        ("nn_fetch", "1"),
+        ("rand_sent_aug", "1"),
+        ("keyboard_sent_aug", "1"),
+        ("edge_n_gram", "3"),
+        ("word_boundary", "0.6"),
+    ],
+)
+def test_tsv_identifiers_pass_through(tmp_path, augmentation, degree):
+    source = tmp_path / "in.tsv"
+    target = tmp_path / "out.tsv"
+    source.write_text(TSV)
+
+    cli.main(
+        [augmentation, str(source), str(target), "--column", "1", "--degree", degree]
+        + ["--count", "2", "--seed", "1", "--processes", "1"]
+    )
+
+    rows = [line.split("\t") for line in target.read_text().splitlines()]
+    columns = [line.split("\t") for line in TSV.splitlines()]
+    identifiers = {text: (q, other) for q, text, other in columns}
+
+    assert rows
+    for row in rows:
+        # augmented text, original text, then the other columns unchanged
+        assert len(row) == 4
+        assert tuple(row[2:]) == identifiers[row[1]]
+
+
+def test_non_alpha_rows_keep_their_identifiers(tmp_path):
+    source = tmp_path / "in.tsv"
+    target = tmp_path / "out.tsv"
+    source.write_text(TSV)
+
+    # words without letters have no keyboard neighbours and come back as is
+    cli.main(
+        ["nn_fetch", str(source), str(target), "--column", "1", "--processes", "1"]
+    )
+    rows = target.read_text().splitlines()
+
+    assert "1234\t1234\tq2\ty" in rows
+    assert "#!?\t#!?\tq4\tw" in rows
+
+
+def test_jsonl_keep(tmp_path):
+    source = tmp_path / "in.jsonl.gz"
+    target = tmp_path / "out.jsonl"
+    with gzip.open(source, "wt") as f:
+        for i, query in enumerate(["HELLO", "KEYBOARD"]):
+            f.write(json.dumps({"id": i, "query": query, "lang": "en"}) + "\n")
+
+    cli.main(
+        ["nn_fetch", str(source), str(target), "--field", "query"]
+        + ["--keep", "id,lang", "--processes", "1"]
+    )
+
+    records = [json.loads(line) for line in target.read_text().splitlines()]
+
+    assert [r["original"] for r in records] == ["HELLO", "KEYBOARD"]
+    assert all(set(r) == {"augmented", "original", "id", "lang"} for r in records)
+    assert [(r["id"], r["lang"]) for r in records] == [(0, "en"), (1, "en")]
+
+
+def test_stdout_stays_open(tmp_path, capsys):
+    source = tmp_path / "in.txt"
+    source.write_text("HELLO\n")
+
+    cli.main(["edge_n_gram", str(source), "-", "--degree", "3", "--processes", "1"])
+
+    assert not sys.stdout.closed
+    assert capsys.readouterr().out.splitlines()[0].split("\t")[1] == "HELLO"
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--backend", "thread"],
+        ["--backend", "process", "--processes", "2"],
+        ["--backend", "auto"],
+        ["--processes", "1"],
+    ],
+)
+def test_seeded_backends_match_serial(tmp_path, options):
+    source = tmp_path / "in.txt"
+    source.write_text("".join(w + "\n" for w in ["HELLO", "KEYBOARD", "WORLD"] * 50))
+
+    def outputs(name, options):
+        target = tmp_path / name
+        cli.main(
+            ["nn_fetch", str(source), str(target), "--degree", "2", "--count", "2"]
+            + ["--seed", "3", "--chunksize", "16"]
+            + options
+        )
+        return target.read_text()
+
+    try:
+        assert outputs("out.txt", options) == outputs(
+            "serial.txt", ["--backend", "serial"]
+        )
+    finally:
+        rng.seed(None)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from nla.columnar import augment_columns, factorize
+from nla.pipeline import Stage
+
+TEXTS = ["DEEP NEURAL", "CRAVING MANIFEST", "APPLE PIE"]
+
+
+@pytest.fixture
+def columns():
+    return augment_columns(
+        Stage("edge_n_gram", count=2, degree=2),
+        TEXTS,
+        parallel=False,
+        category=["a", None, float("nan")],
+        source="generic1",
+    )
+
+
+def test_factorize_codes_missing_values():
+    values = np.empty(6, dtype=object)
+    values[:] = ["b", None, 1, "b", float("nan"), 1]
+
+    codes, uniques = factorize(values)
+
+    assert codes.tolist() == [0, -1, 1, 0, -1, 1]
+    assert uniques.tolist() == ["b", 1]
+
+
+def test_rows_repeat_the_identifiers(columns):
+    rows = list(columns.rows())
+
+    assert len(rows) == len(columns) == 6
+    for (augmented, original, category, source), i in zip(rows, columns.index):
+        assert original == TEXTS[i]
+        assert source == "generic1"
+        assert category == "a" if i == 0 else category is None or category != category
+
+
+def test_to_pandas_with_missing_identifiers(columns):
+    pd = pytest.importorskip("pandas")
+    frame = columns.to_pandas()
+
+    assert frame["original"].tolist() == [TEXTS[i] for i in columns.index]
+    assert list(frame["category"].cat.categories) == ["a"]
+    assert frame["category"].isna().tolist() == [i != 0 for i in columns.index]
+    assert (frame["source"] == "generic1").all()
+
+
+def test_to_arrow_with_missing_identifiers(columns):
+    pytest.importorskip("pyarrow")
+    table = columns.to_arrow()
+
+    assert table.column("original").to_pylist() == [TEXTS[i] for i in columns.index]
+    assert table.column("category").to_pylist() == [
+        "a" if i == 0 else None for i in columns.index
+    ]
+    assert table.column("category").null_count == 4
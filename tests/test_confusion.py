@@ -0,0 +1,155 @@
+import collections
+
+import numpy as np
+import pytest
+
+from nla import rng
+from nla.keyboard import keyaug, variants
+from nla.keyboard.confusion import (
+    alias_table,
+    compile_confusion,
+    draw,
+    fit,
+    open_confusion,
+    parse,
+    rows,
+    sample,
+    save,
+    to_dict,
+)
+
+MATRIX = {"A": {"S": 6.0, "Q": 3.0, "Z": 1.0}, "E": {"W": 1.0, "R": 1.0, "D": 2.0}}
+
+
+@pytest.fixture
+def model(tmp_path):
+    path = tmp_path / "confusion.bin"
+    save(path, *compile_confusion(MATRIX))
+    yield str(path)
+    keyaug.use_confusion(None)
+
+
+def normalized(matrix):
+    return {
+        c: {t: w / sum(row.values()) for t, w in row.items()}
+        for c, row in matrix.items()
+    }
+
+
+def test_alias_table_keeps_the_weights():
+    weights = [5, 1, 0.5, 3.5, 2]
+    prob, alias = alias_table(weights)
+    n = len(weights)
+
+    mass = [p / n for p in prob]
+    for p, a in zip(prob, alias):
+        mass[a] += (1 - p) / n
+
+    assert mass == pytest.approx([w / sum(weights) for w in weights])
+
+
+def test_round_trip(model):
+    restored = to_dict(*open_confusion(model))
+    expected = normalized(MATRIX)
+
+    assert restored.keys() == expected.keys()
+    for c, row in expected.items():
+        assert restored[c] == pytest.approx(row)
+
+
+def test_draws_follow_the_weights(model):
+    # evenly spread uniforms hit every candidate in proportion to its weight
+    uniforms = (np.arange(10000) + 0.5) / 10000
+    row = rows(*open_confusion(model))["A"]
+
+    counts = collections.Counter(draw(row, u) for u in uniforms)
+
+    assert {t: n / 10000 for t, n in counts.items()} == pytest.approx(
+        normalized(MATRIX)["A"], abs=1e-3
+    )
+
+
+def test_vectorized_draws_match_scalar_draws(model):
+    tables = open_confusion(model)
+    table = rows(*tables)
+
+    chars = np.array([ord(c) for c in "AEAEXA~"] * 50)
+    uniforms = np.random.default_rng(0).random(len(chars))
+
+    drawn, has = sample(*tables, chars, uniforms)
+
+    for c, u, d, h in zip(chars, uniforms, drawn, has):
+        assert h == (chr(c) in table)
+        assert chr(d) == (draw(table[chr(c)], u) if h else chr(c))
+
+
+def test_use_confusion(model):
+    keyaug.use_confusion(model)
+    assert {keyaug.neighbour("E") for _ in range(200)} <= {"W", "R", "D"}
+    # characters missing from the model keep their keyboard neighbours
+    assert keyaug.neighbour("H") in keyaug.load()["H"]
+
+    keyaug.use_confusion(None)
+    assert {keyaug.neighbour("E") for _ in range(200)} == set(keyaug.load()["E"])
+
+
+def test_parse():
+    matrix = parse(["# intended typed weight", "A S 2", "A S 1", "space B 4", ""])
+
+    assert matrix == {"A": {"S": 3.0}, " ": {"B": 4.0}}
+
+
+def test_fit_counts_substitutions_and_insertions():
+    pairs = [("HRLLO", "HELLO", 2.0), ("HELLLO", "HELLO", 1.0), ("HELLO", "HELLO", 5)]
+
+    assert fit(pairs) == {"E": {"R": 2.0}, "O": {"L": 1.0}}
+    assert fit(pairs, {"E": ["W", "R"]}, prior=0.5) == {
+        "E": {"R": 2.5, "W": 0.5},
+        "O": {"L": 1.0},
+    }
+
+
+def test_nn_fetch_draws_by_weight(tmp_path):
+    path = tmp_path / "skewed.bin"
+    save(path, *compile_confusion({"E": {"W": 1000.0, "R": 1.0}}))
+
+    def typed(rows):
+        # the character typed for E by the variants replacing it
+        return collections.Counter(w[1] for w, _ in rows if w[1] != "E")
+
+    rng.seed(1)
+    uniform = typed(
+        row
+        for _ in range(300)
+        for row in keyaug.__nn_fetch__("HELLO", 1, 1, method="replace")
+    )
+
+    keyaug.use_confusion(str(path))
+    try:
+        weighted = typed(
+            row
+            for _ in range(300)
+            for row in keyaug.__nn_fetch__("HELLO", 1, 1, method="replace")
+        )
+        every = keyaug.__nn_fetch__("HELLO", 1, None, method="replace")
+    finally:
+        keyaug.use_confusion(None)
+        rng.seed(None)
+
+    assert len(uniform) > 2
+    assert uniform["W"] < 0.5 * sum(uniform.values())
+    assert set(weighted) <= {"W", "R"}
+    assert weighted["W"] > 0.95 * sum(weighted.values())
+    # the model's candidates replace the keyboard neighbours of E
+    assert {w[1] for w, _ in every if w[1] != "E"} == {"W", "R"}
+
+
+def test_weighted_draws_stay_distinct(model):
+    keyaug.use_confusion(model)
+
+    for degree in [1, 2]:
+        space = variants.variants("nn_swap", "AEAE", degree)
+        drawn = list(space.iterate(rng.stream()))
+
+        assert len(drawn) == len(space)
+        assert sorted(drawn) == sorted(space[i] for i in range(len(space)))
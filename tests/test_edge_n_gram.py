@@ -0,0 +1,69 @@
+import collections
+import time
+from itertools import product
+
+import pytest
+
+from nla import rng
+from nla.edge_n_gram import __edge_n_gram__, combination
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    rng.seed(1)
+    yield
+    rng.seed(None)
+
+
+def truncations(query, degree):
+    # every combination of the truncated words, in the order of product
+    rows = __edge_n_gram__(query, count=10**9, degree=degree)
+    return [row[0] for row in rows]
+
+
+@pytest.mark.parametrize(
+    "y", [[["A", "B"], ["C"], ["D", "E", "F"]], [["A"]], [["A", "B", "C"], ["D", "E"]]]
+)
+def test_combination_indexes_the_product(y):
+    expected = list(product(*y))
+
+    assert [tuple(combination(y, i)) for i in range(len(expected))] == expected
+
+
+def test_sampled_outputs_are_distinct_truncations():
+    query = "DEEP NEURAL CRAVING"
+    every = truncations(query, 3)
+
+    assert len(every) == len(set(every)) == 2 * 3 * 3
+    for count in [1, 5, 17]:
+        rows = __edge_n_gram__(query, count=count, degree=3, source="generic1")
+        outputs = [row[0] for row in rows]
+
+        assert len(outputs) == len(set(outputs)) == count
+        assert set(outputs) <= set(every)
+        assert all(row[1:] == (query, "generic1") for row in rows)
+
+
+def test_samples_are_uniform_over_the_product():
+    query = "NEURAL CRAVING"
+    every = truncations(query, 3)
+    draws = 9000
+
+    counts = collections.Counter(
+        __edge_n_gram__(query, count=1, degree=3)[0][0] for _ in range(draws)
+    )
+
+    assert set(counts) == set(every)
+    for n in counts.values():
+        assert n == pytest.approx(draws / len(every), rel=0.15)
+
+
+def test_large_products_are_never_materialized():
+    # 4**12 combinations, the outputs are decoded from their indices
+    query = " ".join(["PARACETAMOL"] * 6 + ["IBUPROFENS"] * 6)
+
+    start = time.perf_counter()
+    rows = __edge_n_gram__(query, count=3, degree=4)
+
+    assert time.perf_counter() - start < 1
+    assert len({row[0] for row in rows}) == 3
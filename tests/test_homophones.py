@@ -0,0 +1,123 @@
+import subprocess
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+from nla import homophones
+
+ROOT = Path(__file__).resolve().parents[1]
+
+QUERIES = ["CARROM", "POWDER", "PARACETAMOL", "CARROM"]
+
+
+@pytest.fixture
+def memo():
+    previous = homophones.cache
+    yield homophones.configure_cache()
+    homophones.cache = previous
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """
+    stub batched models, the phonemes of a chunk are its letters and its
+    spellings are variants of its case, the batches are recorded
+    """
+    batches = {"g2p": [], "p2g": []}
+
+    def infer_batch(model, texts):
+        batches["g2p"].append(list(texts))
+        return [" ".join(text) for text in texts]
+
+    def beamsearch_batch(model, texts, beam_width):
+        batches["p2g"].append((list(texts), beam_width))
+        return [
+            [text.replace(" ", ""), text.replace(" ", "").lower()][:beam_width]
+            for text in texts
+        ]
+
+    monkeypatch.setattr(homophones, "load", lambda: (None, None))
+    monkeypatch.setattr(homophones, "infer_batch", infer_batch)
+    monkeypatch.setattr(homophones, "beamsearch_batch", beamsearch_batch)
+    return batches
+
+
+def test_genome_many_batches_the_distinct_chunks(memo, models):
+    results = homophones.genome_many(QUERIES, beamwidth=6, batch_size=4)
+
+    chunks = {
+        pair
+        for query in QUERIES
+        for part in homophones.chunks(query, 6)
+        for pair in part
+    }
+    g2p = [chunk for batch in models["g2p"] for chunk in batch]
+    p2g = [(p, b) for batch, b in models["p2g"] for p in batch]
+
+    # every distinct chunk runs once, in batches of at most batch_size
+    assert sorted(g2p) == sorted({chunk for chunk, _ in chunks})
+    assert sorted(p2g) == sorted({(" ".join(c), b) for c, b in chunks})
+    assert max(len(batch) for batch in models["g2p"]) <= 4
+    assert max(len(batch) for batch, _ in models["p2g"]) <= 4
+
+    # the memo now serves genome the same homophones
+    assert results == [homophones.genome(query, beamwidth=6) for query in QUERIES]
+    assert results[0] == results[3]
+
+
+def test_genome_many_is_served_from_the_memo(memo, models):
+    homophones.genome_many(QUERIES[:2], beamwidth=6)
+    ran = sum(len(batch) for batch in models["g2p"])
+
+    results = homophones.genome_many(QUERIES[:2] * 3, beamwidth=6)
+
+    assert sum(len(batch) for batch in models["g2p"]) == ran
+    assert results == results[:2] * 3
+
+
+# records the heavy modules an import tries to load, installed or not
+IMPORTS = """
+import sys
+
+class Finder:
+    tried = []
+
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in ("transly", "tensorflow", "keras"):
+            self.tried.append(name)
+
+sys.meta_path.insert(0, Finder())
+import nla, nla.homophones, nla.pipeline, nla.server
+print(Finder.tried, nla.homophones.loaded())
+"""
+
+
+def test_import_does_not_load_the_models():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORTS],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT,
+    ).stdout
+
+    assert output.split() == ["[]", "False"]
+
+
+def test_models_are_loaded_once(monkeypatch):
+    loads = []
+    module = types.ModuleType("transly.pronunciation")
+    module.load_model = lambda *args, **kwargs: loads.append(args) or object()
+
+    monkeypatch.setitem(sys.modules, "transly", types.ModuleType("transly"))
+    monkeypatch.setitem(sys.modules, "transly.pronunciation", module)
+    monkeypatch.setattr(homophones, "pronunciation", None)
+    monkeypatch.setattr(homophones, "wordgen", None)
+
+    assert not homophones.loaded()
+    first = homophones.load()
+    assert homophones.loaded()
+    assert homophones.load() == first
+    assert len(loads) == 2
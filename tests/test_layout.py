@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from nla.keyboard import keyaug
+from nla.keyboard.layout import (
+    build,
+    compile_layout,
+    dump,
+    open_layout,
+    parse,
+    save,
+    to_dict,
+)
+
+KEYBOARD = Path(keyaug.path).with_suffix(".txt")
+
+
+@pytest.fixture
+def default_layout():
+    # tests switching the layout restore the shipped one
+    yield
+    keyaug.use_layout(str(Path(keyaug.path2script).parent / "keyboard.bin"))
+
+
+def test_round_trip(tmp_path):
+    neighbours = {"A": ["Q", "S"], "B": ["V", "N", " "], " ": ["B"]}
+    path = tmp_path / "layout.bin"
+
+    save(path, *compile_layout(neighbours))
+
+    assert to_dict(*open_layout(path)) == neighbours
+
+
+def test_dump_parses_back(tmp_path):
+    path = tmp_path / "layout.bin"
+    build(KEYBOARD, path)
+
+    assert parse(dump(path).splitlines()) == parse(KEYBOARD.read_text().splitlines())
+
+
+def test_shipped_layout_is_compiled_from_its_description(tmp_path):
+    path = tmp_path / "layout.bin"
+    build(KEYBOARD, path)
+
+    assert path.read_bytes() == Path(keyaug.path).read_bytes()
+
+
+def test_nn_sample_draws_neighbours():
+    neighbours = keyaug.load()
+    chars = np.array([ord(c) for c in "HELLO" * 100] + [ord("~")])
+
+    sampled = [chr(c) for c in keyaug.nn_sample(chars)]
+
+    assert all(s in neighbours[c] for s, c in zip(sampled, "HELLO" * 100))
+    assert sampled[-1] == "~"
+
+
+def test_use_layout_drops_the_cached_layout(tmp_path, default_layout):
+    path = tmp_path / "layout.bin"
+    save(path, *compile_layout({"A": ["Z"]}))
+
+    keyaug.load()
+    keyaug.use_layout(str(path))
+
+    assert keyaug.load() == {"A": ["Z"]}
+    assert keyaug.neighbour("A") == "Z"
+
+
+def test_use_layout_drops_the_cached_variants(tmp_path, default_layout):
+    path = tmp_path / "layout.bin"
+    save(path, *compile_layout({"Q": ["Z"]}))
+
+    keyaug.__nn_fetch__("QQQ", 1, None, method="replace")
+    keyaug.use_layout(str(path))
+    rows = keyaug.__nn_fetch__("QQQ", 1, None, method="replace")
+
+    assert {w for w, _ in rows} == {"ZQQ", "QZQ"}
@@ -0,0 +1,80 @@
+import collections
+
+import pytest
+
+from nla import rng
+from nla.keyboard import keyaug, nlaug
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    rng.seed(1)
+    yield
+    rng.seed(None)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    counts the augmentations of every word
+    """
+    calls = collections.Counter()
+
+    def replace(word, degree, position="random"):
+        calls[word] += 1
+        return keyaug.nn_replace(word, degree, position)
+
+    functions = dict(nlaug.NN_FUNCTIONS, replace=replace)
+    monkeypatch.setattr(nlaug, "NN_FUNCTIONS", functions)
+    return calls
+
+
+def test_pools_are_drawn_once_per_token(calls):
+    sentences = ["TABLET 500MG SYRUP", "SYRUP TABLET", "TABLET"] * 300
+    rows = nlaug.__vocab_keyboard_sent_aug__(
+        sentences, 1, 2, method="replace", pool_size=8, source="generic1"
+    )
+
+    # the work grows with the vocabulary, not with the tokens
+    assert calls == {"TABLET": 8, "SYRUP": 8}
+
+    assert len(rows) == 2 * len(sentences)
+    for (augmented, original, source), sentence in zip(
+        rows, [s for s in sentences for _ in range(2)]
+    ):
+        assert original == sentence and source == "generic1"
+        words = augmented.split()
+        assert len(words) == len(sentence.split())
+        # non alphabetic tokens are kept as they are
+        assert ("500MG" in words) == ("500MG" in sentence)
+
+
+def test_small_batches_draw_every_use(calls):
+    sentences = ["TABLET SYRUP", "TABLET"]
+    rows = nlaug.__vocab_keyboard_sent_aug__(sentences, 1, 3, method="replace")
+
+    assert calls == {"TABLET": 6, "SYRUP": 3}
+    assert len(rows) == 6
+
+
+def test_pool_variants_are_keyboard_variants():
+    sentences = ["TABLET"] * 100
+    rows = nlaug.__vocab_keyboard_sent_aug__(
+        sentences, 1, 1, method="replace", pool_size=4
+    )
+    every = {w for w, _ in keyaug.__nn_fetch__("TABLET", 1, None, method="replace")}
+
+    outputs = {row[0] for row in rows}
+    assert 1 <= len(outputs) <= 4
+    assert outputs <= every
+
+
+def test_batches_share_their_pools(calls):
+    sentences = ["TABLET SYRUP"] * 100
+    rows = nlaug.vocab_keyboard_sent_aug(
+        sentences, 1, 1, method="replace", parallel=False, batch_size=25, pool_size=8
+    )
+
+    # a pool per token and batch
+    assert calls == {"TABLET": 4 * 8, "SYRUP": 4 * 8}
+    assert len(rows) == 100
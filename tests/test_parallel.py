@@ -0,0 +1,92 @@
+import types
+from itertools import count, islice
+
+import pytest
+
+from nla.edge_n_gram import iter_edge_n_gram
+from nla.keyboard.keyaug import iter_nn_fetch
+from nla.keyboard.nlaug import iter_keyboard_sent_aug, iter_rand_sent_aug
+from nla.keyboard.randaug import iter_fetch
+from nla.parallelize import batched, iter_parallel
+from nla.word_boundary import iter_word_boundary
+
+
+def double(row):
+    return [row, 2 * row]
+
+
+class Source:
+    """
+    endless rows, counting how many were consumed
+    """
+
+    def __init__(self):
+        self.consumed = 0
+
+    def __iter__(self):
+        for i in count():
+            self.consumed += 1
+            yield i
+
+
+def test_batched():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_iter_parallel_streams_an_endless_iterable(ordered):
+    source = Source()
+    outputs = iter_parallel(
+        source, double, chunksize=4, ordered=ordered, max_inflight=16, processes=2
+    )
+
+    first = list(islice(outputs, 40))
+    outputs.close()
+
+    pairs = list(zip(first[::2], first[1::2]))
+    assert all(b == 2 * a for a, b in pairs)
+    assert len({a for a, _ in pairs}) == 20
+    if ordered:
+        assert [a for a, _ in pairs] == list(range(20))
+
+    # the rows handed to the pool are bounded by max_inflight
+    assert source.consumed <= 20 + 16 + 1
+
+
+def test_iter_parallel_without_bound_yields_every_output():
+    assert sorted(iter_parallel(range(100), double, chunksize=7, ordered=False)) == (
+        sorted(v for i in range(100) for v in (i, 2 * i))
+    )
+
+
+@pytest.mark.parametrize(
+    "iterate, words, kwargs",
+    [
+        (iter_fetch, ["HELLO", "WORLD"], {"degree": 1, "count": 2}),
+        (iter_nn_fetch, ["HELLO", "WORLD"], {"degree": 1, "count": 2}),
+        (iter_edge_n_gram, ["DEEP NEURAL", "APPLE PIE"], {"degree": 2, "count": 2}),
+        (iter_word_boundary, ["DEEP NEURAL", "APPLE PIE"], {"degree": 0.5, "count": 2}),
+        (iter_rand_sent_aug, ["DEEP NEURAL", "APPLE"], {"degree": 1, "count": 2}),
+        (iter_keyboard_sent_aug, ["DEEP NEURAL", "APPLE"], {"degree": 1, "count": 2}),
+    ],
+)
+def test_iter_entry_points_are_lazy(iterate, words, kwargs):
+    consumed = []
+
+    def source():
+        for word in words * 1000:
+            consumed.append(word)
+            yield word
+
+    outputs = iterate(
+        source(), parallel=False, chunksize=8, dummy_identifier_1="generic1", **kwargs
+    )
+
+    assert isinstance(outputs, types.GeneratorType)
+    assert consumed == []
+
+    # a row, or a batch of chunksize rows, is read at a time
+    row = next(outputs)
+    assert 1 <= len(consumed) <= 8
+    assert row[1] == words[0] and row[-1] == "generic1"
@@ -0,0 +1,49 @@
+import pytest
+
+from nla import rng
+from nla.keyboard import randaug
+from nla.pipeline import Pipeline, Stage
+
+TEXTS = ["DEEP NEURAL", "CRAVING MANIFEST", "HELLO WORLD", "APPLE PIE"] * 20
+
+
+@pytest.fixture
+def seeded():
+    rng.seed(7)
+    yield
+    rng.seed(None)
+
+
+def build():
+    return Pipeline(
+        [
+            Stage("keyboard_sent_aug", count=2, degree=1),
+            {"stage": "word_boundary", "count": 2, "degree": 0.6},
+        ]
+    )
+
+
+def test_stage_checks_the_arguments_once(monkeypatch):
+    with pytest.raises(AssertionError):
+        Stage("fetch", degree=1, method="shuffle")
+    with pytest.raises(AssertionError):
+        Stage("fetch", degree=1, size=3)
+
+    stage = Stage("fetch", count=2, degree=1, method="swap")
+    calls = []
+    monkeypatch.setattr(randaug, "check_method", lambda *args: calls.append(args))
+
+    for text in TEXTS:
+        assert len(stage.augment(text)) == 2
+    assert calls == []
+
+
+@pytest.mark.parametrize("backend", ["serial", "thread", "process", "auto"])
+def test_backends_match_serial(seeded, backend):
+    expected = list(build().run(TEXTS, parallel=False, source="generic1"))
+
+    rng.seed(7)
+    rows = list(build().run(TEXTS, backend=backend, chunksize=8, source="generic1"))
+
+    assert rows == expected
+    assert {row[2] for row in rows} == {"generic1"}
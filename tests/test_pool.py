@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from nla.keyboard.randaug import fetch
+from nla.parallelize import (
+    WorkerPool,
+    get_default_pool,
+    iter_parallel,
+    preload,
+    run_parallel,
+    set_default_pool,
+)
+
+
+def pid(row):
+    return [os.getpid()]
+
+
+def test_pool_is_reused_across_calls():
+    with WorkerPool(processes=2) as pool:
+        first = set(iter_parallel(range(50), pid, pool=pool))
+        second = set(run_parallel(list(range(50)), pid, pool=pool, backend="process"))
+        third = set(iter_parallel(range(50), pid, ordered=False, pool=pool))
+        rows = fetch(["HELLO", "WORLD"], degree=1, count=2, pool=pool)
+
+        # a new pool per call would bring new workers
+        assert len(first | second | third) <= 2
+        assert os.getpid() not in first | second | third
+        assert len(rows) == 4
+
+    assert pool.pool is None
+
+
+def test_default_pool():
+    pool = WorkerPool(processes=2).start()
+    previous = set_default_pool(pool)
+
+    try:
+        assert get_default_pool() is pool
+        workers = set(iter_parallel(range(50), pid))
+        workers |= set(iter_parallel(range(50), pid, chunksize=4))
+        assert len(workers) <= 2 and os.getpid() not in workers
+
+        # closing the default pool uninstalls it
+        pool.close()
+        assert get_default_pool() is None
+    finally:
+        pool.close()
+        set_default_pool(previous)
+
+
+def test_pool_is_terminated_on_error():
+    with pytest.raises(KeyError):
+        with WorkerPool(processes=1) as pool:
+            raise KeyError("worker")
+
+    assert pool.pool is None
+
+
+def keyboard_loaded(row):
+    from nla.keyboard import keyaug
+
+    return [keyaug.nnkey is not None and keyaug.nntable is not None]
+
+
+def test_preload_loads_the_assets():
+    from nla.keyboard import keyaug
+
+    keyaug.nnkey = keyaug.nntable = None
+    preload(["nla.keyboard.keyaug"])
+
+    assert keyaug.nnkey is not None and keyaug.nntable is not None
+
+
+@pytest.mark.parametrize("context", ["fork", "forkserver", "spawn"])
+def test_workers_start_with_the_preloaded_assets(context):
+    with WorkerPool(
+        processes=2, preload=["nla.keyboard.keyaug"], context=context
+    ) as pool:
+        # the first task of every worker finds the assets loaded
+        assert all(iter_parallel(range(4), keyboard_loaded, pool=pool))
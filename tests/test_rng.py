@@ -0,0 +1,114 @@
+from functools import partial
+
+import pytest
+
+from nla import rng
+from nla.keyboard.keyaug import __nn_fetch__
+from nla.keyboard.randaug import __fetch__
+from nla.parallelize import iter_backend, iter_parallel, iter_serial, iter_threads
+
+WORDS = ["HELLO", "KEYBOARD", "AUGMENTATION", "WORLD", "QUERY", "TYPO"] * 50
+
+
+@pytest.fixture(autouse=True)
+def unseeded():
+    yield
+    rng.seed(None)
+
+
+def run(function, seed, iterate=iter_parallel, **kwargs):
+    rng.seed(seed)
+    return list(iterate(WORDS, function, **kwargs))
+
+
+@pytest.mark.parametrize("fetch", [__fetch__, __nn_fetch__])
+def test_seeded_outputs_do_not_depend_on_the_workers(fetch):
+    function = partial(fetch, degree=2, count=2)
+
+    serial = run(function, 7, iter_serial)
+    processes = run(function, 7, chunksize=8, processes=1)
+    parallel = run(function, 7, chunksize=100, processes=3, max_inflight=16)
+    unordered = run(function, 7, chunksize=8, processes=3, ordered=False)
+    threads = run(function, 7, iter_threads, chunksize=3, threads=4)
+    unordered_threads = run(function, 7, iter_threads, ordered=False, threads=4)
+
+    assert serial == processes == parallel == threads
+    assert sorted(serial) == sorted(unordered) == sorted(unordered_threads)
+
+
+def test_seeded_calls_differ():
+    function = partial(__fetch__, degree=2, count=2)
+
+    rng.seed(7)
+    first = list(iter_parallel(WORDS, function, chunksize=8, processes=2))
+    second = list(iter_serial(WORDS, function))
+
+    assert first != second
+    assert run(function, 7, chunksize=8, processes=2) == first
+    assert run(function, 8, chunksize=8, processes=2) != first
+
+
+def test_seeded_serial_run_keeps_the_process_stream():
+    function = partial(__fetch__, degree=2, count=2)
+
+    rng.seed(3)
+    expected = [rng.stream().random() for _ in range(10)]
+
+    rng.seed(3)
+    list(iter_serial(WORDS, function))
+
+    assert [rng.stream().random() for _ in range(10)] == expected
+
+
+def test_seed_resets_the_stream():
+    rng.seed(3)
+    first = [rng.stream().random() for _ in range(10)]
+    rng.seed(3)
+
+    assert [rng.stream().random() for _ in range(10)] == first
+    assert rng.seeded()
+
+    rng.seed(None)
+    assert not rng.seeded()
+    assert rng.task_seeds() is None
+
+
+def test_task_seeds():
+    seeds = rng.TaskSeeds(42, 1)
+
+    assert seeds(0).generate_state(4).tolist() == seeds(0).generate_state(4).tolist()
+    assert seeds(0).generate_state(4).tolist() != seeds(1).generate_state(4).tolist()
+    assert (
+        seeds(0).generate_state(4).tolist()
+        != rng.TaskSeeds(42, 2)(0).generate_state(4).tolist()
+    )
+
+
+@pytest.mark.parametrize("chunksize", [None, 10])
+def test_seeded_auto_matches_the_other_backends(chunksize):
+    function = partial(__fetch__, degree=2, count=2)
+
+    auto = run(function, 7, iter_backend, backend="auto", chunksize=chunksize)
+
+    assert auto == run(function, 7, iter_serial)
+
+
+def test_first_block_is_small():
+    buffer = rng.RandomBuffer(0)
+    buffer.random()
+
+    assert buffer.size == 2 * rng.FIRST_BLOCK
+    assert [buffer.random() for _ in range(200)] == (
+        rng.RandomBuffer(0).generator.random(201)[1:].tolist()
+    )
+
+
+def test_explicit_seeds():
+    function = partial(__fetch__, degree=2, count=2)
+    seeds = rng.TaskSeeds(42, 0, 1)
+
+    first = list(iter_serial(WORDS, function, seeds=seeds))
+
+    assert not rng.seeded()
+    assert list(iter_serial(WORDS, function, seeds=seeds)) == first
+    assert list(iter_serial(WORDS, function, seeds=rng.TaskSeeds(42, 0, 2))) != first
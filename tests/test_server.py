@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from nla.server import Client, GenomeServer, MicroBatcher, SocketServer
+
+
+class Recorder:
+    """
+    batch function upper-casing its requests, the batches are recorded and a
+    request named 'block' holds its batch until the gate opens
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self, requests):
+        self.batches.append(list(requests))
+        if "block" in requests:
+            self.started.set()
+            self.gate.wait(5)
+        return [request.upper() for request in requests]
+
+
+def test_batches_stay_under_max_batch():
+    function = Recorder()
+
+    with MicroBatcher(function, max_batch=8, max_wait=0.05) as batcher:
+        futures = [batcher.submit("w{}".format(i)) for i in range(50)]
+        results = [future.result(5) for future in futures]
+
+    assert results == ["W{}".format(i) for i in range(50)]
+    assert max(len(batch) for batch in function.batches) <= 8
+    assert sum(len(batch) for batch in function.batches) == 50
+    assert batcher.latency()["requests"] == 50
+
+
+def test_exceptions_reach_every_future():
+    def fail(requests):
+        raise KeyError("model")
+
+    with MicroBatcher(fail, max_batch=16, max_wait=0.05) as batcher:
+        futures = [batcher.submit(i) for i in range(5)]
+
+        for future in futures:
+            with pytest.raises(KeyError):
+                future.result(5)
+
+    # a result missing from the batch fails its requests instead of hanging
+    with MicroBatcher(lambda requests: requests[:-1], max_wait=0.05) as batcher:
+        futures = [batcher.submit(i) for i in range(3)]
+
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result(5)
+
+
+def test_cancelled_requests_are_dropped():
+    function = Recorder()
+    batcher = MicroBatcher(function, max_batch=4, max_wait=0)
+
+    try:
+        first = batcher.submit("block")
+        assert function.started.wait(5)
+
+        cancelled = batcher.submit("cancelled")
+        kept = batcher.submit("kept")
+        assert cancelled.cancel()
+
+        function.gate.set()
+        assert first.result(5) == "BLOCK"
+        assert kept.result(5) == "KEPT"
+    finally:
+        function.gate.set()
+        batcher.close()
+
+    assert "cancelled" not in [r for batch in function.batches for r in batch]
+
+
+def test_close_runs_the_queued_requests():
+    function = Recorder()
+    batcher = MicroBatcher(function, max_batch=2, max_wait=0)
+
+    first = batcher.submit("block")
+    assert function.started.wait(5)
+    queued = [batcher.submit("w{}".format(i)) for i in range(5)]
+
+    function.gate.set()
+    batcher.close()
+
+    assert first.done() and all(future.done() for future in queued)
+    assert [future.result() for future in queued] == ["W{}".format(i) for i in range(5)]
+    assert batcher.thread is None
+
+
+def test_socket_round_trip(tmp_path):
+    genome = GenomeServer(max_batch=8, max_wait=0.01)
+    # stub batch function, the homophones of a word are its lowercase
+    genome.function = lambda requests: [[q.lower()] * b for q, b in requests]
+
+    path = str(tmp_path / "nla.sock")
+    server = SocketServer(path, genome)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        with Client(path) as client:
+            assert client.genome("CARROM", beamwidth=2) == ["carrom", "carrom"]
+            assert client.latency()["requests"] == 1
+
+            with pytest.raises(RuntimeError, match="KeyError"):
+                client.request({"beamwidth": 3})
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(5)
@@ -0,0 +1,78 @@
+import os
+import sys
+import random
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from nla.shard import ranges, lines, shard_path, merge
+
+ROOT = Path(__file__).resolve().parents[1]
+
+WORDS = ["HELLO", "WORLD", "KEYBOARD", "DEEP", "NEURAL", "CRAVING", "APPLE", "PIE"]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    rs = random.Random(1)
+    path = tmp_path / "corpus.tsv"
+
+    with open(path, "w") as f:
+        for i in range(600):
+            words = [rs.choice(WORDS) for _ in range(rs.randint(1, 4))]
+            f.write("{}\tid{}\n".format(" ".join(words), i))
+
+    return path
+
+
+def run_shards(corpus, output, augmentation, degree, hashseed, processes):
+    env = dict(os.environ, PYTHONHASHSEED=str(hashseed), PYTHONPATH=str(ROOT))
+    subprocess.run(
+        [sys.executable, "-m", "nla.shard", "run", augmentation, str(corpus)]
+        + [str(output), "--shards", "3", "--seed", "7", "--count", "3"]
+        + ["--degree", degree, "--processes", str(processes)],
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+    return [Path(shard_path(str(output), s, 3)).read_bytes() for s in range(3)]
+
+
+@pytest.mark.parametrize(
+    "augmentation, degree",
+    [
+        ("fetch", "2"),
+        ("nn_fetch", "2"),
+        ("keyboard_sent_aug", "1"),
+        ("word_boundary", "0.6"),
+    ],
+)
+def test_seeded_shards_identical_across_hash_seeds(
+    tmp_path, corpus, augmentation, degree
+):
+    first = run_shards(corpus, tmp_path / "a.tsv", augmentation, degree, 1, 1)
+    second = run_shards(corpus, tmp_path / "b.tsv", augmentation, degree, 2, 2)
+
+    assert all(first)
+    assert first == second
+
+
+def test_ranges_cover_the_lines(corpus):
+    expected = corpus.read_text().splitlines(keepends=True)
+    bounds = ranges(str(corpus), 7)
+
+    assert bounds[0][0] == 0 and bounds[-1][1] == os.path.getsize(corpus)
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+    assert [l for s, e in bounds for l in lines(str(corpus), s, e)] == expected
+
+
+def test_merge_concatenates_in_shard_order(tmp_path):
+    output = str(tmp_path / "out.tsv")
+    for shard in range(3):
+        Path(shard_path(output, shard, 3)).write_text("row {}\n".format(shard))
+
+    merge(output, 3, remove=True)
+
+    assert Path(output).read_text() == "row 0\nrow 1\nrow 2\n"
+    assert not Path(shard_path(output, 0, 3)).exists()
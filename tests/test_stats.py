@@ -0,0 +1,75 @@
+import os
+from functools import partial
+
+import pytest
+
+from nla import stats
+from nla.keyboard.randaug import __fetch__
+from nla.parallelize import WorkerPool, iter_parallel, iter_serial
+
+WORDS = ["HELLO", "WORLD", "KEYBOARD", "APPLE"] * 25
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    stats.disable()
+    stats.reset()
+    yield
+    stats.disable()
+    stats.reset()
+
+
+def test_disabled_probes_record_nothing():
+    list(iter_serial(WORDS, partial(__fetch__, degree=1, count=2)))
+
+    with stats.timer("test"):
+        pass
+
+    assert not stats.current()
+
+
+def test_serial_counters_and_timers():
+    stats.enable()
+    rows = list(iter_serial(WORDS, partial(__fetch__, degree=1, count=2)))
+
+    with stats.timer("test"):
+        pass
+    with stats.timer("test"):
+        pass
+
+    report = stats.current().as_dict()
+    assert report["counters"]["fetch.outputs"] == len(rows)
+    assert report["timers"]["test"]["calls"] == 2
+
+
+def test_worker_stats_are_merged():
+    reports = []
+    stats.enable(hook=reports.append)
+
+    with WorkerPool(processes=2) as pool:
+        rows = list(
+            iter_parallel(
+                WORDS, partial(__fetch__, degree=1, count=2), chunksize=5, pool=pool
+            )
+        )
+
+    report = stats.current().as_dict()
+
+    # every output is counted once, by the worker that produced it
+    assert sum(report["workers"].values()) == len(rows) == 2 * len(WORDS)
+    assert 1 <= len(report["workers"]) <= 2
+    assert os.getpid() not in report["workers"]
+    assert report["counters"]["fetch.outputs"] == len(rows)
+    assert reports == [stats.current()]
+
+
+def test_take_starts_over():
+    stats.enable()
+    stats.count("test", 3)
+    stats.worker(5)
+
+    taken = stats.take()
+
+    assert taken.counters == {"test": 3}
+    assert taken.workers == {os.getpid(): 5}
+    assert not stats.current()
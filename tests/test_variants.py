@@ -0,0 +1,155 @@
+from itertools import combinations, product
+
+import pytest
+
+from nla import rng
+from nla.keyboard import randaug
+from nla.keyboard.keyaug import load
+from nla.keyboard.variants import (
+    DELETE,
+    INSERT,
+    LETTERS,
+    REPLACE,
+    Edits,
+    apply_script,
+    draw,
+    every,
+    spaces,
+    variants,
+)
+
+
+def brute_force(positions, radices, k):
+    if isinstance(radices, int):
+        radices = [radices] * len(positions)
+    radix = dict(zip(positions, radices))
+
+    return {
+        tuple(zip(chosen, choices))
+        for chosen in combinations(positions, k)
+        for choices in product(*(range(radix[p]) for p in chosen))
+    }
+
+
+@pytest.mark.parametrize(
+    "positions, radices, k",
+    [
+        (range(6), 3, 2),
+        (range(1, 9, 2), 26, 3),
+        (range(5), [2, 0, 3, 1, 4], 1),
+        (range(5), [2, 0, 3, 1, 4], 2),
+        (range(6), [2, 1, 3, 1, 4, 2], 3),
+        (range(6), [2, 1, 3, 1, 4, 2], 4),
+        (range(3), 2, 4),
+    ],
+)
+def test_edits_index_every_edit_once(positions, radices, k):
+    edits = Edits(positions, radices, k)
+    decoded = [tuple(edits[i]) for i in range(len(edits))]
+    expected = brute_force(positions, radices, k) if k <= len(positions) else set()
+
+    assert len(edits) == len(expected)
+    assert len(set(decoded)) == len(decoded)
+    assert set(decoded) == expected
+
+    with pytest.raises(IndexError):
+        edits[len(edits)]
+
+
+def test_single_edit_spaces_match_brute_force():
+    word = "HELLO"
+    n = len(word)
+
+    expected = {
+        "replace": {
+            word[:i] + c + word[i + 1 :] for i in range(n - 1) for c in LETTERS
+        },
+        "insert": {word[:i] + c + word[i:] for i in range(n - 1) for c in LETTERS},
+        "delete": {word[:i] + word[i + 1 :] for i in range(n - 1)},
+        "swap": {
+            word[:i] + word[i + 1] + word[i] + word[i + 2 :] for i in range(n - 1)
+        },
+    }
+
+    for name, words in expected.items():
+        space = variants(name, word, 1)
+        assert {space[i] for i in range(len(space))} == words
+
+
+def test_keyboard_replace_space_matches_brute_force():
+    word = "KEYS"
+    neighbours = load()
+
+    expected = {
+        word[:i] + c + word[i + 1 :]
+        for i in range(len(word) - 1)
+        for c in neighbours[word[i]]
+    }
+
+    assert set(every(spaces(word, 1, ["nn_replace"]))) == expected
+
+
+def test_draw_distinct_and_seeded():
+    candidates = spaces("KEYBOARD", 2, ["swap", "insert", "replace", "delete"])
+
+    rng.seed(3)
+    first = draw(candidates, 50)
+    rng.seed(3)
+    second = draw(candidates, 50)
+    rng.seed(None)
+
+    assert isinstance(first, list)
+    assert len(first) == len(set(first)) == 50
+    assert first == second
+    assert set(first) <= set(every(candidates))
+
+
+def test_draw_stops_when_the_spaces_run_out():
+    candidates = spaces("ABC", 1, ["delete"])
+
+    assert sorted(draw(candidates, 10)) == sorted(every(candidates)) == ["AC", "BC"]
+
+
+def apply_naively(word, script):
+    # one edit at a time from the end, so the positions stay valid
+    chars = list(word)
+
+    for position, op, char in sorted(script, reverse=True):
+        if op == INSERT:
+            chars.insert(position, char)
+        elif op == REPLACE:
+            chars[position] = char
+        else:
+            del chars[position]
+
+    return "".join(chars)
+
+
+@pytest.mark.parametrize(
+    "script",
+    [
+        [],
+        [(0, INSERT, "X")],
+        [(5, INSERT, "X")],
+        [(1, REPLACE, "X"), (3, DELETE, "")],
+        [(0, DELETE, ""), (2, INSERT, "Y"), (4, REPLACE, "Z")],
+        [(1, INSERT, "X"), (2, INSERT, "Y"), (3, INSERT, "Z")],
+    ],
+)
+def test_apply_script_matches_edits_one_at_a_time(script):
+    assert apply_script("HELLO", script) == apply_naively("HELLO", script)
+
+
+def test_delete_removes_the_drawn_positions():
+    word = "ABCDEFGH"
+    expected = {
+        apply_naively(word, [(i, DELETE, ""), (j, DELETE, "")])
+        for start in (0, 1)
+        for i, j in combinations(range(start, len(word) - 1, 2), 2)
+    }
+
+    rng.seed(5)
+    outputs = {randaug.delete(word, 2) for _ in range(500)}
+    rng.seed(None)
+
+    assert outputs == expected
@@ -0,0 +1,73 @@
+import pytest
+
+from nla import rng
+from nla.word_boundary import (
+    __batch_word_boundary__,
+    __word_boundary__,
+    iter_word_boundary,
+    word_boundary,
+)
+
+QUERIES = ["AB CD", "DEEP NEURAL", "PIE", "A", "CRAVING MANIFEST X"]
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    rng.seed(1)
+    yield
+    rng.seed(None)
+
+
+def scalar_support(query, degree, draws):
+    return {
+        row[0]
+        for _ in range(draws)
+        for row in __word_boundary__(query, count=8, degree=degree)
+    }
+
+
+def batch_support(query, degree, draws):
+    return {
+        row[0] for row in __batch_word_boundary__([query] * draws, 8, degree=degree)
+    }
+
+
+@pytest.mark.parametrize("query", ["AB CD", "ABC DE", "PIE", "A"])
+@pytest.mark.parametrize("degree", [0.5, 1])
+def test_batch_matches_scalar_support(query, degree):
+    assert batch_support(query, degree, 2000) == scalar_support(query, degree, 2000)
+
+
+def test_batch_keeps_the_order_and_the_identifiers():
+    rows = __batch_word_boundary__(QUERIES, 4, degree=0.8, source="generic1")
+
+    originals = [row[1] for row in rows]
+    assert sorted(set(originals), key=originals.index) == QUERIES
+    assert originals == sorted(originals, key=QUERIES.index)
+
+    for augmented, original, source in rows:
+        assert source == "generic1"
+        # the words are shuffled and the spaces moved, the letters are kept
+        assert sorted(augmented.replace(" ", "")) == sorted(original.replace(" ", ""))
+        assert "  " not in augmented and augmented == augmented.strip()
+
+
+def test_batch_outputs_are_distinct_per_query():
+    rows = __batch_word_boundary__(QUERIES, 16, degree=1)
+
+    for query in QUERIES:
+        outputs = [row[0] for row in rows if row[1] == query]
+        assert outputs and len(outputs) == len(set(outputs))
+
+
+def test_entry_points_go_through_the_batches():
+    rng.seed(2)
+    serial = word_boundary(QUERIES * 50, 3, 0.6, parallel=False)
+    rng.seed(2)
+    lazy = list(
+        iter_word_boundary(QUERIES * 50, 3, 0.6, parallel=False, chunksize=1024)
+    )
+    rng.seed(2)
+    parallel = word_boundary(QUERIES * 50, 3, 0.6, parallel=True)
+
+    assert serial == lazy == parallel